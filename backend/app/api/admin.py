@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from ..services.cache_service import cache_service
+from ..services.job_queue import JobQueueFullError, job_queue
+
+router = APIRouter()
+
+@router.get("/cache/top-keys", summary="Most read cache keys")
+async def get_top_cache_keys(
+    limit: int = Query(20, ge=1, le=200, description="Number of keys to return")
+):
+    """Most read cache keys in this worker, estimated from a sample of lookups (requires authentication in production)"""
+    sampler = cache_service.key_sampler
+    return {
+        "keys": cache_service.top_keys(limit),
+        "sample_rate": sampler.sample_rate,
+        "sampled_lookups": sampler.sampled,
+        "tracked_keys": len(sampler)
+    }
+
+@router.post("/similar-places/rebuild", status_code=202, summary="Recompute all similar places")
+async def rebuild_similar_places():
+    """Queue a full recomputation of every place's similar places (requires authentication in production)"""
+    try:
+        job = await job_queue.submit("rebuild_similar_places", {})
+    except JobQueueFullError:
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/ai/jobs/{job['id']}"}
+
+@router.post("/reviews/detect-languages", status_code=202, summary="Detect the language of existing reviews")
+async def detect_review_languages(
+    only_unchecked: bool = Query(True, description="Only reviews still carrying the default language")
+):
+    """Queue language detection for reviews written before it existed (requires authentication in production)"""
+    try:
+        job = await job_queue.submit("detect_review_languages", {"only_unchecked": only_unchecked})
+    except JobQueueFullError:
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/ai/jobs/{job['id']}"}
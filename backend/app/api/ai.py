@@ -1,26 +1,37 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
+import json
 import uuid
 
-from ..database import get_db
-from ..services.ai_service import AIService
+from ..database import get_db, SessionLocal
+from ..services.ai_service import AIService, ai_service
 from ..services.place_service import PlaceService
+from ..services.review_service import ReviewService
+from ..services.review_moderation import ReviewModerationPipeline
+from ..services.cache_service import cache_service
+from ..services.chat_memory import chat_memory
+from ..services.job_queue import JobQueueFullError, PermanentJobError, job_queue
+from .reviews import invalidate_moderated_places
 
 router = APIRouter()
 
-def get_ai_service(db: Session = Depends(get_db)) -> AIService:
-    return AIService(db)
+def get_ai_service() -> AIService:
+    return ai_service
 
 def get_place_service(db: Session = Depends(get_db)) -> PlaceService:
     return PlaceService(db)
 
+def get_review_service(db: Session = Depends(get_db)) -> ReviewService:
+    return ReviewService(db)
+
 # Pydantic models for AI endpoints
 class RecommendationRequest(BaseModel):
     user_preferences: Dict[str, Any]
     city: Optional[str] = None
-    max_results: int = 5
+    max_results: int = Field(5, ge=1, le=50)
 
 class RecommendationResponse(BaseModel):
     recommendations: List[Dict[str, Any]]
@@ -41,11 +52,75 @@ class ContentModerationResponse(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     context: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = Field(
+        None, min_length=8, max_length=64, pattern=r"^[A-Za-z0-9_-]+$",
+        description="Continue this conversation; a new one is started when left out"
+    )
 
 class ChatResponse(BaseModel):
     response: str
     suggestions: List[str]
     confidence: float
+    session_id: str
+
+class JobSubmission(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+# Background job handlers, run by the job queue workers on sessions of their own
+async def _load_place(payload: Dict[str, Any]):
+    db = SessionLocal()
+    try:
+        place = await PlaceService(db).get_place_by_id(uuid.UUID(payload["place_id"]))
+    finally:
+        db.close()
+    if not place:
+        raise PermanentJobError("Place not found")
+    return place
+
+@job_queue.handler("enrich_place")
+async def enrich_place_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    place = await _load_place(payload)
+    enriched_data = await ai_service.enrich_place_data(place, use_cache=payload.get("use_cache", True), fallback=False)
+    return {"place_id": payload["place_id"], "enriched_data": enriched_data}
+
+@job_queue.handler("generate_description")
+async def generate_description_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    place = await _load_place(payload)
+    description = await ai_service.generate_place_description(place, use_cache=payload.get("use_cache", True), fallback=False)
+    return {
+        "place_id": payload["place_id"],
+        "generated_description": description,
+        "original_description": place.description
+    }
+
+@job_queue.handler("enrich_city")
+async def enrich_city_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Fan out one enrich_place job per place, so each gets its own retries"""
+    db = SessionLocal()
+    try:
+        place_ids = await PlaceService(db).get_place_ids_by_city(payload["city"])
+    finally:
+        db.close()
+
+    job_ids = []
+    not_queued = []
+    for place_id in place_ids:
+        try:
+            job = await job_queue.submit("enrich_place", {"place_id": str(place_id), "use_cache": payload.get("use_cache", True)})
+            job_ids.append(job["id"])
+        except JobQueueFullError:
+            not_queued.append(str(place_id))
+
+    return {"city": payload["city"], "place_count": len(place_ids), "job_ids": job_ids, "not_queued": not_queued}
+
+async def _submit_job(job_type: str, payload: Dict[str, Any]) -> JobSubmission:
+    try:
+        job = await job_queue.submit(job_type, payload)
+    except JobQueueFullError:
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+    return JobSubmission(job_id=job["id"], status=job["status"], status_url=f"/ai/jobs/{job['id']}")
 
 @router.get("/dashboard", summary="AI Dashboard")
 async def ai_dashboard():
@@ -81,13 +156,15 @@ async def get_recommendations(
 @router.post("/moderate", response_model=ContentModerationResponse, summary="Moderate content")
 async def moderate_content(
     request: ContentModerationRequest,
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists"),
     ai_service: AIService = Depends(get_ai_service)
 ):
     """Use AI to moderate user-generated content"""
     try:
         moderation_result = await ai_service.moderate_content(
             text=request.text,
-            content_type=request.content_type
+            content_type=request.content_type,
+            use_cache=not bypass_cache
         )
         
         return moderation_result
@@ -95,16 +172,40 @@ async def moderate_content(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Content moderation failed: {str(e)}")
 
+@router.post("/moderate-pending", summary="Moderate pending reviews in batches")
+async def moderate_pending_reviews(
+    limit: int = Query(200, ge=1, le=2000, description="Maximum number of pending reviews to moderate"),
+    dry_run: bool = Query(False, description="Return decisions without applying them"),
+    ai_service: AIService = Depends(get_ai_service),
+    review_service: ReviewService = Depends(get_review_service)
+):
+    """Moderate the oldest pending reviews with batched AI calls and apply the results"""
+    try:
+        pipeline = ReviewModerationPipeline(review_service, ai_service)
+        summary = await pipeline.run(limit=limit, dry_run=dry_run)
+        
+        if summary["status"] == "applied" and summary["affected_place_ids"]:
+            await invalidate_moderated_places(cache_service, summary["affected_place_ids"])
+        
+        return summary
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch moderation failed: {str(e)}")
+
 @router.post("/chat", response_model=ChatResponse, summary="Chat with AI assistant")
 async def chat_with_ai(
     request: ChatRequest,
     ai_service: AIService = Depends(get_ai_service)
 ):
-    """Chat with AI assistant about fika places and Swedish culture"""
+    """Chat with AI assistant about fika places and Swedish culture.
+
+    Pass the ``session_id`` from a previous answer to continue that conversation.
+    """
     try:
         chat_response = await ai_service.chat(
             message=request.message,
-            context=request.context
+            context=request.context,
+            session_id=request.session_id
         )
         
         return chat_response
@@ -112,9 +213,40 @@ async def chat_with_ai(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+@router.delete("/chat/{session_id}", summary="Forget a chat session")
+async def clear_chat_session(session_id: str):
+    """Delete a conversation's history; the session ID can be reused for a fresh conversation"""
+    await chat_memory.clear(session_id)
+    return {"message": "Chat session cleared"}
+
+def _sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream", summary="Chat with AI assistant, streaming the answer")
+async def chat_with_ai_stream(
+    request: ChatRequest,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Stream the assistant's answer as Server-Sent Events.
+
+    Sends ``token`` events with the answer text as it is generated, then a
+    ``done`` event with the same fields as ``/ai/chat``, or an ``error`` event.
+    """
+    async def events():
+        async for event in ai_service.chat_stream(request.message, request.context, request.session_id):
+            yield _sse(event["event"], event["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/enrich-place/{place_id}", summary="Enrich place data with AI")
 async def enrich_place_data(
     place_id: uuid.UUID,
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists"),
     ai_service: AIService = Depends(get_ai_service),
     place_service: PlaceService = Depends(get_place_service)
 ):
@@ -126,7 +258,7 @@ async def enrich_place_data(
             raise HTTPException(status_code=404, detail="Place not found")
         
         # Enrich with AI
-        enriched_data = await ai_service.enrich_place_data(place)
+        enriched_data = await ai_service.enrich_place_data(place, use_cache=not bypass_cache)
         
         return {
             "message": "Place data enriched successfully",
@@ -139,14 +271,64 @@ async def enrich_place_data(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to enrich place data: {str(e)}")
 
-@router.get("/analytics", summary="AI-powered analytics")
+@router.post("/jobs/enrich-place/{place_id}", response_model=JobSubmission, status_code=202, summary="Queue place enrichment")
+async def submit_enrich_place_job(
+    place_id: uuid.UUID,
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists"),
+    place_service: PlaceService = Depends(get_place_service)
+):
+    """Queue AI enrichment of a place and return a job to poll"""
+    if not await place_service.get_place_by_id(place_id):
+        raise HTTPException(status_code=404, detail="Place not found")
+    return await _submit_job("enrich_place", {"place_id": str(place_id), "use_cache": not bypass_cache})
+
+@router.post("/jobs/generate-description/{place_id}", response_model=JobSubmission, status_code=202, summary="Queue description generation")
+async def submit_generate_description_job(
+    place_id: uuid.UUID,
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists"),
+    place_service: PlaceService = Depends(get_place_service)
+):
+    """Queue AI description generation for a place and return a job to poll"""
+    if not await place_service.get_place_by_id(place_id):
+        raise HTTPException(status_code=404, detail="Place not found")
+    return await _submit_job("generate_description", {"place_id": str(place_id), "use_cache": not bypass_cache})
+
+@router.post("/jobs/enrich-city", response_model=JobSubmission, status_code=202, summary="Queue enrichment of a whole city")
+async def submit_enrich_city_job(
+    city: str = Query(..., min_length=2, description="City whose places to enrich"),
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists")
+):
+    """Queue AI enrichment of every place in a city; the job's result lists one job per place"""
+    return await _submit_job("enrich_city", {"city": city, "use_cache": not bypass_cache})
+
+@router.get("/jobs/{job_id}", summary="Get background job status")
+async def get_job_status(job_id: str):
+    """Status and, once finished, result or error of a background job"""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Summarize the jobs a fan-out job started
+    result = job.get("result")
+    if isinstance(result, dict) and result.get("job_ids"):
+        children = await job_queue.get_many(result["job_ids"])
+        counts: Dict[str, int] = {}
+        for child in children:
+            status = child["status"] if child else "expired"
+            counts[status] = counts.get(status, 0) + 1
+        job["children"] = counts
+    
+    return job
+
+@router.get("/analytics", summary="Review analytics")
 async def get_analytics(
     timeframe: str = Query("week", regex="^(day|week|month|year)$"),
+    city: Optional[str] = Query(None, description="Only count reviews of places in this city"),
     ai_service: AIService = Depends(get_ai_service)
 ):
-    """Get AI-powered analytics and insights"""
+    """Review volume, rating trends, top fika items and moderation throughput per day, week, month or year"""
     try:
-        analytics = await ai_service.get_analytics(timeframe)
+        analytics = await ai_service.get_analytics(timeframe, city)
         return analytics
         
     except Exception as e:
@@ -155,6 +337,7 @@ async def get_analytics(
 @router.post("/generate-description/{place_id}", summary="Generate place description")
 async def generate_place_description(
     place_id: uuid.UUID,
+    bypass_cache: bool = Query(False, description="Call the LLM even if a cached response exists"),
     ai_service: AIService = Depends(get_ai_service),
     place_service: PlaceService = Depends(get_place_service)
 ):
@@ -164,7 +347,7 @@ async def generate_place_description(
         if not place:
             raise HTTPException(status_code=404, detail="Place not found")
         
-        description = await ai_service.generate_place_description(place)
+        description = await ai_service.generate_place_description(place, use_cache=not bypass_cache)
         
         return {
             "place_id": place_id,
@@ -179,11 +362,14 @@ async def generate_place_description(
 
 @router.post("/detect-duplicates", summary="Detect duplicate places")
 async def detect_duplicate_places(
+    city: Optional[str] = Query(None, description="Only compare places in this city"),
+    min_score: float = Query(0.7, ge=0.0, le=1.0, description="Minimum similarity score"),
+    limit: int = Query(100, ge=1, le=1000),
     ai_service: AIService = Depends(get_ai_service)
 ):
-    """Use AI to detect potential duplicate place entries"""
+    """Detect potential duplicate place entries by name, address and location similarity"""
     try:
-        duplicates = await ai_service.detect_duplicate_places()
+        duplicates = await ai_service.detect_duplicate_places(city=city, min_score=min_score, limit=limit)
         
         return {
             "message": "Duplicate detection completed",
@@ -1,13 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from typing import Optional, List
 from sqlalchemy.orm import Session
+import functools
+import logging
+import math
 import uuid
 
-from ..database import get_db
-from ..schemas.place import PlaceCreate, PlaceUpdate, Place, PlaceList, PlaceSearch
+from ..cache import cached, conditional, invalidate, latest_update, stable_hash, version_tag
+from ..config import settings
+from ..database import get_db, SessionLocal
+from ..schemas.place import PlaceCreate, PlaceUpdate, Place, PlaceList, PlaceSearch, SimilarPlace, SimilarPlaceList
+from ..schemas.review import ReviewList
 from ..services.place_service import PlaceService
-from ..services.cache_service import CacheService
+from ..services.cache_service import CacheService, cache_service
+from ..services.cache_warmer import cache_warmer
+from ..services.id_filter import place_ids
+from ..services.place_catalog import place_catalog
+from ..services.semantic_index import semantic_index
+from ..services.similar_places import similar_places
+from ..services.job_queue import JobQueueFullError, job_queue
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -16,10 +29,90 @@ def get_place_service(db: Session = Depends(get_db)) -> PlaceService:
     return PlaceService(db)
 
 def get_cache_service() -> CacheService:
-    return CacheService()
+    return cache_service
+
+# Services rebuilt on a fresh session when a cached route refreshes in the background
+PLACE_SERVICES = {"place_service": PlaceService}
+
+# Cache key builders, called with the route's keyword arguments
+def places_key(city, category, verified_only, min_rating, page, per_page, **_) -> str:
+    filters = stable_hash(f"{category}:{verified_only}:{min_rating}:{per_page}")
+    return f"places:{city or 'all'}:{page}:{filters}"
+
+def search_key(query, city, page, per_page, mode="fulltext", **_) -> str:
+    return f"search:{stable_hash(f'{normalize_query(query)}:{city}:{per_page}:{mode}')}:{page}"
+
+def place_key(place_id, **_) -> str:
+    return f"place:{place_id}"
+
+def place_reviews_key(place_id, page, per_page, **_) -> str:
+    return f"reviews:{place_id}:{page}:{per_page}"
+
+# Generation namespaces: a write bumps the namespaces it affects instead of
+# deleting keys by pattern
+def city_namespace(city: Optional[str]) -> str:
+    # The city filter is case-insensitive. Substring queries ("stock") are only
+    # refreshed by expiry, as before.
+    return f"places:{city.lower() if city else 'all'}"
+
+def place_list_namespaces(*cities: str) -> List[str]:
+    """Namespaces invalidated by a change to places in these cities"""
+    return [*{city_namespace(city) for city in cities}, city_namespace(None), "search", "cities"]
+
+# Sorted set of search queries by popularity, used to pick searches to keep warm
+SEARCH_RANKING_KEY = "ranking:searches"
+
+def normalize_query(query: str) -> str:
+    # Full-text search ignores case and surrounding whitespace, so the cache can too
+    return " ".join(query.lower().split())
+
+async def track_search(request: Request):
+    """Count each search so the most popular ones can be kept warm"""
+    query = request.query_params.get("query")
+    if query:
+        await cache_service.increment_score(SEARCH_RANKING_KEY, normalize_query(query))
+
+# Surrogate-Key tags, so a CDN in front can purge what a write invalidates
+def places_surrogate_keys(city, **_) -> list:
+    return ["places", f"places:{city or 'all'}"]
+
+def place_surrogate_keys(place_id, **_) -> list:
+    return ["place", f"place:{place_id}"]
+
+def place_list_modified(places: PlaceList):
+    return latest_update(places.places)
+
+async def reject_unknown_place(place_id: uuid.UUID):
+    """404 for IDs the place ID filter rules out, before the cache or database is touched"""
+    if not await place_ids.might_exist(place_id):
+        raise HTTPException(status_code=404, detail="Place not found")
+
+@job_queue.handler("refresh_similar_places")
+async def refresh_similar_places_job(payload: dict) -> dict:
+    return await similar_places.refresh(uuid.UUID(payload["place_id"]))
+
+@job_queue.handler("rebuild_similar_places")
+async def rebuild_similar_places_job(payload: dict) -> dict:
+    return await similar_places.rebuild()
+
+async def schedule_similar_refresh(place_id: uuid.UUID):
+    """Recompute a changed place's similar places in the background"""
+    try:
+        await job_queue.submit("refresh_similar_places", {"place_id": str(place_id)})
+    except JobQueueFullError:
+        logger.warning(f"Job queue full, similar places of {place_id} refresh on the next rebuild")
 
 @router.get("/", response_model=PlaceList, summary="Get places by city or search")
-@cache(expire=3600, key_builder=lambda *args, **kwargs: f"places:{kwargs.get('city', 'all')}:{kwargs.get('page', 1)}")
+@cached(
+    expire=3600,
+    key_builder=places_key,
+    response_model=PlaceList,
+    stale_ttl=300,
+    services=PLACE_SERVICES,
+    last_modified=place_list_modified,
+    surrogate_keys=places_surrogate_keys,
+    namespaces=lambda city, **_: [city_namespace(city)],
+)
 async def get_places(
     city: Optional[str] = Query(None, description="Filter by city"),
     category: Optional[str] = Query(None, description="Filter by category"),
@@ -46,17 +139,45 @@ async def get_places(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch places: {str(e)}")
 
-@router.get("/search", response_model=PlaceList, summary="Search places by query")
-@cache(expire=1800, key_builder=lambda *args, **kwargs: f"search:{hash(kwargs.get('query', ''))}:{kwargs.get('page', 1)}")
+@router.get("/search", response_model=PlaceList, summary="Search places by query", dependencies=[Depends(track_search)])
+@cached(
+    expire=1800,
+    key_builder=search_key,
+    response_model=PlaceList,
+    stale_ttl=300,
+    services=PLACE_SERVICES,
+    last_modified=place_list_modified,
+    namespaces=lambda **_: ["search"],
+)
 async def search_places(
     query: str = Query(..., min_length=2, description="Search query"),
     city: Optional[str] = Query(None, description="Filter by city"),
+    mode: str = Query("fulltext", pattern="^(fulltext|semantic)$", description="Match words exactly, or by meaning"),
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
     place_service: PlaceService = Depends(get_place_service)
 ):
-    """Search fika places by name, description, or specialties"""
+    """Search fika places by name, description, or specialties.
+
+    Semantic mode ranks places by similarity to the query over their
+    descriptions, specialties and approved reviews; its city filter matches
+    the whole city name.
+    """
     try:
+        if mode == "semantic":
+            hits = await semantic_index.search(
+                query, city, limit=settings.semantic_search_max_results, min_score=settings.semantic_search_min_score
+            )
+            offset = (page - 1) * per_page
+            page_ids = [place_id for place_id, _ in hits[offset:offset + per_page]]
+            return PlaceList(
+                places=await place_service.get_places_by_ids(page_ids),
+                total=len(hits),
+                page=page,
+                per_page=per_page,
+                pages=math.ceil(len(hits) / per_page)
+            )
+
         search_params = PlaceSearch(
             query=query,
             city=city,
@@ -71,7 +192,13 @@ async def search_places(
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 @router.get("/cities", summary="Get list of cities with fika places")
-@cache(expire=7200)
+@cached(
+    expire=7200,
+    key_builder=lambda **_: "cities",
+    stale_ttl=600,
+    services=PLACE_SERVICES,
+    namespaces=lambda **_: ["cities"],
+)
 async def get_cities(
     place_service: PlaceService = Depends(get_place_service)
 ):
@@ -83,6 +210,13 @@ async def get_cities(
         raise HTTPException(status_code=500, detail=f"Failed to fetch cities: {str(e)}")
 
 @router.get("/nearby", response_model=PlaceList, summary="Find places near coordinates")
+@conditional(
+    response_model=PlaceList,
+    etag=lambda places: version_tag(places.places, places.total),
+    last_modified=place_list_modified,
+    cache_control="public, max-age=60",
+    surrogate_keys=lambda **_: ["places"],
+)
 async def get_nearby_places(
     latitude: float = Query(..., ge=-90, le=90, description="Latitude"),
     longitude: float = Query(..., ge=-180, le=180, description="Longitude"),
@@ -108,16 +242,28 @@ async def get_nearby_places(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to find nearby places: {str(e)}")
 
-@router.get("/{place_id}", response_model=Place, summary="Get place by ID")
-@cache(expire=14400, key_builder=lambda *args, **kwargs: f"place:{kwargs.get('place_id')}")
+@router.get("/{place_id}", response_model=Place, summary="Get place by ID", dependencies=[Depends(reject_unknown_place)])
+@cached(
+    expire=14400,
+    key_builder=place_key,
+    response_model=Place,
+    stale_ttl=600,
+    services=PLACE_SERVICES,
+    last_modified=lambda place: place.updated_at,
+    surrogate_keys=place_surrogate_keys,
+)
 async def get_place(
     place_id: uuid.UUID,
     place_service: PlaceService = Depends(get_place_service)
 ):
     """Get detailed information about a specific fika place"""
     try:
+        if await place_ids.is_known_missing(place_id):
+            raise HTTPException(status_code=404, detail="Place not found")
+
         place = await place_service.get_place_by_id(place_id)
         if not place:
+            await place_ids.remember_missing(place_id)
             raise HTTPException(status_code=404, detail="Place not found")
         return place
         
@@ -135,10 +281,13 @@ async def create_place(
     """Create a new fika place (requires authentication in production)"""
     try:
         place = await place_service.create_place(place_data)
+        await place_ids.record_created(place.id)
         
-        # Clear relevant caches
-        await cache_service.clear_pattern(f"places:{place.city}:*")
-        await cache_service.clear_pattern("search:*")
+        # Invalidate relevant caches
+        await invalidate(*place_list_namespaces(place.city))
+        place_catalog.invalidate()
+        await schedule_similar_refresh(place.id)
+        cache_warmer.schedule()
         
         return place
         
@@ -154,14 +303,21 @@ async def update_place(
 ):
     """Update an existing fika place (requires authentication in production)"""
     try:
+        existing = await place_service.get_place_by_id(place_id)
+        if not existing:
+            raise HTTPException(status_code=404, detail="Place not found")
+        previous_city = existing.city
+        
         place = await place_service.update_place(place_id, place_data)
         if not place:
             raise HTTPException(status_code=404, detail="Place not found")
         
-        # Clear relevant caches
-        await cache_service.clear_pattern(f"place:{place_id}")
-        await cache_service.clear_pattern(f"places:{place.city}:*")
-        await cache_service.clear_pattern("search:*")
+        # Invalidate relevant caches, including the old city's if the place moved
+        await cache_service.delete(f"place:{place_id}")
+        await invalidate(*place_list_namespaces(previous_city, place.city))
+        place_catalog.invalidate()
+        await schedule_similar_refresh(place.id)
+        cache_warmer.schedule()
         
         return place
         
@@ -178,14 +334,22 @@ async def delete_place(
 ):
     """Delete a fika place (requires authentication in production)"""
     try:
+        place = await place_service.get_place_by_id(place_id)
+        if not place:
+            raise HTTPException(status_code=404, detail="Place not found")
+        city = place.city
+        
         success = await place_service.delete_place(place_id)
         if not success:
             raise HTTPException(status_code=404, detail="Place not found")
+        await place_ids.record_deleted(place_id)
         
-        # Clear relevant caches
-        await cache_service.clear_pattern(f"place:{place_id}")
-        await cache_service.clear_pattern("places:*")
-        await cache_service.clear_pattern("search:*")
+        # Invalidate relevant caches
+        await cache_service.delete(f"place:{place_id}")
+        await invalidate(*place_list_namespaces(city), f"reviews:{place_id}")
+        place_catalog.invalidate()
+        await schedule_similar_refresh(place_id)
+        cache_warmer.schedule()
         
         return {"message": "Place deleted successfully"}
         
@@ -195,6 +359,15 @@ async def delete_place(
         raise HTTPException(status_code=500, detail=f"Failed to delete place: {str(e)}")
 
 @router.get("/{place_id}/reviews", summary="Get reviews for a place")
+@cached(
+    expire=600,
+    key_builder=place_reviews_key,
+    response_model=ReviewList,
+    services=PLACE_SERVICES,
+    last_modified=lambda reviews: latest_update(reviews.reviews),
+    surrogate_keys=lambda place_id, **_: [f"reviews:{place_id}"],
+    namespaces=lambda place_id, **_: [f"reviews:{place_id}"],
+)
 async def get_place_reviews(
     place_id: uuid.UUID,
     page: int = Query(1, ge=1, description="Page number"),
@@ -207,4 +380,52 @@ async def get_place_reviews(
         return reviews
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch reviews: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch reviews: {str(e)}")
+
+@router.get(
+    "/{place_id}/similar",
+    response_model=SimilarPlaceList,
+    summary="Get similar places",
+    dependencies=[Depends(reject_unknown_place)]
+)
+async def get_similar_places(
+    place_id: uuid.UUID,
+    limit: int = Query(10, ge=1, le=50, description="Number of places to return"),
+    place_service: PlaceService = Depends(get_place_service)
+):
+    """Places similar to this one in content, location and reviewers, from precomputed lists"""
+    try:
+        neighbours = await similar_places.get(place_id)
+        if neighbours is None:
+            return SimilarPlaceList(place_id=place_id, similar=[], computed=False)
+
+        # Deleted places drop out here until the lists are next refreshed
+        scores = dict(neighbours)
+        places = await place_service.get_places_by_ids(list(scores))
+        return SimilarPlaceList(
+            place_id=place_id,
+            similar=[SimilarPlace(place=place, score=scores[place.id]) for place in places[:limit]],
+            computed=True
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch similar places: {str(e)}")
+
+@cache_warmer.register
+async def place_warm_targets() -> list:
+    """The hottest place responses: city pages, city list, popular searches and top places"""
+    targets = [get_cities.warm]
+    targets.extend(functools.partial(get_places.warm, city=city) for city in settings.cache_warm_cities)
+
+    await cache_service.trim_ranking(SEARCH_RANKING_KEY, keep=settings.cache_warm_top_searches * 10)
+    queries = await cache_service.top_members(SEARCH_RANKING_KEY, settings.cache_warm_top_searches)
+    targets.extend(functools.partial(search_places.warm, query=query) for query in queries)
+
+    db = SessionLocal()
+    try:
+        place_ids = await PlaceService(db).get_most_reviewed_place_ids(settings.cache_warm_top_places)
+    finally:
+        db.close()
+    targets.extend(functools.partial(get_place.warm, place_id=place_id) for place_id in place_ids)
+
+    return targets
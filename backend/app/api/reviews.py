@@ -1,11 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
+from typing import Iterable
+import asyncio
 import uuid
 
+from ..cache import conditional, invalidate, latest_update, version_tag
 from ..database import get_db
 from ..schemas.review import ReviewCreate, ReviewUpdate, Review, ReviewList, ReviewModeration
 from ..services.review_service import ReviewService
-from ..services.cache_service import CacheService
+from ..services.cache_service import CacheService, cache_service
+from ..services.cache_warmer import cache_warmer
+from ..services.id_filter import review_ids
+from ..services.job_queue import job_queue
+from ..services.language_detector import language_detector
+from ..services.place_catalog import place_catalog
+from ..services.review_analytics import review_analytics
 
 router = APIRouter()
 
@@ -13,7 +22,30 @@ def get_review_service(db: Session = Depends(get_db)) -> ReviewService:
     return ReviewService(db)
 
 def get_cache_service() -> CacheService:
-    return CacheService()
+    return cache_service
+
+async def invalidate_place_reviews(cache_service: CacheService, place_id: uuid.UUID):
+    """A review change affects the place's review pages and, through its rating, the place itself"""
+    await cache_service.delete(f"place:{place_id}")
+    await invalidate(f"reviews:{place_id}")
+
+async def invalidate_moderated_places(cache_service: CacheService, place_ids: Iterable[uuid.UUID]):
+    """Moderation also changes the approved review text semantic search matches places by"""
+    await asyncio.gather(*(invalidate_place_reviews(cache_service, place_id) for place_id in place_ids))
+    # Reload the catalog first, so searches re-cached after the bump re-index the places
+    place_catalog.invalidate()
+    await invalidate("search")
+
+@job_queue.handler("detect_review_languages")
+async def detect_review_languages_job(payload: dict) -> dict:
+    summary, place_ids = await language_detector.backfill(only_unchecked=payload.get("only_unchecked", True))
+    await asyncio.gather(*(invalidate_place_reviews(cache_service, place_id) for place_id in place_ids))
+    return summary
+
+async def reject_unknown_review(review_id: uuid.UUID):
+    """404 for IDs the review ID filter rules out, before the database is touched"""
+    if not await review_ids.might_exist(review_id):
+        raise HTTPException(status_code=404, detail="Review not found")
 
 @router.post("/", response_model=Review, summary="Create new review", status_code=201)
 async def create_review(
@@ -24,25 +56,38 @@ async def create_review(
     """Create a new review for a fika place"""
     try:
         review = await review_service.create_review(review_data)
+        await review_ids.record_created(review.id)
+        review_analytics.record_created(await review_analytics.event_for(review))
         
-        # Clear place cache since rating might change
-        await cache_service.clear_pattern(f"place:{review_data.place_id}")
-        await cache_service.clear_pattern(f"reviews:{review_data.place_id}:*")
+        # Invalidate place cache since rating might change
+        await invalidate_place_reviews(cache_service, review_data.place_id)
+        cache_warmer.schedule()
         
         return review
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create review: {str(e)}")
 
-@router.get("/{review_id}", response_model=Review, summary="Get review by ID")
+@router.get("/{review_id}", response_model=Review, summary="Get review by ID", dependencies=[Depends(reject_unknown_review)])
+@conditional(
+    response_model=Review,
+    etag=lambda review: version_tag([review], review.moderated),
+    last_modified=lambda review: review.updated_at,
+    cache_control="public, max-age=300",
+    surrogate_keys=lambda review_id, **_: [f"review:{review_id}"],
+)
 async def get_review(
     review_id: uuid.UUID,
     review_service: ReviewService = Depends(get_review_service)
 ):
     """Get a specific review"""
     try:
+        if await review_ids.is_known_missing(review_id):
+            raise HTTPException(status_code=404, detail="Review not found")
+
         review = await review_service.get_review_by_id(review_id)
         if not review:
+            await review_ids.remember_missing(review_id)
             raise HTTPException(status_code=404, detail="Review not found")
         return review
         
@@ -64,9 +109,9 @@ async def update_review(
         if not review:
             raise HTTPException(status_code=404, detail="Review not found")
         
-        # Clear relevant caches
-        await cache_service.clear_pattern(f"place:{review.place_id}")
-        await cache_service.clear_pattern(f"reviews:{review.place_id}:*")
+        # Invalidate relevant caches
+        await invalidate_place_reviews(cache_service, review.place_id)
+        cache_warmer.schedule()
         
         return review
         
@@ -83,13 +128,21 @@ async def delete_review(
 ):
     """Delete a review"""
     try:
+        review = await review_service.get_review_by_id(review_id)
+        if not review:
+            raise HTTPException(status_code=404, detail="Review not found")
+        place_id = review.place_id
+        analytics_event = await review_analytics.event_for(review)
+        
         success = await review_service.delete_review(review_id)
         if not success:
             raise HTTPException(status_code=404, detail="Review not found")
+        await review_ids.record_deleted(review_id)
+        review_analytics.record_deleted(analytics_event)
         
-        # Clear relevant caches
-        await cache_service.clear_pattern("place:*")
-        await cache_service.clear_pattern("reviews:*")
+        # Invalidate relevant caches
+        await invalidate_place_reviews(cache_service, place_id)
+        cache_warmer.schedule()
         
         return {"message": "Review deleted successfully"}
         
@@ -106,6 +159,12 @@ async def moderate_review(
 ):
     """Moderate a review (approve or reject)"""
     try:
+        review = await review_service.get_review_by_id(review_moderation.review_id)
+        if not review:
+            raise HTTPException(status_code=404, detail="Review not found")
+        place_id = review.place_id
+        analytics_event = await review_analytics.event_for(review)
+        
         success = await review_service.moderate_review(
             review_moderation.review_id,
             review_moderation.action,
@@ -114,9 +173,10 @@ async def moderate_review(
         
         if not success:
             raise HTTPException(status_code=404, detail="Review not found")
+        review_analytics.record_moderated(analytics_event, review.moderated, review.moderated_at)
         
-        # Clear relevant caches
-        await cache_service.clear_pattern("reviews:*")
+        # Invalidate relevant caches
+        await invalidate_moderated_places(cache_service, [place_id])
         
         return {"message": f"Review {review_moderation.action}d successfully"}
         
@@ -126,6 +186,12 @@ async def moderate_review(
         raise HTTPException(status_code=500, detail=f"Failed to moderate review: {str(e)}")
 
 @router.get("/pending", response_model=ReviewList, summary="Get pending reviews")
+@conditional(
+    response_model=ReviewList,
+    etag=lambda reviews: version_tag(reviews.reviews, reviews.total),
+    last_modified=lambda reviews: latest_update(reviews.reviews),
+    cache_control="private, no-cache",
+)
 async def get_pending_reviews(
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
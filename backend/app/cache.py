@@ -0,0 +1,521 @@
+"""Route-level response caching, conditional GET and stampede protection.
+
+Cached routes store the final encoded response body together with its ETag,
+Last-Modified time, content encoding and the time until which it is fresh.
+Hits are returned as-is, without validating or serializing through the route's
+response model again, and requests whose If-None-Match or If-Modified-Since
+still match get an empty 304.
+
+Past the soft TTL an entry is still served while a single request refreshes it
+in the background; the Redis TTL covers the fresh period plus the stale window,
+so abandoned entries expire on their own. Concurrent misses for the same key
+are coalesced within a worker (single-flight) and across workers with a short
+Redis lock. Each cached route also exposes ``warm(**arguments)`` so entries
+can be precomputed outside a request (see CacheWarmer).
+
+Keys can embed the generation of one or more namespaces. Invalidating a
+namespace is a single INCR of its generation, whatever the number of keys
+built on it; entries from older generations are never read again and expire.
+"""
+import asyncio
+import functools
+import gzip
+import hashlib
+import inspect
+import json
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type
+
+from fastapi import Request, Response, params
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter, Histogram
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+
+from .config import settings
+from .database import SessionLocal
+from .services.cache_service import cache_service, key_family
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Loads in progress in this worker, keyed by cache key
+_inflight: Dict[str, "asyncio.Future[CachedResponse]"] = {}
+
+# Background refreshes in progress in this worker, keyed by cache key
+_refreshing: Dict[str, "asyncio.Task[None]"] = {}
+
+LOCK_POLL_INTERVAL = 0.05
+
+# Name of the request parameter added to cached routes' signatures
+REQUEST_PARAM = "_cache_request"
+
+# Metrics
+CACHE_WARMS = Counter('fika_cache_warms_total', 'Cache entries stored by warming', ['family'])
+CACHE_WARM_HITS = Counter('fika_cache_warm_hits_total', 'Cache hits served from warmed entries', ['family'])
+CACHE_ROUTE_REQUESTS = Counter(
+    'fika_cache_route_requests_total',
+    'Cached route requests by outcome: hit, stale (served while refreshing) or miss',
+    ['family', 'result']
+)
+CACHE_LOAD_DURATION = Histogram(
+    'fika_cache_load_duration_seconds',
+    'Time to compute and store a cached response on a miss, refresh or warm',
+    ['family']
+)
+
+def stable_hash(value: str) -> str:
+    """Short hash of a string that is identical across worker processes"""
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest()
+
+def dump_json(value: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag for an encoded body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def latest_update(items: Iterable[Any]) -> Optional[datetime]:
+    """Most recent ``updated_at`` among items, for Last-Modified"""
+    return max((item.updated_at for item in items if getattr(item, "updated_at", None)), default=None)
+
+def version_tag(items: Iterable[Any], *extra: Any) -> str:
+    """Identity of a set of rows by id and update time, cheaper than hashing the rendered body"""
+    parts = [f"{item.id}@{item.updated_at.isoformat() if item.updated_at else ''}" for item in items]
+    return ",".join(parts + [str(value) for value in extra])
+
+def _opaque_tag(tag: str) -> str:
+    """ETag value for weak comparison, ignoring the content-coding suffix"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    return tag[:-len("-gzip")] if tag.endswith("-gzip") else tag
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Whether an Accept-Encoding value allows ``coding``, honouring q-values (RFC 9110 section 12.5.3)"""
+    wildcard = None
+    for entry in accept_encoding.split(","):
+        name, _, parameters = entry.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        if name == coding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality > 0
+    return bool(wildcard)
+
+def is_not_modified(request: Optional[Request], etag: str, last_modified: Optional[float]) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since (RFC 9110 section 13.2.2)"""
+    if request is None:
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        opaque = _opaque_tag(etag)
+        return any(_opaque_tag(candidate) == opaque for candidate in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+def validator_headers(
+    etag: str,
+    last_modified: Optional[float],
+    cache_control: str,
+    surrogate_keys: List[str],
+) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if surrogate_keys:
+        headers["Surrogate-Key"] = " ".join(surrogate_keys)
+    return headers
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+def _to_model(result: Any, response_model: Optional[Type[BaseModel]]) -> Any:
+    if response_model is not None and not isinstance(result, response_model):
+        return response_model.model_validate(result, from_attributes=True)
+    return result
+
+def _render(result: Any) -> bytes:
+    if isinstance(result, BaseModel):
+        return result.model_dump_json().encode("utf-8")
+    return dump_json(jsonable_encoder(result))
+
+def _route_defaults(func: Callable) -> Dict[str, Any]:
+    """Default argument values of a route, unwrapping Query() and friends"""
+    defaults = {}
+    for name, parameter in inspect.signature(func).parameters.items():
+        default = parameter.default
+        if isinstance(default, params.Depends):
+            continue
+        if isinstance(default, FieldInfo):
+            default = default.default
+        if default is inspect.Parameter.empty or default is PydanticUndefined or default is Ellipsis:
+            continue
+        defaults[name] = default
+    return defaults
+
+def _inject_request(wrapper: Callable, func: Callable):
+    """Let FastAPI pass the request to a wrapper under REQUEST_PARAM"""
+    signature = inspect.signature(func)
+    wrapper.__signature__ = signature.replace(parameters=[
+        *signature.parameters.values(),
+        inspect.Parameter(REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+    ])
+
+@dataclass
+class CachedResponse:
+    """An encoded response body and the metadata needed to serve it"""
+    body: bytes
+    etag: str
+    fresh_until: float
+    content_encoding: Optional[str] = None
+    media_type: str = "application/json"
+    last_modified: Optional[float] = None
+    surrogate_keys: List[str] = field(default_factory=list)
+    warmed: bool = False
+
+    @classmethod
+    def build(
+        cls,
+        body: bytes,
+        expire: int,
+        last_modified: Optional[float] = None,
+        surrogate_keys: Optional[List[str]] = None,
+        warmed: bool = False,
+    ) -> "CachedResponse":
+        etag = content_etag(body)
+        content_encoding = None
+        if len(body) >= settings.cache_response_gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            content_encoding = "gzip"
+        return cls(
+            body=body,
+            etag=etag,
+            fresh_until=time.time() + expire,
+            content_encoding=content_encoding,
+            last_modified=last_modified,
+            surrogate_keys=surrogate_keys or [],
+            warmed=warmed,
+        )
+
+    def dumps(self) -> bytes:
+        """Metadata as a JSON line followed by the raw body"""
+        meta = asdict(self)
+        del meta["body"]
+        return dump_json(meta) + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: Optional[bytes]) -> Optional["CachedResponse"]:
+        """Parse a stored entry; anything unrecognised counts as a miss"""
+        if not data:
+            return None
+        meta, separator, body = data.partition(b"\n")
+        try:
+            return cls(body=body, **json.loads(meta)) if separator else None
+        except (ValueError, TypeError):
+            return None
+
+    def to_response(self, request: Optional[Request] = None, stale_ttl: int = 0) -> Response:
+        max_age = max(0, int(self.fresh_until - time.time()))
+        cache_control = f"public, max-age={max_age}"
+        if stale_ttl:
+            cache_control += f", stale-while-revalidate={stale_ttl}"
+
+        etag = self.etag
+        compressed = False
+        if self.content_encoding:
+            accepted = request.headers.get("accept-encoding", "") if request is not None else ""
+            compressed = accepts_encoding(accepted, self.content_encoding)
+            if compressed:
+                # Each representation needs its own strong validator
+                etag = f'{self.etag[:-1]}-{self.content_encoding}"'
+
+        headers = validator_headers(etag, self.last_modified, cache_control, self.surrogate_keys)
+        if self.content_encoding:
+            headers["Vary"] = "Accept-Encoding"
+
+        if is_not_modified(request, etag, self.last_modified):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        if compressed:
+            headers["Content-Encoding"] = self.content_encoding
+        elif self.content_encoding:
+            body = gzip.decompress(body)
+
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+def cached(
+    expire: int,
+    key_builder: Callable[..., str],
+    response_model: Optional[Type[BaseModel]] = None,
+    stale_ttl: Optional[int] = None,
+    lock_timeout: Optional[float] = None,
+    single_flight: bool = True,
+    services: Optional[Dict[str, Callable[[Any], Any]]] = None,
+    last_modified: Optional[Callable[[Any], Optional[datetime]]] = None,
+    surrogate_keys: Optional[Callable[..., List[str]]] = None,
+    namespaces: Optional[Callable[..., List[str]]] = None,
+):
+    """Cache a route's encoded response in Redis.
+
+    Args:
+        expire: Seconds an entry is served as fresh.
+        key_builder: Called with the route's keyword arguments, returns the cache key.
+        response_model: Schema used to encode results, so ORM objects can be cached.
+            It is applied once when the entry is stored, never on hits.
+        stale_ttl: Seconds past ``expire`` an entry may be served stale while one
+            request refreshes it. ``0`` disables stale-while-revalidate.
+        lock_timeout: Seconds a miss waits for another worker holding the Redis
+            lock before loading the value itself.
+        single_flight: Coalesce concurrent misses for the same key in this worker.
+        services: Maps dependency parameter names to factories taking a DB session.
+            Background refreshes outlive the request, so they rebuild these
+            services on a session of their own.
+        last_modified: Returns the Last-Modified time of an encoded result.
+        surrogate_keys: Called with the route's keyword arguments, returns the
+            Surrogate-Key tags a CDN can purge the response by. Defaults to the
+            key family, the cache key up to the first colon.
+        namespaces: Called with the route's keyword arguments, returns the
+            namespaces whose current generations are appended to the key, so
+            ``invalidate`` on any of them drops the entry.
+    """
+    stale_ttl = settings.cache_stale_ttl_seconds if stale_ttl is None else stale_ttl
+    lock_timeout = settings.cache_lock_timeout_seconds if lock_timeout is None else lock_timeout
+
+    def decorator(func):
+        async def build_key(kwargs: Dict[str, Any]) -> str:
+            key = key_builder(**kwargs)
+            if not namespaces:
+                return key
+            generations = await cache_service.get_generations(namespaces(**kwargs))
+            return f"{key}:g{'.'.join(str(generation) for generation in generations)}"
+
+        @contextmanager
+        def detached(kwargs: Dict[str, Any]):
+            """Route arguments with request-scoped services bound to a new session"""
+            if not services:
+                yield kwargs
+                return
+
+            db = SessionLocal()
+            try:
+                yield {**kwargs, **{name: factory(db) for name, factory in services.items()}}
+            finally:
+                db.close()
+
+        async def load(key: str, kwargs: Dict[str, Any], warmed: bool = False) -> CachedResponse:
+            started = time.perf_counter()
+            result = _to_model(await func(**kwargs), response_model)
+            entry = CachedResponse.build(
+                _render(result),
+                expire,
+                last_modified=_timestamp(last_modified(result)) if last_modified else None,
+                surrogate_keys=surrogate_keys(**kwargs) if surrogate_keys else [key_family(key)],
+                warmed=warmed,
+            )
+            await cache_service.set_raw(key, entry.dumps(), expire=expire + stale_ttl)
+            CACHE_LOAD_DURATION.labels(family=key_family(key)).observe(time.perf_counter() - started)
+            return entry
+
+        async def load_locked(key: str, kwargs: Dict[str, Any]) -> CachedResponse:
+            token = await cache_service.acquire_lock(key, lock_timeout)
+            if token is None:
+                # Another worker is loading this key, wait for its result
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(LOCK_POLL_INTERVAL)
+                    entry = CachedResponse.loads(await cache_service.get_raw(key, record=False))
+                    if entry is not None:
+                        return entry
+                logger.warning(f"Timed out waiting for cache lock on '{key}', loading directly")
+
+            try:
+                return await load(key, kwargs)
+            finally:
+                if token is not None:
+                    await cache_service.release_lock(key, token)
+
+        async def load_coalesced(key: str, kwargs: Dict[str, Any]) -> CachedResponse:
+            if not single_flight:
+                return await load_locked(key, kwargs)
+
+            future = _inflight.get(key)
+            if future is not None:
+                return await asyncio.shield(future)
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[key] = future
+            try:
+                entry = await load_locked(key, kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # Mark as retrieved, followers are optional
+                raise
+            else:
+                future.set_result(entry)
+                return entry
+            finally:
+                _inflight.pop(key, None)
+
+        def refresh_in_background(key: str, kwargs: Dict[str, Any]):
+            if key in _refreshing:
+                return
+
+            async def refresh():
+                try:
+                    token = await cache_service.acquire_lock(key, lock_timeout)
+                    if token is None:
+                        return  # Another worker is already refreshing
+                    try:
+                        with detached(kwargs) as refresh_kwargs:
+                            await load(key, refresh_kwargs)
+                    finally:
+                        await cache_service.release_lock(key, token)
+                except Exception as e:
+                    logger.error(f"Background cache refresh failed for key '{key}': {e}")
+                finally:
+                    _refreshing.pop(key, None)
+
+            _refreshing[key] = asyncio.create_task(refresh())
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.pop(REQUEST_PARAM, None)
+            key = await build_key(kwargs)
+            entry = CachedResponse.loads(await cache_service.get_raw(key))
+
+            if entry is None:
+                CACHE_ROUTE_REQUESTS.labels(family=key_family(key), result="miss").inc()
+                entry = await load_coalesced(key, kwargs)
+            else:
+                if entry.warmed:
+                    CACHE_WARM_HITS.labels(family=key_family(key)).inc()
+                if entry.fresh_until <= time.time():
+                    CACHE_ROUTE_REQUESTS.labels(family=key_family(key), result="stale").inc()
+                    refresh_in_background(key, kwargs)
+                else:
+                    CACHE_ROUTE_REQUESTS.labels(family=key_family(key), result="hit").inc()
+
+            return entry.to_response(request, stale_ttl)
+
+        defaults = _route_defaults(func)
+
+        async def warm(force: bool = False, **arguments) -> Optional[str]:
+            """Store the entry for the given route arguments outside a request.
+
+            Arguments left out take the route's defaults; dependencies come from
+            ``services``. Fresh entries are left alone unless ``force`` is set.
+            Returns the key if an entry was stored.
+            """
+            kwargs = {**defaults, **arguments}
+            key = await build_key(kwargs)
+
+            if not force:
+                entry = CachedResponse.loads(await cache_service.get_raw(key, record=False))
+                if entry is not None and entry.fresh_until > time.time():
+                    return None
+
+            with detached(kwargs) as warm_kwargs:
+                await load(key, warm_kwargs, warmed=True)
+
+            CACHE_WARMS.labels(family=key_family(key)).inc()
+            return key
+
+        wrapper.warm = warm
+        _inject_request(wrapper, func)
+        return wrapper
+
+    return decorator
+
+async def invalidate(*namespaces: str):
+    """Bump the generation of each namespace, dropping every entry keyed on it"""
+    await asyncio.gather(*(cache_service.bump_generation(namespace) for namespace in namespaces))
+
+def conditional(
+    response_model: Optional[Type[BaseModel]] = None,
+    etag: Optional[Callable[[Any], str]] = None,
+    last_modified: Optional[Callable[[Any], Optional[datetime]]] = None,
+    cache_control: str = "no-cache",
+    surrogate_keys: Optional[Callable[..., List[str]]] = None,
+):
+    """Add validators and conditional GET handling to an uncached route.
+
+    Args:
+        response_model: Schema used to encode results, so ORM objects can be returned.
+        etag: Returns a version string for a result; its hash becomes the ETag
+            and a matching If-None-Match is answered before the body is rendered.
+            Without it the ETag is a hash of the rendered body.
+        last_modified: Returns the Last-Modified time of a result.
+        cache_control: Cache-Control header value.
+        surrogate_keys: Called with the route's keyword arguments, returns
+            Surrogate-Key tags.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.pop(REQUEST_PARAM, None)
+            result = await func(**kwargs)
+            if isinstance(result, Response):
+                return result
+
+            result = _to_model(result, response_model)
+            modified = _timestamp(last_modified(result)) if last_modified else None
+            keys = surrogate_keys(**kwargs) if surrogate_keys else []
+
+            body = None
+            if etag is not None:
+                tag = f'"{stable_hash(etag(result))}"'
+            else:
+                body = _render(result)
+                tag = content_etag(body)
+
+            headers = validator_headers(tag, modified, cache_control, keys)
+            if is_not_modified(request, tag, modified):
+                return Response(status_code=304, headers=headers)
+
+            if body is None:
+                body = _render(result)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        _inject_request(wrapper, func)
+        return wrapper
+
+    return decorator
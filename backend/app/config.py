@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Dict, Optional, List
 import os
 
 class Settings(BaseSettings):
@@ -26,6 +26,46 @@ class Settings(BaseSettings):
     # Redis
     redis_url: str = "redis://localhost:6379"
     cache_expire_minutes: int = 60
+    cache_stale_ttl_seconds: int = 300  # Serve expired entries this long while refreshing
+    cache_lock_timeout_seconds: float = 5.0  # Cross-worker lock held while loading a key
+    cache_codec: str = "orjson"  # json, orjson or msgpack
+    cache_compression: str = "zstd"  # none, zlib, zstd or lz4
+    cache_compression_min_bytes: int = 1024
+    cache_compression_level: Optional[int] = None  # Compressor default when unset
+    cache_response_gzip_min_bytes: int = 1000  # Cached response bodies are stored gzipped above this
+    redis_connect_timeout_seconds: float = 1.0
+    redis_socket_timeout_seconds: float = 1.0
+    cache_breaker_failure_threshold: int = 5  # Consecutive Redis failures before serving locally
+    cache_breaker_probe_interval_seconds: float = 5.0
+    cache_fallback_max_entries: int = 1000  # In-process entries kept while Redis is down
+    cache_key_sample_rate: float = 0.01  # Share of lookups counted for the admin top-keys listing
+    cache_key_sample_max_keys: int = 1000
+    
+    # Cache warming
+    cache_warm_on_startup: bool = True
+    cache_warm_startup_timeout_seconds: float = 10.0  # Startup stops waiting, warming continues
+    cache_warm_cities: List[str] = ["Stockholm", "Gothenburg", "Malmö", "Uppsala", "Västerås"]
+    cache_warm_top_searches: int = 20
+    cache_warm_top_places: int = 50
+    cache_warm_concurrency: int = 4
+    cache_warm_debounce_seconds: float = 2.0  # Quiet period after invalidations before re-warming
+    
+    # Unknown ID rejection
+    id_filter_enabled: bool = True
+    id_filter_capacity: int = 100000  # Expected IDs per table; with the error rate this sets memory use
+    id_filter_error_rate: float = 0.01  # Bloom filter false-positive rate
+    id_filter_refresh_seconds: float = 600.0
+    negative_cache_ttl_seconds: int = 60
+    
+    # Place catalog
+    place_catalog_max_age_seconds: float = 300.0  # In-memory snapshot used by duplicate detection and ranking
+    semantic_search_max_results: int = 200
+    semantic_search_min_score: float = 0.05  # Cosine similarity
+    semantic_search_max_terms: int = 64  # Heaviest terms kept per place; bounds index memory
+    semantic_search_max_postings: int = 2000  # Places scored per query term; approximate beyond this
+    similar_places_top_k: int = 10
+    similar_places_ttl_seconds: int = 7 * 24 * 3600  # Lists unrefreshed this long expire
+    analytics_resync_seconds: float = 600.0  # Review analytics rollups are rebuilt from the database this often
     
     # Upstash Redis (for production)
     upstash_redis_url: Optional[str] = None
@@ -35,6 +75,64 @@ class Settings(BaseSettings):
     openrouter_api_key: Optional[str] = None
     openrouter_base_url: str = "https://openrouter.ai/api/v1"
     default_ai_model: str = "anthropic/claude-3-haiku"
+    ai_http_max_connections: int = 20
+    ai_http_max_keepalive_connections: int = 10
+    ai_http_timeout_seconds: float = 60.0
+    ai_stream_queue_size: int = 64  # Tokens buffered per streaming chat before the LLM stream is paused
+    ai_cache_enabled: bool = True
+    # LLM response cache TTL per operation; operations left out are never cached
+    ai_cache_ttl_seconds: Dict[str, int] = {
+        "moderation": 24 * 3600,
+        "enrichment": 7 * 24 * 3600,
+        "description": 7 * 24 * 3600,
+        "recommendation": 3600,
+    }
+    ai_moderation_batch_size: int = 20  # Reviews per LLM request
+    ai_moderation_concurrency: int = 4  # Batch requests in flight at once
+    ai_moderation_toxicity_threshold: float = 0.5  # Reject at or above this score
+    moderation_prefilter_enabled: bool = True  # Decide clear cases locally, before the LLM
+    moderation_prefilter_approve_below: float = 0.02  # Classifier probability of rejection
+    moderation_prefilter_reject_above: float = 0.98
+    moderation_prefilter_min_samples: int = 50  # Moderated reviews per outcome before the classifier is used
+    moderation_prefilter_max_samples: int = 50000  # Most recent moderated reviews trained on
+    moderation_prefilter_retrain_seconds: int = 6 * 3600
+    moderation_blocklist_path: Optional[str] = None  # JSON {category: [patterns]} added to the built-in lists
+    review_default_language: str = "sv"  # For reviews too short to detect
+    ai_agent_max_iterations: int = 3  # Tool calls per chat before the agent must answer
+    ai_agent_tool_max_results: int = 5  # Places listed per tool result
+    ai_chat_session_ttl_seconds: int = 1800  # Chat history expires this long after a session's last message
+    ai_chat_memory_max_tokens: int = 1200  # History sent with each chat; older turns go into the summary
+    ai_chat_summary_max_tokens: int = 200
+    
+    # LLM call limits; calls refused by a limit get the fallback answer
+    ai_llm_max_concurrency: int = 16  # Requests to the provider in flight at once
+    ai_llm_operation_concurrency: Dict[str, int] = {
+        "chat": 8,
+        "moderation_batch": 4,
+        "enrichment": 4,
+        "description": 4,
+    }
+    ai_llm_queue_timeout_seconds: float = 2.0  # Wait for a free slot before falling back
+    ai_llm_deadline_seconds: Dict[str, float] = {
+        "default": 20.0,  # Includes retries
+        "chat": 45.0,
+        "moderation": 10.0,
+        "moderation_batch": 60.0,
+    }
+    ai_llm_max_attempts: int = 3
+    ai_llm_retry_base_delay_seconds: float = 0.5  # Full jitter, doubling up to the max
+    ai_llm_retry_max_delay_seconds: float = 8.0
+    # Start a duplicate request when the first is slower than this; idempotent operations only
+    ai_llm_hedge_after_seconds: Dict[str, float] = {"moderation": 4.0}
+    ai_llm_tokens_per_minute: int = 200000  # Prompt and completion estimate; 0 disables the budget
+    ai_llm_token_burst: int = 40000
+    
+    # Background AI jobs
+    ai_job_concurrency: int = 4
+    ai_job_max_attempts: int = 3
+    ai_job_retry_delay_seconds: float = 2.0  # Doubles on every retry
+    ai_job_result_ttl_seconds: int = 24 * 3600
+    ai_job_queue_max_size: int = 1000
     
     # LangChain
     langchain_tracing_v2: bool = False
@@ -1,19 +1,29 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-import redis.asyncio as redis
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import time
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
-from .config import settings, get_redis_url
+from .config import settings
+from .cache import accepts_encoding
 from .database import connect_to_database, disconnect_from_database, check_database_health
-from .api import places, reviews, ai
+from .services.cache_service import cache_service
+from .services.cache_warmer import cache_warmer
+from .services.ai_service import ai_service
+from .services.job_queue import job_queue
+from .services.id_filter import place_ids, review_ids
+from .services.llm_governor import llm_governor
+from .services.moderation_prefilter import moderation_prefilter
+from .services.review_analytics import review_analytics
+from .services.semantic_index import semantic_index
+from .api import places, reviews, ai, admin
 
 # Configure logging
 logging.basicConfig(
@@ -34,21 +44,43 @@ async def lifespan(app: FastAPI):
     # Connect to database
     await connect_to_database()
     
-    # Setup Redis cache
-    redis_client = redis.from_url(
-        get_redis_url(), 
-        encoding="utf-8", 
-        decode_responses=True
-    )
-    FastAPICache.init(RedisBackend(redis_client), prefix="fika-cache")
+    # Build the LLM client and agent once for the whole process
+    ai_service.setup_ai_services()
+    job_queue.start()
+    
+    # Load existing IDs so unknown ones can be rejected without a query
+    await place_ids.start()
+    await review_ids.start()
+    
+    # Semantic search index builds in the background
+    semantic_index.start()
+    
+    # Moderation prefilter trains on the moderation history in the background
+    moderation_prefilter.start()
+    
+    # Review analytics rollups load and resync in the background
+    review_analytics.start()
+    
+    # Warm the hottest responses before taking traffic, without blocking startup for long
+    if settings.cache_warm_on_startup:
+        warm_task = asyncio.create_task(cache_warmer.warm_all())
+        await asyncio.wait({warm_task}, timeout=settings.cache_warm_startup_timeout_seconds)
     
     logger.info("Application startup complete")
     yield
     
     # Shutdown
     logger.info("Shutting down application")
+    await cache_warmer.stop()
+    await job_queue.stop()
+    await semantic_index.stop()
+    await moderation_prefilter.stop()
+    await review_analytics.stop()
+    await place_ids.stop()
+    await review_ids.stop()
     await disconnect_from_database()
-    await redis_client.close()
+    await cache_service.close()
+    await ai_service.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -69,7 +101,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+class EventStreamAwareGZipMiddleware:
+    """GZipMiddleware that passes Server-Sent Events through uncompressed.
+
+    Compressing a stream holds events in the gzip writer's buffer, so clients
+    would receive tokens in bursts instead of as they are sent. Each response
+    is routed when it starts: event streams go straight to the client,
+    everything else through the gzip middleware. Clients that refuse gzip,
+    e.g. with ``gzip;q=0``, are never sent it; starlette's own check only
+    looks for the word in Accept-Encoding.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, compresslevel: int = 9):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not accepts_encoding(Headers(scope=scope).get("accept-encoding", ""), "gzip"):
+            await self.app(scope, receive, send)
+            return
+
+        async def route(scope: Scope, receive: Receive, gzip_send: Send):
+            target = gzip_send
+
+            async def send_routed(message: Message):
+                nonlocal target
+                if message["type"] == "http.response.start":
+                    content_type = Headers(raw=message["headers"]).get("content-type", "")
+                    target = send if content_type.startswith("text/event-stream") else gzip_send
+                await target(message)
+
+            await self.app(scope, receive, send_routed)
+
+        await GZipMiddleware(route, self.minimum_size, self.compresslevel)(scope, receive, send)
+
+app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1000)
 
 # Metrics middleware
 @app.middleware("http")
@@ -96,6 +163,7 @@ async def metrics_middleware(request: Request, call_next):
 app.include_router(places.router, prefix="/api/places", tags=["places"])
 app.include_router(reviews.router, prefix="/api/reviews", tags=["reviews"])
 app.include_router(ai.router, prefix="/ai", tags=["ai"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 # Health check endpoints
 @app.get("/health", tags=["health"])
@@ -110,8 +178,9 @@ async def health_check():
 
 @app.get("/health/detailed", tags=["health"])
 async def detailed_health_check():
-    """Detailed health check with database connectivity"""
+    """Detailed health check with database and cache connectivity"""
     db_healthy = await check_database_health()
+    cache_status = cache_service.status()
     
     return {
         "status": "healthy" if db_healthy else "unhealthy",
@@ -119,6 +188,15 @@ async def detailed_health_check():
         "version": settings.app_version,
         "environment": settings.environment,
         "database": "connected" if db_healthy else "disconnected",
+        # Redis being down degrades latency, not correctness, so it doesn't fail the check
+        "cache": "degraded" if cache_service.circuit_breaker.is_open else "connected",
+        "cache_circuit_breaker": cache_status["circuit_breaker"],
+        "cache_fallback_entries": cache_status["fallback_entries"],
+        "id_filters": {"places": place_ids.stats(), "reviews": review_ids.stats()},
+        "semantic_index": semantic_index.stats(),
+        "llm": llm_governor.snapshot(),
+        "moderation_prefilter": moderation_prefilter.stats(),
+        "review_analytics": review_analytics.stats(),
         "timestamp": time.time()
     }
 
@@ -31,6 +31,7 @@ class Review(Base):
     # Moderation
     moderated = Column(Integer, default=0)  # 0: pending, 1: approved, -1: rejected
     moderated_at = Column(DateTime(timezone=True))
+    moderated_by = Column(String(20))  # "prefilter", "llm" or "admin"; None if decided before this was recorded
     
     # Additional fields
     helpful_count = Column(Integer, default=0)
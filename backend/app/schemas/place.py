@@ -86,6 +86,17 @@ class PlaceList(BaseModel):
     class Config:
         from_attributes = True
 
+class SimilarPlace(BaseModel):
+    """Schema for a place similar to another"""
+    place: Place
+    score: float
+
+class SimilarPlaceList(BaseModel):
+    """Schema for a place's precomputed similar places"""
+    place_id: uuid.UUID
+    similar: List[SimilarPlace]
+    computed: bool  # False until the place's list has been computed
+
 class PlaceSearch(BaseModel):
     """Schema for place search parameters"""
     query: Optional[str] = None
@@ -108,5 +119,5 @@ class PlaceSearch(BaseModel):
     per_page: int = Field(20, ge=1, le=100)
     
     # Sorting
-    sort_by: str = Field("name", regex="^(name|rating|distance|created_at)$")
-    sort_order: str = Field("asc", regex="^(asc|desc)$")
\ No newline at end of file
+    sort_by: str = Field("name", pattern="^(name|rating|distance|created_at)$")
+    sort_order: str = Field("asc", pattern="^(asc|desc)$")
\ No newline at end of file
@@ -8,7 +8,7 @@ class ReviewBase(BaseModel):
     comment: Optional[str] = Field(None, max_length=1000, description="Review comment")
     fika_items: Optional[List[str]] = Field(None, description="Fika items tried")
     visit_date: Optional[date] = Field(None, description="Date of visit")
-    visit_time: Optional[str] = Field(None, regex="^(morning|afternoon|evening)$", description="Time of visit")
+    visit_time: Optional[str] = Field(None, pattern="^(morning|afternoon|evening)$", description="Time of visit")
     user_name: Optional[str] = Field(None, max_length=100, description="Reviewer name (optional)")
     
     @validator('fika_items', pre=True)
@@ -33,7 +33,7 @@ class ReviewUpdate(BaseModel):
     comment: Optional[str] = Field(None, max_length=1000)
     fika_items: Optional[List[str]] = None
     visit_date: Optional[date] = None
-    visit_time: Optional[str] = Field(None, regex="^(morning|afternoon|evening)$")
+    visit_time: Optional[str] = Field(None, pattern="^(morning|afternoon|evening)$")
     user_name: Optional[str] = Field(None, max_length=100)
 
 class Review(ReviewBase):
@@ -47,6 +47,7 @@ class Review(ReviewBase):
     # Moderation status
     moderated: int = 0  # 0: pending, 1: approved, -1: rejected
     moderated_at: Optional[datetime] = None
+    moderated_by: Optional[str] = None  # prefilter, llm or admin
     
     helpful_count: int = 0
     language: str = "sv"
@@ -83,5 +84,5 @@ class ReviewSummary(BaseModel):
 class ReviewModeration(BaseModel):
     """Schema for review moderation"""
     review_id: uuid.UUID
-    action: str = Field(..., regex="^(approve|reject)$")
+    action: str = Field(..., pattern="^(approve|reject)$")
     reason: Optional[str] = Field(None, max_length=500)
\ No newline at end of file
@@ -1,32 +1,211 @@
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional
+import asyncio
+import hashlib
 import json
 import logging
-from datetime import datetime
+import uuid
+
+import httpx
+from prometheus_client import Counter, Histogram
 
 from ..config import settings
+from .cache_service import cache_service
+from .chat_memory import ChatSession, chat_memory
+from .duplicate_detector import DuplicateDetector
+from .language_detector import LANGUAGE_NAMES, language_detector
+from .llm_governor import LLMLimitError, llm_governor
+from .moderation_prefilter import PrefilterVerdict, moderation_prefilter
+from .place_catalog import place_catalog
+from .place_lookup import PlaceLookup
+from .recommender import PlaceRecommender
+from .review_analytics import review_analytics
+from .semantic_index import tokenize
 
 # Conditional imports for AI services
 try:
+    import openai
     from langchain.chat_models import ChatOpenAI
     from langchain.schema import HumanMessage, SystemMessage
-    from langchain.agents import initialize_agent, Tool
+    from langchain.agents import AgentExecutor, ConversationalAgent, Tool
     from langchain.memory import ConversationBufferMemory
+    from langchain.callbacks.base import AsyncCallbackHandler
     LANGCHAIN_AVAILABLE = True
 except ImportError:
+    AsyncCallbackHandler = object  # Only subclassed below, never used without LangChain
     LANGCHAIN_AVAILABLE = False
     logging.warning("LangChain not installed. AI features will return mock responses.")
 
 logger = logging.getLogger(__name__)
 
+LLM_CACHE_REQUESTS = Counter(
+    'fika_ai_cache_requests_total',
+    'LLM completions by response cache outcome: hit, miss or bypass',
+    ['operation', 'result']
+)
+
+AGENT_ITERATIONS = Histogram(
+    'fika_agent_iterations',
+    'LLM calls per chat agent run',
+    ['mode'],
+    buckets=(1, 2, 3, 4, 5, 6, 8)
+)
+
+AGENT_TOKENS = Counter(
+    'fika_agent_tokens_total',
+    'Tokens used by chat agent runs, by kind: prompt or completion',
+    ['mode', 'kind']
+)
+
+AGENT_TOOL_CALLS = Counter(
+    'fika_agent_tool_calls_total',
+    'Chat agent tool calls',
+    ['tool']
+)
+
+# Output budget per item for batch moderation, on top of a fixed allowance
+BATCH_MODERATION_TOKENS_PER_ITEM = 80
+
+# Token budget reserved per agent step (prompt with tools and history, plus answer)
+AGENT_TOKENS_PER_ITERATION = 1500
+
+def _estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough prompt size at four characters a token, plus the output allowance"""
+    return len(prompt) // 4 + max_tokens
+
+def _strip_code_fence(text: str) -> str:
+    """Remove a Markdown code fence models often wrap JSON in"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text.strip()
+
+# Marks the end of a chat stream's token queue
+_STREAM_END = object()
+
+class _AnswerStreamHandler(AsyncCallbackHandler):
+    """Forwards the agent's final answer tokens to a bounded queue.
+
+    The conversational agent writes its reasoning and tool calls before the
+    answer prefix ("AI:"), so only text after the prefix is forwarded. ``put``
+    waits while the queue is full, so a slow client slows down reading the
+    LLM stream instead of buffering it without limit.
+    """
+
+    def __init__(self, queue: asyncio.Queue, ai_prefix: str):
+        self.queue = queue
+        self.prefix = f"{ai_prefix}:"
+        self._text = ""
+        self._answering = False
+
+    def _reset(self):
+        self._text = ""
+        self._answering = False
+
+    async def on_llm_start(self, *args, **kwargs):
+        self._reset()
+
+    async def on_chat_model_start(self, *args, **kwargs):
+        self._reset()
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        if self._answering:
+            await self.queue.put(token)
+            return
+
+        self._text += token
+        index = self._text.find(self.prefix)
+        if index != -1:
+            self._answering = True
+            answer = self._text[index + len(self.prefix):].lstrip()
+            if answer:
+                await self.queue.put(answer)
+
+class _AgentMetricsHandler(AsyncCallbackHandler):
+    """Counts LLM calls, tokens and tool calls of one agent run.
+
+    Token counts come from the provider's ``token_usage``; streamed responses
+    don't report it, so their completion tokens are counted as they arrive.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._streamed_tokens = 0
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        self._streamed_tokens += 1
+
+    async def on_llm_end(self, response, **kwargs):
+        self.llm_calls += 1
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens") or self._streamed_tokens
+        self._streamed_tokens = 0
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
+        AGENT_TOOL_CALLS.labels(tool=serialized.get("name", "unknown")).inc()
+
+    def record(self):
+        if not self.llm_calls:
+            return
+        AGENT_ITERATIONS.labels(mode=self.mode).observe(self.llm_calls)
+        AGENT_TOKENS.labels(mode=self.mode, kind="prompt").inc(self.prompt_tokens)
+        AGENT_TOKENS.labels(mode=self.mode, kind="completion").inc(self.completion_tokens)
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
 class AIService:
-    def __init__(self, db=None):
-        self.db = db
+    """LLM-backed features, shared by every request in the process.
+
+    The LLM client, its HTTP connection pools, the tools and the agent are
+    built once by ``setup_ai_services`` at startup. Only the conversation
+    memory and the agent executor wrapping it are created per chat, with
+    the memory loaded from the chat's session in ``chat_memory``.
+    """
+
+    def __init__(self):
         self.llm = None
         self.agent = None
-        self.setup_ai_services()
+        self.streaming_agent = None
+        self.tools = []
+        self._http_clients = []
+        self.duplicate_detector = DuplicateDetector()
+        self.recommender = PlaceRecommender()
+        self.place_lookup = PlaceLookup(max_results=settings.ai_agent_tool_max_results)
+
+    def _openai_clients(self):
+        """Chat completion clients on pooled, keep-alive HTTP connections"""
+        limits = httpx.Limits(
+            max_connections=settings.ai_http_max_connections,
+            max_keepalive_connections=settings.ai_http_max_keepalive_connections
+        )
+        timeout = httpx.Timeout(settings.ai_http_timeout_seconds)
+        http_client = httpx.Client(limits=limits, timeout=timeout)
+        async_http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._http_clients = [http_client, async_http_client]
+
+        client_params = {
+            "api_key": settings.openrouter_api_key,
+            "base_url": settings.openrouter_base_url,
+            "max_retries": 0,  # The LLM governor retries within each call's deadline
+        }
+        client = openai.OpenAI(http_client=http_client, **client_params)
+        async_client = openai.AsyncOpenAI(http_client=async_http_client, **client_params)
+        return client.chat.completions, async_client.chat.completions
 
     def setup_ai_services(self):
         """Initialize AI services if available"""
+        if self.llm is not None:
+            return
+
         if not LANGCHAIN_AVAILABLE:
             logger.warning("AI services not available - LangChain not installed")
             return
@@ -37,48 +216,73 @@ class AIService:
 
         try:
             # Initialize OpenRouter LLM via OpenAI-compatible API
+            client, async_client = self._openai_clients()
             self.llm = ChatOpenAI(
                 openai_api_base=settings.openrouter_base_url,
                 openai_api_key=settings.openrouter_api_key,
                 model_name=settings.default_ai_model,
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=500,
+                client=client,
+                async_client=async_client
             )
             
-            # Setup tools for the agent
-            tools = [
+            # Setup tools for the agent; descriptions say exactly what input
+            # each expects, so the agent rarely needs a second try
+            self.tools = [
                 Tool(
                     name="Search Places",
-                    func=self._search_places_tool,
-                    description="Search for fika places by name, city, or features"
+                    func=None,
+                    coroutine=self._search_places_tool,
+                    description=(
+                        "Find fika places. Input: words naming a place, city, specialty or feature, "
+                        "e.g. 'kanelbullar Stockholm' or 'outdoor seating Malmö'. "
+                        "Returns the best matches, one per line: name (city) rating/reviews price · specialties"
+                    )
                 ),
                 Tool(
                     name="Get Place Info",
-                    func=self._get_place_info_tool,
-                    description="Get detailed information about a specific place"
+                    func=None,
+                    coroutine=self._get_place_info_tool,
+                    description=(
+                        "Details of one place: address, specialties, features and description. "
+                        "Input: the place name, e.g. 'Vete-Katten'"
+                    )
+                ),
+                Tool(
+                    name="Nearby Places",
+                    func=None,
+                    coroutine=self._nearby_places_tool,
+                    description=(
+                        "Places closest to a location. Input: 'latitude, longitude' or "
+                        "'latitude, longitude, radius_km', or a place name to find places near it"
+                    )
                 ),
                 Tool(
                     name="Swedish Culture Info",
                     func=self._swedish_culture_info,
-                    description="Provide information about Swedish fika culture and traditions"
+                    description=(
+                        "Short facts on Swedish fika culture. Input: one topic, e.g. 'fika', "
+                        "'kanelbullar', 'prinsesstarta' or 'konditori'"
+                    )
                 )
             ]
             
-            # Initialize conversation memory
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            )
+            # Initialize agent; its prompt and LLM chain are reused by every chat
+            self.agent = ConversationalAgent.from_llm_and_tools(self.llm, self.tools)
             
-            # Initialize agent
-            self.agent = initialize_agent(
-                tools,
-                self.llm,
-                agent="conversational-react-description",
-                memory=memory,
-                verbose=settings.debug,
-                max_iterations=3
+            # Same agent on a streaming LLM sharing the connection pools, for chat_stream
+            streaming_llm = ChatOpenAI(
+                openai_api_base=settings.openrouter_base_url,
+                openai_api_key=settings.openrouter_api_key,
+                model_name=settings.default_ai_model,
+                temperature=0.7,
+                max_tokens=500,
+                streaming=True,
+                client=client,
+                async_client=async_client
             )
+            self.streaming_agent = ConversationalAgent.from_llm_and_tools(streaming_llm, self.tools)
             
             logger.info("AI services initialized successfully")
             
@@ -86,60 +290,173 @@ class AIService:
             logger.error(f"Failed to initialize AI services: {e}")
             self.llm = None
             self.agent = None
+            self.streaming_agent = None
+            self.tools = []
+
+    def _agent_executor(self, agent=None, session: Optional[ChatSession] = None) -> "AgentExecutor":
+        """Executor around a shared agent with a conversation memory of its own, holding the session's history"""
+        agent = agent or self.agent
+        # The conversational agent's prompt takes the history as plain "Human: ..." / "AI: ..." lines
+        memory = ConversationBufferMemory(
+            memory_key="chat_history",
+            human_prefix="Human",
+            ai_prefix=agent.ai_prefix,
+            return_messages=False
+        )
+        if session is not None:
+            if session.summary_text:
+                memory.chat_memory.add_message(SystemMessage(content=session.summary_text))
+            for human, ai in session.turns:
+                memory.chat_memory.add_user_message(human)
+                memory.chat_memory.add_ai_message(ai)
+        return AgentExecutor.from_agent_and_tools(
+            agent=agent,
+            tools=self.tools,
+            memory=memory,
+            verbose=settings.debug,
+            max_iterations=settings.ai_agent_max_iterations,
+            # At the limit, answer from what the tools returned instead of giving up
+            early_stopping_method="generate"
+        )
+
+    async def _call_llm(self, operation: str, prompt: str, **llm_kwargs) -> str:
+        """One completion under the LLM governor's limits; raises LLMLimitError when refused"""
+        estimate = _estimate_tokens(prompt, llm_kwargs.get("max_tokens", self.llm.max_tokens or 500))
+        response = await llm_governor.run(
+            operation,
+            lambda: self.llm.agenerate([[HumanMessage(content=prompt)]], **llm_kwargs),
+            estimated_tokens=estimate
+        )
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            llm_governor.refund(estimate - usage["total_tokens"])
+        return response.generations[0][0].text
+
+    def _completion_key(self, operation: str, prompt: str) -> str:
+        # Prompts are indented templates, so whitespace differences don't count
+        normalized = " ".join(prompt.split())
+        digest = hashlib.blake2b(f"{settings.default_ai_model}\n{normalized}".encode("utf-8"), digest_size=16)
+        return f"llm:{operation}:{digest.hexdigest()}"
+
+    async def _complete(
+        self,
+        operation: str,
+        prompt: str,
+        use_cache: bool = True,
+        cacheable: Optional[Callable[[str], bool]] = None,
+        **llm_kwargs
+    ) -> str:
+        """Completion for a prompt, served from the response cache when possible.
+
+        Responses are cached per model and normalized prompt for the
+        operation's TTL in ``ai_cache_ttl_seconds``. Responses rejected by
+        ``cacheable`` (e.g. unparseable JSON) are returned but not stored.
+        ``llm_kwargs`` override model parameters and are not part of the key.
+        """
+        ttl = settings.ai_cache_ttl_seconds.get(operation)
+        if not (use_cache and settings.ai_cache_enabled and ttl):
+            LLM_CACHE_REQUESTS.labels(operation=operation, result="bypass").inc()
+            return await self._call_llm(operation, prompt, **llm_kwargs)
+
+        key = self._completion_key(operation, prompt)
+        cached = await cache_service.get(key)
+        if cached is not None:
+            LLM_CACHE_REQUESTS.labels(operation=operation, result="hit").inc()
+            return cached
+
+        LLM_CACHE_REQUESTS.labels(operation=operation, result="miss").inc()
+        text = await self._call_llm(operation, prompt, **llm_kwargs)
+        if cacheable is None or cacheable(text):
+            await cache_service.set(key, text, expire=ttl)
+        return text
+
+    async def close(self):
+        """Close the pooled HTTP connections to the LLM provider"""
+        for client in self._http_clients:
+            try:
+                if isinstance(client, httpx.AsyncClient):
+                    await client.aclose()
+                else:
+                    client.close()
+            except Exception as e:
+                logger.error(f"Failed to close AI HTTP client: {e}")
+        self._http_clients = []
+        self.llm = None
+        self.agent = None
+        self.streaming_agent = None
+        self.tools = []
 
     async def get_recommendations(self, user_preferences: Dict[str, Any], city: Optional[str] = None, max_results: int = 5) -> Dict[str, Any]:
-        """Get personalized fika place recommendations"""
+        """Rank real places against the preferences; the LLM only writes the explanation"""
         try:
-            if not self.llm:
-                return self._mock_recommendations(user_preferences, city, max_results)
-
-            prompt = f"""
-            Based on these user preferences: {json.dumps(user_preferences)}
-            {"" if not city else f"Focusing on {city}, "}recommend {max_results} traditional Swedish fika places.
-            
-            Consider:
-            - Traditional Swedish pastries (kanelbullar, prinsesstårta, etc.)
-            - Atmosphere and authenticity
-            - Price range preferences
-            - Special dietary needs
-            - Location preferences
-            
-            Return recommendations as a structured response with explanations.
-            """
-            
-            response = await self.llm.agenerate([prompt])
-            
-            return {
-                "recommendations": self._parse_recommendations(response.generations[0][0].text),
-                "explanation": "AI-generated recommendations based on your preferences",
-                "confidence": 0.85
-            }
-            
+            snapshot = await place_catalog.get()
+            places = await asyncio.to_thread(self.recommender.recommend, snapshot, user_preferences, city, max_results)
         except Exception as e:
             logger.error(f"Failed to generate recommendations: {e}")
-            return self._mock_recommendations(user_preferences, city, max_results)
+            return {"recommendations": [], "explanation": "Recommendations are temporarily unavailable", "confidence": 0.0}
+
+        explanation = self._summarize_recommendations(places, city)
+        if self.llm and places:
+            try:
+                explanation = await self._explain_recommendations(user_preferences, places)
+            except Exception as e:
+                logger.warning(f"Recommendation explanation failed, using summary: {e}")
+
+        return {
+            "recommendations": places,
+            "explanation": explanation,
+            "confidence": round(sum(place["score"] for place in places) / len(places), 2) if places else 0.0
+        }
+
+    async def _explain_recommendations(self, user_preferences: Dict[str, Any], places: List[Dict[str, Any]]) -> str:
+        listed = "\n".join(
+            f"- {place['name']} ({place['city']}): specialties {', '.join(place['matched_specialties']) or 'none matched'}, "
+            f"features {', '.join(place['matched_features']) or 'none matched'}, rating {place['rating']}"
+            for place in places
+        )
+        prompt = f"""
+        A visitor with these preferences: {json.dumps(user_preferences, sort_keys=True)}
+        was recommended these Swedish fika places, best match first:
+        {listed}
+        
+        In 2-3 friendly sentences, explain why these places suit the visitor.
+        Only mention the places listed. Write only the explanation.
+        """
+        response = await self._complete("recommendation", prompt, cacheable=lambda text: bool(text.strip()))
+        return response.strip()
+
+    def _summarize_recommendations(self, places: List[Dict[str, Any]], city: Optional[str]) -> str:
+        if not places:
+            return f"No places in {city} match these preferences" if city else "No places match these preferences"
+        return "Ranked by matching specialties and features, price, rating and distance"
+
+    async def moderate_content(self, text: str, content_type: str = "review", use_cache: bool = True) -> Dict[str, Any]:
+        """Use AI to moderate user-generated content; clear cases are decided locally first"""
+        verdict = moderation_prefilter.assess(text)
+        if verdict.decision is not None:
+            return self._prefilter_moderation(text, verdict)
 
-    async def moderate_content(self, text: str, content_type: str = "review") -> Dict[str, Any]:
-        """Use AI to moderate user-generated content"""
         try:
             if not self.llm:
                 return self._mock_content_moderation(text)
 
+            # Language is detected locally, so the model isn't asked for it
+            language = language_detector.detect(text)
             prompt = f"""
             Analyze this {content_type} for a Swedish fika location and determine:
             1. Is it appropriate and respectful? (yes/no)
             2. Toxicity level (0.0 to 1.0, where 0 is completely safe)
             3. Does it contain spam or promotional content? (yes/no)
-            4. What language is it in? (language code)
-            5. Brief explanation of the assessment
+            4. Brief explanation of the assessment
             
-            Text to analyze: "{text}"
+            Text to analyze ({LANGUAGE_NAMES.get(language, language)}): "{text}"
             
-            Respond in JSON format with keys: is_appropriate, toxicity_score, contains_spam, language, explanation
+            Respond in JSON format with keys: is_appropriate, toxicity_score, contains_spam, explanation
             """
             
-            response = await self.llm.agenerate([prompt])
-            result = self._parse_moderation_response(response.generations[0][0].text)
+            response = await self._complete("moderation", prompt, use_cache, cacheable=_is_json)
+            result = self._parse_moderation_response(response)
+            result["language"] = language
             
             return result
             
@@ -147,11 +464,75 @@ class AIService:
             logger.error(f"Content moderation failed: {e}")
             return self._mock_content_moderation(text)
 
-    async def chat(self, message: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Chat with AI assistant about fika places and Swedish culture"""
+    async def moderate_batch(
+        self,
+        texts: List[str],
+        content_type: str = "review",
+        languages: Optional[List[str]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Moderate many texts with a single LLM call.
+
+        Returns one result per text, in order, with the same keys as
+        ``moderate_content``; None where the model's answer for an item was
+        missing or malformed. ``languages`` are the texts' known language
+        codes; they are detected when not given.
+        """
+        if not texts:
+            return []
+        if not self.llm:
+            return [self._mock_content_moderation(text) for text in texts]
+
+        languages = languages or language_detector.detect_many(texts)
+        # Texts are embedded as JSON so quotes or instructions in a review can't break the prompt
+        items = json.dumps(
+            [{"id": i, "language": language, "text": text} for i, (text, language) in enumerate(zip(texts, languages))],
+            ensure_ascii=False
+        )
+        prompt = f"""
+        Analyze each {content_type} below for a Swedish fika location and determine for each:
+        1. Is it appropriate and respectful? (true/false)
+        2. Toxicity level (0.0 to 1.0, where 0 is completely safe)
+        3. Does it contain spam or promotional content? (true/false)
+        4. A one-sentence explanation of the assessment
+        
+        Items (JSON): {items}
+        
+        Respond with only a JSON array containing one object per item, with keys:
+        id, is_appropriate, toxicity_score, contains_spam, explanation
+        """
+
+        try:
+            response = await self._complete(
+                "moderation_batch",
+                prompt,
+                use_cache=False,
+                max_tokens=BATCH_MODERATION_TOKENS_PER_ITEM * len(texts) + 100
+            )
+        except Exception as e:
+            logger.error(f"Batch moderation failed: {e}")
+            return [None] * len(texts)
+
+        results = self._parse_batch_moderation_response(response, len(texts))
+        for result, language in zip(results, languages):
+            if result is not None:
+                result["language"] = language
+        return results
+
+    async def chat(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Chat with AI assistant about fika places and Swedish culture.
+
+        The conversation continues the session ``session_id``, or a new
+        session whose ID is returned with the answer.
+        """
+        session_id = session_id or uuid.uuid4().hex
         try:
             if not self.agent:
-                return self._mock_chat_response(message)
+                return {**self._mock_chat_response(message), "session_id": session_id}
 
             # Add context to the message if provided
             if context:
@@ -159,20 +540,132 @@ class AIService:
             else:
                 enhanced_message = message
             
-            response = await self.agent.arun(enhanced_message)
+            session = await chat_memory.load(session_id)
+            executor = self._agent_executor(session=session)
+            metrics = _AgentMetricsHandler("chat")
+            estimate = AGENT_TOKENS_PER_ITERATION * settings.ai_agent_max_iterations
+            try:
+                response = await llm_governor.run(
+                    "chat",
+                    lambda: executor.arun(enhanced_message, callbacks=[metrics]),
+                    estimated_tokens=estimate
+                )
+            finally:
+                metrics.record()
+            # Failed calls already got their reservation back from the governor
+            if metrics.prompt_tokens:
+                llm_governor.refund(estimate - metrics.prompt_tokens - metrics.completion_tokens)
+            await chat_memory.append(session, message, response)
             
             return {
                 "response": response,
                 "suggestions": self._generate_suggestions(message),
-                "confidence": 0.9
+                "confidence": 0.9,
+                "session_id": session_id
             }
             
+        except LLMLimitError as e:
+            logger.warning(f"Chat answered with fallback: {e}")
+            return {**self._mock_chat_response(message), "session_id": session_id}
         except Exception as e:
             logger.error(f"Chat failed: {e}")
-            return self._mock_chat_response(message)
+            return {**self._mock_chat_response(message), "session_id": session_id}
+
+    async def chat_stream(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Chat, yielding answer tokens as the LLM produces them.
+
+        Yields ``{"event": "token", "data": {"text": ...}}`` events, then one
+        ``done`` event with the same payload ``chat`` returns. Closing the
+        iterator early (e.g. the client disconnected) cancels the agent run,
+        and the turn isn't added to the session.
+        """
+        session_id = session_id or uuid.uuid4().hex
+        if not self.streaming_agent:
+            response = {**self._mock_chat_response(message), "session_id": session_id}
+            yield {"event": "token", "data": {"text": response["response"]}}
+            yield {"event": "done", "data": response}
+            return
 
-    async def enrich_place_data(self, place: Any) -> Dict[str, Any]:
-        """Use AI to enrich place data with additional information"""
+        if context:
+            enhanced_message = f"Context: {json.dumps(context)}\n\nUser question: {message}"
+        else:
+            enhanced_message = message
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ai_stream_queue_size)
+        handler = _AnswerStreamHandler(queue, self.streaming_agent.ai_prefix)
+        metrics = _AgentMetricsHandler("stream")
+        session = await chat_memory.load(session_id)
+        executor = self._agent_executor(self.streaming_agent, session)
+
+        async def run() -> str:
+            try:
+                # Not retried: answer tokens may already have been sent
+                return await llm_governor.run(
+                    "chat",
+                    lambda: executor.arun(enhanced_message, callbacks=[handler, metrics]),
+                    estimated_tokens=AGENT_TOKENS_PER_ITERATION * settings.ai_agent_max_iterations,
+                    max_attempts=1
+                )
+            finally:
+                metrics.record()
+                # If the queue is full the consumer still drains it and sees the task is done
+                try:
+                    queue.put_nowait(_STREAM_END)
+                except asyncio.QueueFull:
+                    pass
+
+        task = asyncio.create_task(run())
+        sent = False
+        try:
+            while not (task.done() and queue.empty()):
+                token = await queue.get()
+                if token is _STREAM_END:
+                    break
+                sent = True
+                yield {"event": "token", "data": {"text": token}}
+
+            try:
+                response = await task
+            except LLMLimitError as e:
+                if sent:
+                    logger.error(f"Streaming chat stopped: {e}")
+                    yield {"event": "error", "data": {"detail": "Chat failed"}}
+                    return
+                logger.warning(f"Chat answered with fallback: {e}")
+                response = {**self._mock_chat_response(message), "session_id": session_id}
+                yield {"event": "token", "data": {"text": response["response"]}}
+                yield {"event": "done", "data": response}
+                return
+            except Exception as e:
+                logger.error(f"Streaming chat failed: {e}")
+                yield {"event": "error", "data": {"detail": "Chat failed"}}
+                return
+
+            await chat_memory.append(session, message, response)
+            yield {
+                "event": "done",
+                "data": {
+                    "response": response,
+                    "suggestions": self._generate_suggestions(message),
+                    "confidence": 0.9,
+                    "session_id": session_id
+                }
+            }
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def enrich_place_data(self, place: Any, use_cache: bool = True, fallback: bool = True) -> Dict[str, Any]:
+        """Use AI to enrich place data with additional information.
+
+        With ``fallback`` off, LLM errors are raised instead of answered with
+        the mock result, so background jobs can retry them.
+        """
         try:
             if not self.llm:
                 return self._mock_place_enrichment(place)
@@ -194,17 +687,19 @@ class AIService:
             Respond in JSON format with keys: description, specialties, features, meta_description
             """
             
-            response = await self.llm.agenerate([prompt])
-            result = self._parse_enrichment_response(response.generations[0][0].text)
+            response = await self._complete("enrichment", prompt, use_cache, cacheable=_is_json)
+            result = self._parse_enrichment_response(response)
             
             return result
             
         except Exception as e:
             logger.error(f"Place enrichment failed: {e}")
+            if not fallback:
+                raise
             return self._mock_place_enrichment(place)
 
-    async def generate_place_description(self, place: Any) -> str:
-        """Generate AI-powered description for a place"""
+    async def generate_place_description(self, place: Any, use_cache: bool = True, fallback: bool = True) -> str:
+        """Generate AI-powered description for a place, raising LLM errors unless ``fallback``"""
         try:
             if not self.llm:
                 return self._mock_place_description(place)
@@ -227,62 +722,69 @@ class AIService:
             Write only the description, no additional formatting.
             """
             
-            response = await self.llm.agenerate([prompt])
-            return response.generations[0][0].text.strip()
+            response = await self._complete("description", prompt, use_cache, cacheable=lambda text: bool(text.strip()))
+            return response.strip()
             
         except Exception as e:
             logger.error(f"Description generation failed: {e}")
+            if not fallback:
+                raise
             return self._mock_place_description(place)
 
-    async def detect_duplicate_places(self) -> List[Dict[str, Any]]:
-        """Use AI to detect potential duplicate place entries"""
+    async def detect_duplicate_places(
+        self,
+        city: Optional[str] = None,
+        min_score: float = 0.7,
+        limit: Optional[int] = 100,
+    ) -> List[Dict[str, Any]]:
+        """Find likely duplicate place entries in the catalog, best matches first"""
         try:
-            # This would require database access to compare places
-            # For now, return mock data
-            return self._mock_duplicate_detection()
-            
+            snapshot = await place_catalog.get()
+            places = snapshot.places
+            if city:
+                places = [place for place in places if place.city.lower() == city.lower()]
+
+            # CPU-bound; keep it off the event loop
+            return await asyncio.to_thread(self.duplicate_detector.find, places, min_score, limit)
+
         except Exception as e:
             logger.error(f"Duplicate detection failed: {e}")
             return []
 
-    async def get_analytics(self, timeframe: str) -> Dict[str, Any]:
-        """Generate AI-powered analytics and insights"""
+    async def get_analytics(self, timeframe: str, city: Optional[str] = None) -> Dict[str, Any]:
+        """Review analytics and insights from the incrementally maintained rollups"""
         try:
-            return {
-                "timeframe": timeframe,
-                "insights": [
-                    "Traditional konditoris show higher user engagement",
-                    "Stockholm locations receive more international visitors",
-                    "Cinnamon bun popularity peaks on weekends"
-                ],
-                "recommendations": [
-                    "Focus marketing on weekend fika experiences",
-                    "Highlight traditional aspects in descriptions",
-                    "Consider seasonal specialty promotions"
-                ],
-                "generated_at": datetime.now().isoformat()
-            }
+            return await review_analytics.report(timeframe, city)
             
         except Exception as e:
             logger.error(f"Analytics generation failed: {e}")
             return {"error": str(e)}
 
     # Tool functions for the agent
-    def _search_places_tool(self, query: str) -> str:
+    async def _search_places_tool(self, query: str) -> str:
         """Tool function for searching places"""
         try:
-            # This would integrate with the place service
-            return f"Found places matching '{query}' (mock response)"
+            snapshot = await place_catalog.get()
+            return await asyncio.to_thread(self.place_lookup.search, snapshot, query)
         except Exception as e:
             return f"Search failed: {e}"
 
-    def _get_place_info_tool(self, place_name: str) -> str:
+    async def _get_place_info_tool(self, place_name: str) -> str:
         """Tool function for getting place information"""
         try:
-            return f"Information about {place_name} (mock response)"
+            snapshot = await place_catalog.get()
+            return await asyncio.to_thread(self.place_lookup.info, snapshot, place_name.strip().strip("'\""))
         except Exception as e:
             return f"Info lookup failed: {e}"
 
+    async def _nearby_places_tool(self, location: str) -> str:
+        """Tool function for finding places near a location"""
+        try:
+            snapshot = await place_catalog.get()
+            return await asyncio.to_thread(self.place_lookup.nearby, snapshot, location.strip().strip("'\""))
+        except Exception as e:
+            return f"Nearby lookup failed: {e}"
+
     def _swedish_culture_info(self, topic: str) -> str:
         """Tool function for Swedish culture information"""
         culture_info = {
@@ -292,30 +794,30 @@ class AIService:
             "konditori": "Traditional Swedish pastry shops that have served communities for generations."
         }
         
-        return culture_info.get(topic.lower(), f"Swedish culture topic: {topic}")
-
-    # Mock response generators for when AI services are unavailable
-    def _mock_recommendations(self, preferences: Dict[str, Any], city: Optional[str], max_results: int) -> Dict[str, Any]:
-        """Generate mock recommendations"""
-        mock_places = [
-            {"name": "Traditional Konditori", "city": city or "Stockholm", "reason": "Authentic Swedish pastries"},
-            {"name": "Cozy Coffee Corner", "city": city or "Stockholm", "reason": "Perfect atmosphere for fika"},
-            {"name": "Historic Bakery", "city": city or "Stockholm", "reason": "Rich Swedish heritage"}
-        ]
-        
+        for word in tokenize(topic):
+            for key, info in culture_info.items():
+                if len(word) >= 4 and word in key:
+                    return info
+        return f"No notes on '{topic}'. Known topics: {', '.join(culture_info)}"
+
+    def _prefilter_moderation(self, text: str, verdict: PrefilterVerdict) -> Dict[str, Any]:
+        """Moderation result for a text the local prefilter decided"""
         return {
-            "recommendations": mock_places[:max_results],
-            "explanation": "Mock recommendations based on your preferences (AI services not available)",
-            "confidence": 0.5
+            "is_appropriate": verdict.decision == "approve",
+            "toxicity_score": verdict.toxicity,
+            "contains_spam": verdict.spam,
+            "language": language_detector.detect(text),
+            "explanation": f"Decided by local prefilter ({', '.join(verdict.reasons) or 'classifier'})"
         }
 
+    # Mock response generators for when AI services are unavailable
     def _mock_content_moderation(self, text: str) -> Dict[str, Any]:
         """Generate mock content moderation response"""
         return {
             "is_appropriate": len(text) > 0 and not any(word in text.lower() for word in ["spam", "hate"]),
             "toxicity_score": 0.1,
             "contains_spam": "spam" in text.lower(),
-            "language": "sv" if any(word in text.lower() for word in ["fika", "kaffe", "kaka"]) else "en",
+            "language": language_detector.detect(text),
             "explanation": "Mock moderation result (AI services not available)"
         }
 
@@ -340,20 +842,7 @@ class AIService:
         """Generate mock place description"""
         return f"{place.name} in {place.city} offers an authentic Swedish fika experience with traditional pastries and excellent coffee in a welcoming atmosphere."
 
-    def _mock_duplicate_detection(self) -> List[Dict[str, Any]]:
-        """Generate mock duplicate detection results"""
-        return []
-
     # Response parsing helpers
-    def _parse_recommendations(self, text: str) -> List[Dict[str, Any]]:
-        """Parse AI recommendations response"""
-        try:
-            # Attempt to parse JSON response
-            return json.loads(text)
-        except:
-            # Fallback to parsing text
-            return [{"name": "Parsed recommendation", "reason": text[:100]}]
-
     def _parse_moderation_response(self, text: str) -> Dict[str, Any]:
         """Parse AI moderation response"""
         try:
@@ -367,6 +856,30 @@ class AIService:
                 "explanation": "Parsing failed, defaulting to safe values"
             }
 
+    def _parse_batch_moderation_response(self, text: str, count: int) -> List[Optional[Dict[str, Any]]]:
+        """Map a batch moderation response back to its items by id"""
+        results: List[Optional[Dict[str, Any]]] = [None] * count
+        try:
+            parsed = json.loads(_strip_code_fence(text))
+        except ValueError:
+            logger.warning("Batch moderation response was not valid JSON")
+            return results
+
+        if not isinstance(parsed, list):
+            return results
+
+        for item in parsed:
+            if not isinstance(item, dict) or "is_appropriate" not in item:
+                continue
+            try:
+                index = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < count:
+                results[index] = item
+
+        return results
+
     def _parse_enrichment_response(self, text: str) -> Dict[str, Any]:
         """Parse AI enrichment response"""
         try:
@@ -397,4 +910,7 @@ class AIService:
                 "Find highly-rated traditional locations"
             ]
         
-        return suggestions
\ No newline at end of file
+        return suggestions
+
+# Shared instance, set up in the application lifespan
+ai_service = AIService()
@@ -0,0 +1,69 @@
+from typing import Iterable, Union
+import hashlib
+import math
+import uuid
+
+Item = Union[str, bytes, uuid.UUID]
+
+class BloomFilter:
+    """Fixed-size bloom filter.
+
+    Sized from the expected number of items and the acceptable false-positive
+    rate: ``bits = -n * ln(p) / ln(2)^2`` and ``hashes = bits / n * ln(2)``.
+    Bit positions come from double hashing one blake2b digest, so adding or
+    checking an item costs a single hash.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity < 1:
+            raise ValueError("Bloom filter capacity must be at least 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_items(cls, items: Iterable[Item], capacity: int, error_rate: float = 0.01) -> "BloomFilter":
+        bloom = cls(capacity, error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item: Item):
+        if isinstance(item, uuid.UUID):
+            data = item.bytes
+        elif isinstance(item, str):
+            data = item.encode("utf-8")
+        else:
+            data = item
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+    def add(self, item: Item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: Item) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def expected_error_rate(self) -> float:
+        """False-positive rate at the current fill, which exceeds ``error_rate`` past capacity"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
@@ -0,0 +1,182 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import logging
+import uuid
+import zlib
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional fast serializers and compressors
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+# Encoded values start with MAGIC, a format version, a codec id and a
+# compression id. Anything without the magic prefix is a legacy plain JSON value.
+MAGIC = b"\x00FK"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+
+CODEC_IDS = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+class CacheCodecError(ValueError):
+    """Raised when a cached value cannot be decoded"""
+
+def _to_serializable(value: Any) -> Any:
+    """Fallback for types the serializers don't handle natively"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    return str(value)
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_to_serializable, separators=(",", ":")).encode("utf-8")
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_to_serializable, option=orjson.OPT_NON_STR_KEYS)
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=_to_serializable, use_bin_type=True)
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def _serializers() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    available = {"json": (_json_dumps, json.loads)}
+    if ORJSON_AVAILABLE:
+        available["orjson"] = (_orjson_dumps, orjson.loads)
+    if MSGPACK_AVAILABLE:
+        available["msgpack"] = (_msgpack_dumps, _msgpack_loads)
+    return available
+
+def _compressors(level: Optional[int]) -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    available = {
+        "zlib": (
+            lambda data: zlib.compress(data, level if level is not None else 6),
+            zlib.decompress,
+        ),
+    }
+    if ZSTD_AVAILABLE:
+        compressor = zstandard.ZstdCompressor(level=level if level is not None else 3)
+        decompressor = zstandard.ZstdDecompressor()
+        available["zstd"] = (compressor.compress, decompressor.decompress)
+    if LZ4_AVAILABLE:
+        available["lz4"] = (
+            lambda data: lz4.frame.compress(data, compression_level=level or 0),
+            lz4.frame.decompress,
+        )
+    return available
+
+class CacheCodec:
+    """Serializes cache values with a versioned header.
+
+    Any reader can decode every codec and compression it has installed, whatever
+    the writer is configured to use, so the write format can be switched one
+    deployment at a time.
+    """
+
+    def __init__(
+        self,
+        codec: str = "json",
+        compression: str = "none",
+        compression_min_bytes: int = 1024,
+        compression_level: Optional[int] = None,
+    ):
+        self.serializers = _serializers()
+        self.compressors = _compressors(compression_level)
+
+        if codec not in self.serializers:
+            logger.warning(f"Cache codec '{codec}' not available, falling back to json")
+            codec = "json"
+        if compression != "none" and compression not in self.compressors:
+            logger.warning(f"Cache compression '{compression}' not available, storing uncompressed")
+            compression = "none"
+
+        self.codec = codec
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+
+    @classmethod
+    def from_settings(cls) -> "CacheCodec":
+        return cls(
+            codec=settings.cache_codec,
+            compression=settings.cache_compression,
+            compression_min_bytes=settings.cache_compression_min_bytes,
+            compression_level=settings.cache_compression_level,
+        )
+
+    def encode(self, value: Any) -> bytes:
+        """Serialize a value, compressing it when above the size threshold"""
+        dumps, _ = self.serializers[self.codec]
+        payload = dumps(value)
+
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.compression_min_bytes:
+            compress, _ = self.compressors[self.compression]
+            payload = compress(payload)
+            compression = self.compression
+
+        header = MAGIC + bytes((FORMAT_VERSION, CODEC_IDS[self.codec], COMPRESSION_IDS[compression]))
+        return header + payload
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a value written by any codec version this process knows"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        if not data.startswith(MAGIC):
+            return json.loads(data)
+
+        if len(data) < HEADER_SIZE:
+            raise CacheCodecError("Truncated cache header")
+
+        version, codec_id, compression_id = data[len(MAGIC):HEADER_SIZE]
+        if version != FORMAT_VERSION:
+            raise CacheCodecError(f"Unsupported cache format version {version}")
+
+        codec = _name_for(CODEC_IDS, codec_id)
+        compression = _name_for(COMPRESSION_IDS, compression_id)
+        if codec not in self.serializers:
+            raise CacheCodecError(f"Cache codec '{codec}' not available")
+
+        payload = data[HEADER_SIZE:]
+        if compression != "none":
+            if compression not in self.compressors:
+                raise CacheCodecError(f"Cache compression '{compression}' not available")
+            _, decompress = self.compressors[compression]
+            payload = decompress(payload)
+
+        _, loads = self.serializers[codec]
+        return loads(payload)
+
+def _name_for(ids: Dict[str, int], value: int) -> str:
+    for name, id_ in ids.items():
+        if id_ == value:
+            return name
+    raise CacheCodecError(f"Unknown cache format id {value}")
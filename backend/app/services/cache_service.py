@@ -1,222 +1,539 @@
 import redis.asyncio as redis
-from typing import Any, Optional, List
-import json
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Set, TypeVar
+import asyncio
 import logging
+import time
+import uuid
+from prometheus_client import Counter, Histogram
 from ..config import settings, get_redis_url
+from .cache_codec import CacheCodec
+from .circuit_breaker import CircuitBreaker
+from .key_sampler import KeySampler
+from .local_cache import LocalCache
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Deletes a lock only if it still holds our token, so an expired lock that was
+# re-acquired by another worker is never released by us
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Errors that mean Redis itself is unreachable, as opposed to a bad command
+CONNECTION_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+
+# Metrics, labelled by key family (the key up to its first colon)
+CACHE_HITS = Counter('fika_cache_hits_total', 'Cache lookups that found a value', ['family'])
+CACHE_MISSES = Counter('fika_cache_misses_total', 'Cache lookups that found nothing', ['family'])
+CACHE_LATENCY = Histogram(
+    'fika_cache_operation_seconds',
+    'Redis command latency',
+    ['family', 'operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+CACHE_PAYLOAD_BYTES = Histogram(
+    'fika_cache_payload_bytes',
+    'Size of values written to the cache',
+    ['family'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+)
+CACHE_INVALIDATIONS = Counter('fika_cache_invalidations_total', 'Cache keys removed by invalidation', ['family'])
+
+def key_family(key: str) -> str:
+    return key.split(":", 1)[0]
+
+class CacheUnavailableError(Exception):
+    """Raised instead of calling Redis while the circuit breaker is open"""
+
 class CacheService:
     def __init__(self):
         self.redis_url = get_redis_url()
         self.redis_client = None
         self.default_expire = settings.cache_expire_minutes * 60  # Convert to seconds
+        self.codec = CacheCodec.from_settings()
+
+        # Serves reads and writes in this process while Redis is unreachable
+        self.fallback = LocalCache(settings.cache_fallback_max_entries)
+        self.circuit_breaker = CircuitBreaker(
+            "redis",
+            probe=self._probe,
+            failure_threshold=settings.cache_breaker_failure_threshold,
+            probe_interval=settings.cache_breaker_probe_interval_seconds,
+            on_close=self.fallback.clear,
+        )
+
+        # Sampled access counts behind the admin top-keys listing
+        self.key_sampler = KeySampler(settings.cache_key_sample_rate, settings.cache_key_sample_max_keys)
+
+        # Namespaces invalidated while Redis was unreachable, replayed once it is back
+        self.pending_generation_bumps: Set[str] = set()
+
+    def _create_client(self) -> redis.Redis:
+        # Values are binary (see CacheCodec), so responses are not decoded
+        return redis.from_url(
+            self.redis_url,
+            socket_connect_timeout=settings.redis_connect_timeout_seconds,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            retry_on_timeout=False,  # The circuit breaker decides when to try again
+            health_check_interval=30
+        )
 
     async def get_client(self) -> redis.Redis:
         """Get Redis client, creating connection if needed"""
+        if self.circuit_breaker.is_open:
+            raise CacheUnavailableError("Redis circuit breaker is open")
+
         if self.redis_client is None:
             try:
-                self.redis_client = redis.from_url(
-                    self.redis_url,
-                    encoding="utf-8",
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_timeout=5,
-                    retry_on_timeout=True,
-                    health_check_interval=30
-                )
-                
+                self.redis_client = self._create_client()
+
                 # Test connection
                 await self.redis_client.ping()
                 logger.info(f"Connected to Redis at {self.redis_url}")
-                
+
             except Exception as e:
                 logger.error(f"Failed to connect to Redis: {e}")
                 self.redis_client = None
                 raise
-        
+
         return self.redis_client
 
-    async def get(self, key: str) -> Optional[Any]:
-        """Get a value from cache"""
+    async def _run(self, command: Callable[[redis.Redis], Awaitable[T]]) -> T:
+        """Run a Redis command, recording connection failures with the circuit breaker"""
         try:
             client = await self.get_client()
-            value = await client.get(key)
-            
-            if value is not None:
-                return json.loads(value)
+            result = await command(client)
+        except CONNECTION_ERRORS as e:
+            self.circuit_breaker.record_failure(e)
+            raise
+
+        self.circuit_breaker.record_success()
+        return result
+
+    async def _timed(self, operation: str, key: str, command: Callable[[redis.Redis], Awaitable[T]]) -> T:
+        """``_run`` that records the command's latency for the key's family"""
+        started = time.perf_counter()
+        result = await self._run(command)
+        CACHE_LATENCY.labels(family=key_family(key), operation=operation).observe(time.perf_counter() - started)
+        return result
+
+    def _record_lookup(self, key: str, value: Optional[bytes]):
+        self.key_sampler.record(key)
+        if value is None:
+            CACHE_MISSES.labels(family=key_family(key)).inc()
+        else:
+            CACHE_HITS.labels(family=key_family(key)).inc()
+
+    async def _probe(self) -> bool:
+        """Background connectivity check used while the circuit breaker is open"""
+        client = self._create_client()
+        try:
+            await client.ping()
+            # Other workers, and this one once the fallback is cleared, must not see pre-outage generations
+            await self._replay_generation_bumps(client)
+        except Exception:
+            await client.close()
+            raise
+
+        previous, self.redis_client = self.redis_client, client
+        if previous is not None:
+            try:
+                await previous.close()
+            except Exception:
+                pass
+
+        logger.info(f"Reconnected to Redis at {self.redis_url}")
+        return True
+
+    def _log_failure(self, message: str, error: Exception):
+        # Expected while the breaker is open, so keep it out of the error log
+        if isinstance(error, CacheUnavailableError):
+            logger.debug(f"{message}: {error}")
+        else:
+            logger.error(f"{message}: {error}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a value from cache"""
+        return self._decode(key, await self.get_raw(key))
+
+    def _decode(self, key: str, value: Optional[bytes]) -> Optional[Any]:
+        """A stored value, or None if it is missing or can't be decoded"""
+        if value is None:
             return None
-            
+
+        try:
+            return self.codec.decode(value)
         except Exception as e:
-            logger.error(f"Cache get failed for key '{key}': {e}")
+            logger.error(f"Cache decode failed for key '{key}': {e}")
             return None
 
     async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
         """Set a value in cache"""
         try:
-            client = await self.get_client()
-            expire_time = expire or self.default_expire
-            
-            serialized = json.dumps(value, default=str)  # default=str handles datetime objects
-            result = await client.setex(key, expire_time, serialized)
-            
+            serialized = self.codec.encode(value)
+        except Exception as e:
+            logger.error(f"Cache encode failed for key '{key}': {e}")
+            return False
+
+        return await self.set_raw(key, serialized, expire)
+
+    async def get_raw(self, key: str, record: bool = True) -> Optional[bytes]:
+        """Get a value stored with ``set_raw``, bypassing the codec.
+
+        Pass ``record=False`` for internal reads (lock polling, warmer
+        checks) that shouldn't count towards hit ratios or top keys.
+        """
+        try:
+            value = await self._timed("get", key, lambda client: client.get(key))
+
+        except Exception as e:
+            self._log_failure(f"Cache get failed for key '{key}'", e)
+            value = self.fallback.get(key)
+
+        if record:
+            self._record_lookup(key, value)
+        return value
+
+    async def set_raw(self, key: str, value: bytes, expire: Optional[int] = None) -> bool:
+        """Store bytes as-is, for values that are already encoded"""
+        expire_time = expire or self.default_expire
+        CACHE_PAYLOAD_BYTES.labels(family=key_family(key)).observe(len(value))
+        try:
+            result = await self._timed("set", key, lambda client: client.setex(key, expire_time, value))
+
             logger.debug(f"Cached key '{key}' for {expire_time} seconds")
             return result
-            
+
         except Exception as e:
-            logger.error(f"Cache set failed for key '{key}': {e}")
-            return False
+            self._log_failure(f"Cache set failed for key '{key}'", e)
+            self.fallback.set(key, value, expire_time)
+            return True
 
     async def delete(self, key: str) -> bool:
         """Delete a key from cache"""
+        deleted_locally = self.fallback.delete(key)
         try:
-            client = await self.get_client()
-            result = await client.delete(key)
-            
+            result = await self._run(lambda client: client.delete(key))
+
             if result:
                 logger.debug(f"Deleted cache key '{key}'")
-            
-            return bool(result)
-            
+
+            deleted = bool(result) or deleted_locally
+            if deleted:
+                CACHE_INVALIDATIONS.labels(family=key_family(key)).inc()
+            return deleted
+
         except Exception as e:
-            logger.error(f"Cache delete failed for key '{key}': {e}")
-            return False
+            self._log_failure(f"Cache delete failed for key '{key}'", e)
+            if deleted_locally:
+                CACHE_INVALIDATIONS.labels(family=key_family(key)).inc()
+            return deleted_locally
 
     async def clear_pattern(self, pattern: str) -> int:
         """Clear all keys matching a pattern"""
+        cleared_locally = self.fallback.clear_pattern(pattern)
         try:
-            client = await self.get_client()
-            
             # Find all keys matching the pattern
-            keys = await client.keys(pattern)
-            
+            keys = await self._run(lambda client: client.keys(pattern))
+
             if keys:
                 # Delete all matching keys
-                deleted = await client.delete(*keys)
+                deleted = await self._run(lambda client: client.delete(*keys))
                 logger.info(f"Cleared {deleted} cache keys matching pattern '{pattern}'")
-                return deleted
-            
-            return 0
-            
+            else:
+                deleted = cleared_locally
+
         except Exception as e:
-            logger.error(f"Cache clear pattern failed for '{pattern}': {e}")
-            return 0
+            self._log_failure(f"Cache clear pattern failed for '{pattern}'", e)
+            deleted = cleared_locally
+
+        if deleted:
+            CACHE_INVALIDATIONS.labels(family=key_family(pattern)).inc(deleted)
+        return deleted
 
     async def exists(self, key: str) -> bool:
         """Check if a key exists in cache"""
         try:
-            client = await self.get_client()
-            result = await client.exists(key)
+            result = await self._timed("exists", key, lambda client: client.exists(key))
             return bool(result)
-            
+
         except Exception as e:
-            logger.error(f"Cache exists check failed for key '{key}': {e}")
-            return False
+            self._log_failure(f"Cache exists check failed for key '{key}'", e)
+            return self.fallback.get(key) is not None
 
     async def ttl(self, key: str) -> int:
         """Get time-to-live for a key"""
         try:
-            client = await self.get_client()
-            return await client.ttl(key)
-            
+            return await self._run(lambda client: client.ttl(key))
+
         except Exception as e:
-            logger.error(f"Cache TTL check failed for key '{key}': {e}")
+            self._log_failure(f"Cache TTL check failed for key '{key}'", e)
             return -1
 
     async def increment(self, key: str, amount: int = 1) -> int:
         """Increment a counter in cache"""
         try:
-            client = await self.get_client()
-            return await client.incrby(key, amount)
-            
+            return await self._run(lambda client: client.incrby(key, amount))
+
+        except Exception as e:
+            self._log_failure(f"Cache increment failed for key '{key}'", e)
+            return 0
+
+    async def get_generations(self, namespaces: List[str]) -> List[int]:
+        """Current generation of each namespace, 0 for namespaces never invalidated"""
+        keys = [f"gen:{namespace}" for namespace in namespaces]
+        try:
+            values = await self._timed("get", "gen", lambda client: client.mget(keys))
+
+        except Exception as e:
+            self._log_failure(f"Cache generation lookup failed for {namespaces}", e)
+            values = [self.fallback.get(key) for key in keys]
+
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def _replay_generation_bumps(self, client: redis.Redis):
+        """INCR the generations of namespaces invalidated while Redis was unreachable"""
+        pending = set(self.pending_generation_bumps)
+        if not pending:
+            return
+        async with client.pipeline(transaction=False) as pipe:
+            for namespace in pending:
+                pipe.incr(f"gen:{namespace}")
+            await pipe.execute()
+        self.pending_generation_bumps -= pending
+        logger.info(f"Replayed cache invalidations made while Redis was unreachable: {sorted(pending)}")
+
+    async def bump_generation(self, namespace: str) -> int:
+        """Invalidate every key built on a namespace's generation with a single INCR.
+
+        Generation keys have no TTL; entries from older generations are never
+        read again and expire on their own. If Redis can't be reached the
+        bump is applied locally and replayed in Redis once it is back, before
+        the circuit breaker closes.
+        """
+        key = f"gen:{namespace}"
+        CACHE_INVALIDATIONS.labels(family=key_family(namespace)).inc()
+        try:
+            async def incr(client: redis.Redis) -> int:
+                if self.pending_generation_bumps:
+                    await self._replay_generation_bumps(client)
+                return await client.incr(key)
+
+            return await self._run(incr)
+
         except Exception as e:
-            logger.error(f"Cache increment failed for key '{key}': {e}")
+            self._log_failure(f"Cache generation bump failed for '{namespace}'", e)
+            self.pending_generation_bumps.add(namespace)
+            current = self.fallback.get(key)
+            generation = (int(current) if current is not None else 0) + 1
+            self.fallback.set(key, str(generation).encode("utf-8"), self.default_expire)
+            return generation
+
+    async def increment_score(self, key: str, member: str, amount: float = 1) -> float:
+        """Increment a member's score in a sorted set, used for popularity rankings"""
+        try:
+            return await self._run(lambda client: client.zincrby(key, amount, member))
+
+        except Exception as e:
+            self._log_failure(f"Cache score increment failed for key '{key}'", e)
             return 0
 
+    async def top_members(self, key: str, count: int) -> List[str]:
+        """Highest scoring members of a sorted set"""
+        try:
+            members = await self._run(lambda client: client.zrevrange(key, 0, count - 1))
+            return [member.decode("utf-8") for member in members]
+
+        except Exception as e:
+            self._log_failure(f"Cache ranking lookup failed for key '{key}'", e)
+            return []
+
+    async def trim_ranking(self, key: str, keep: int) -> int:
+        """Drop all but the ``keep`` highest scoring members of a sorted set"""
+        try:
+            return await self._run(lambda client: client.zremrangebyrank(key, 0, -(keep + 1)))
+
+        except Exception as e:
+            self._log_failure(f"Cache ranking trim failed for key '{key}'", e)
+            return 0
+
+    async def set_score(self, key: str, member: str, score: float) -> bool:
+        """Add a member to a sorted set, or overwrite its score"""
+        try:
+            await self._run(lambda client: client.zadd(key, {member: score}))
+            return True
+
+        except Exception as e:
+            self._log_failure(f"Cache score set failed for key '{key}'", e)
+            return False
+
+    async def get_score(self, key: str, member: str) -> Optional[float]:
+        """A member's score in a sorted set, or None if it isn't a member"""
+        try:
+            return await self._run(lambda client: client.zscore(key, member))
+
+        except Exception as e:
+            self._log_failure(f"Cache score lookup failed for key '{key}'", e)
+            return None
+
+    async def remove_scores_below(self, key: str, max_score: float) -> int:
+        """Drop every member of a sorted set scoring at or below ``max_score``"""
+        try:
+            return await self._run(lambda client: client.zremrangebyscore(key, "-inf", max_score))
+
+        except Exception as e:
+            self._log_failure(f"Cache score trim failed for key '{key}'", e)
+            return 0
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        """Try to take a short-lived lock for a key.
+
+        Returns a token to pass to ``release_lock``, or None if another worker
+        holds the lock. Locking is best-effort: if Redis is unavailable a token
+        is returned so callers go ahead on their own.
+        """
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._run(
+                lambda client: client.set(f"lock:{key}", token, nx=True, px=int(timeout * 1000))
+            )
+            return token if acquired else None
+
+        except Exception as e:
+            self._log_failure(f"Cache lock failed for key '{key}'", e)
+            return token
+
+    async def release_lock(self, key: str, token: str) -> bool:
+        """Release a lock taken with ``acquire_lock``"""
+        try:
+            result = await self._run(lambda client: client.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token))
+            return bool(result)
+
+        except Exception as e:
+            self._log_failure(f"Cache lock release failed for key '{key}'", e)
+            return False
+
     async def get_multiple(self, keys: List[str]) -> List[Optional[Any]]:
         """Get multiple values from cache"""
+        # An entry that can't be decoded is a miss, not a failed batch
+        values = await self.get_raw_multiple(keys)
+        return [self._decode(key, value) for key, value in zip(keys, values)]
+
+    async def get_raw_multiple(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Get multiple values stored with ``set_raw`` in one round trip"""
         try:
-            client = await self.get_client()
-            values = await client.mget(keys)
-            
-            result = []
-            for value in values:
-                if value is not None:
-                    result.append(json.loads(value))
-                else:
-                    result.append(None)
-            
-            return result
-            
+            values = await self._run(lambda client: client.mget(keys))
+
         except Exception as e:
-            logger.error(f"Cache mget failed for keys {keys}: {e}")
-            return [None] * len(keys)
+            self._log_failure(f"Cache mget failed for keys {keys}", e)
+            values = [self.fallback.get(key) for key in keys]
+
+        for key, value in zip(keys, values):
+            self._record_lookup(key, value)
+        return values
 
     async def set_multiple(self, mapping: dict, expire: Optional[int] = None) -> bool:
         """Set multiple key-value pairs"""
+        # Serialize all values
         try:
-            client = await self.get_client()
-            expire_time = expire or self.default_expire
-            
-            # Serialize all values
             serialized_mapping = {
-                key: json.dumps(value, default=str) 
+                key: self.codec.encode(value)
                 for key, value in mapping.items()
             }
-            
+        except Exception as e:
+            logger.error(f"Cache encode failed for keys {list(mapping)}: {e}")
+            return False
+
+        return await self.set_raw_multiple(serialized_mapping, expire)
+
+    async def set_raw_multiple(self, mapping: Dict[str, bytes], expire: Optional[int] = None) -> bool:
+        """Store multiple already encoded values in one pipeline"""
+        expire_time = expire or self.default_expire
+
+        async def write(client: redis.Redis):
             # Use pipeline for efficiency
             async with client.pipeline() as pipe:
-                await pipe.mset(serialized_mapping)
-                
+                await pipe.mset(mapping)
+
                 # Set expiration for all keys
-                for key in serialized_mapping.keys():
+                for key in mapping.keys():
                     await pipe.expire(key, expire_time)
-                
+
                 await pipe.execute()
-            
+
+        try:
+            await self._run(write)
+
             logger.debug(f"Set {len(mapping)} cache keys with {expire_time}s expiration")
             return True
-            
+
         except Exception as e:
-            logger.error(f"Cache mset failed: {e}")
-            return False
+            self._log_failure("Cache mset failed", e)
+            for key, value in mapping.items():
+                self.fallback.set(key, value, expire_time)
+            return True
 
     async def health_check(self) -> dict:
         """Check Redis connection health"""
+        breaker = self.circuit_breaker.snapshot()
         try:
-            client = await self.get_client()
-            info = await client.info()
-            
+            info = await self._run(lambda client: client.info())
+
             return {
                 "status": "healthy",
                 "redis_version": info.get("redis_version"),
                 "used_memory": info.get("used_memory_human"),
                 "connected_clients": info.get("connected_clients"),
-                "total_commands_processed": info.get("total_commands_processed")
+                "total_commands_processed": info.get("total_commands_processed"),
+                "circuit_breaker": breaker
             }
-            
+
         except Exception as e:
-            logger.error(f"Redis health check failed: {e}")
+            self._log_failure("Redis health check failed", e)
             return {
                 "status": "unhealthy",
-                "error": str(e)
+                "error": str(e),
+                "circuit_breaker": breaker,
+                "fallback_entries": len(self.fallback)
             }
 
+    def status(self) -> dict:
+        """Circuit breaker and fallback state, without calling Redis"""
+        return {
+            "circuit_breaker": self.circuit_breaker.snapshot(),
+            "fallback_entries": len(self.fallback),
+            "pending_generation_bumps": len(self.pending_generation_bumps)
+        }
+
+    def top_keys(self, limit: int = 20) -> List[dict]:
+        """Most read keys in this worker, estimated from sampled lookups"""
+        return [
+            {"key": key, "family": key_family(key), "estimated_reads": reads}
+            for key, reads in self.key_sampler.top(limit)
+        ]
+
     async def flush_all(self) -> bool:
         """Flush all cache data (use with caution!)"""
+        self.fallback.clear()
         try:
-            client = await self.get_client()
-            await client.flushall()
-            
+            await self._run(lambda client: client.flushall())
+
             logger.warning("Flushed all cache data")
             return True
-            
+
         except Exception as e:
-            logger.error(f"Cache flush all failed: {e}")
+            self._log_failure("Cache flush all failed", e)
             return False
 
     async def close(self):
         """Close Redis connection"""
+        await self.circuit_breaker.stop()
         if self.redis_client:
             try:
                 await self.redis_client.close()
@@ -224,4 +541,7 @@ class CacheService:
             except Exception as e:
                 logger.error(f"Failed to close Redis connection: {e}")
             finally:
-                self.redis_client = None
\ No newline at end of file
+                self.redis_client = None
+
+# Shared instance so every request reuses one Redis connection pool
+cache_service = CacheService()
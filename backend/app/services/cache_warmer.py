@@ -0,0 +1,120 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from ..config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# A zero-argument coroutine function that stores one cache entry
+WarmTarget = Callable[[], Awaitable[Any]]
+
+# Returns the targets to warm; called on every run so rankings stay current
+TargetProvider = Callable[[], Awaitable[List[WarmTarget]]]
+
+WARM_LOCK_KEY = "cache-warming"
+
+class CacheWarmer:
+    """Precomputes the hottest cached responses.
+
+    Routers register target providers at import time. A run collects their
+    targets and warms them with bounded concurrency, under a Redis lock so only
+    one worker warms at a time. Runs happen at startup and again once a burst of
+    invalidations has been quiet for ``debounce_seconds``.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        debounce_seconds: float = 2.0,
+        lock_timeout: float = 120.0,
+    ):
+        self.concurrency = concurrency
+        self.debounce_seconds = debounce_seconds
+        self.lock_timeout = lock_timeout
+        self.providers: List[TargetProvider] = []
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._scheduled_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, provider: TargetProvider) -> TargetProvider:
+        self.providers.append(provider)
+        return provider
+
+    async def warm_all(self) -> Dict[str, Any]:
+        """Warm every registered target once"""
+        token = await cache_service.acquire_lock(WARM_LOCK_KEY, self.lock_timeout)
+        if token is None:
+            logger.info("Cache warming already running in another worker, skipping")
+            return {"status": "skipped"}
+
+        try:
+            started = time.monotonic()
+            targets: List[WarmTarget] = []
+            for provider in self.providers:
+                try:
+                    targets.extend(await provider())
+                except Exception as e:
+                    logger.error(f"Failed to collect cache warming targets: {e}")
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run(target: WarmTarget) -> Optional[bool]:
+                async with semaphore:
+                    try:
+                        return await target() is not None
+                    except Exception as e:
+                        logger.warning(f"Cache warming target failed: {e}")
+                        return None
+
+            results = await asyncio.gather(*(run(target) for target in targets))
+
+            self.last_run = {
+                "status": "completed",
+                "targets": len(targets),
+                "warmed": sum(1 for result in results if result),
+                "already_fresh": sum(1 for result in results if result is False),
+                "failed": sum(1 for result in results if result is None),
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "finished_at": time.time(),
+            }
+            logger.info(f"Cache warming finished: {self.last_run}")
+            return self.last_run
+
+        finally:
+            await cache_service.release_lock(WARM_LOCK_KEY, token)
+
+    def schedule(self):
+        """Warm again once invalidations have been quiet for the debounce period"""
+        self._scheduled_at = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._warm_when_quiet())
+
+    async def _warm_when_quiet(self):
+        while True:
+            remaining = self._scheduled_at + self.debounce_seconds - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+
+        try:
+            await self.warm_all()
+        except Exception as e:
+            logger.error(f"Scheduled cache warming failed: {e}")
+
+    async def stop(self):
+        """Cancel a pending scheduled run"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+cache_warmer = CacheWarmer(
+    concurrency=settings.cache_warm_concurrency,
+    debounce_seconds=settings.cache_warm_debounce_seconds,
+)
@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from ..config import settings
+from .cache_service import CacheService, cache_service
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count at four characters a token"""
+    return len(text) // 4 + 1
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+@dataclass
+class ChatSession:
+    """One conversation: recent turns verbatim, older ones condensed into a summary"""
+    session_id: str
+    turns: List[Tuple[str, str]] = field(default_factory=list)  # (user message, answer)
+    summary: List[str] = field(default_factory=list)  # Earlier user questions, oldest first
+
+    @property
+    def summary_text(self) -> Optional[str]:
+        if not self.summary:
+            return None
+        return "Earlier in this conversation the user asked: " + "; ".join(self.summary)
+
+    def lines(self, human_prefix: str = "Human", ai_prefix: str = "AI") -> List[str]:
+        """The history as the agent's prompt shows it, one line per message"""
+        lines = [f"System: {self.summary_text}"] if self.summary else []
+        for human, ai in self.turns:
+            lines.append(f"{human_prefix}: {human}")
+            lines.append(f"{ai_prefix}: {ai}")
+        return lines
+
+    def tokens(self) -> int:
+        return estimate_tokens("\n".join(self.lines()))
+
+class ChatMemory:
+    """Per-session chat history in Redis, bounded by a token budget.
+
+    Each session is one cache entry that expires ``ttl`` seconds after its
+    last turn. After every turn the oldest turns are dropped until the rest
+    fit ``max_tokens``; a dropped turn leaves its question, clipped to
+    ``summary_clip`` characters, in the session summary, which keeps at most
+    ``summary_max_tokens``. The history put in front of the agent therefore
+    stays the same size however long the conversation gets. The summary is
+    built locally, without an extra LLM call.
+
+    Concurrent requests on one session each save their own turn, and the
+    later save wins.
+    """
+
+    def __init__(
+        self,
+        cache: CacheService,
+        ttl: int = 1800,
+        max_tokens: int = 1200,
+        summary_max_tokens: int = 200,
+        summary_clip: int = 120,
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_clip = summary_clip
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"chat:session:{session_id}"
+
+    async def load(self, session_id: str) -> ChatSession:
+        data = await self.cache.get(self._key(session_id))
+        if not isinstance(data, dict):
+            return ChatSession(session_id)
+        return ChatSession(
+            session_id,
+            turns=[(human, ai) for human, ai in data.get("turns", [])],
+            summary=list(data.get("summary", [])),
+        )
+
+    def trim(self, session: ChatSession):
+        """Condense the oldest turns until the session fits the token budget; the latest turn always stays"""
+        while len(session.turns) > 1 and session.tokens() > self.max_tokens:
+            human, _ = session.turns.pop(0)
+            session.summary.append(_clip(human, self.summary_clip))
+            while len(session.summary) > 1 and estimate_tokens(session.summary_text) > self.summary_max_tokens:
+                session.summary.pop(0)
+
+    async def append(self, session: ChatSession, message: str, answer: str):
+        """Record a turn, trim the session and save it with a fresh TTL"""
+        # Half the budget per side, so even a single turn fits
+        limit = self.max_tokens * 2
+        session.turns.append((message[:limit], answer[:limit]))
+        self.trim(session)
+        data: Dict[str, Any] = {"turns": [list(turn) for turn in session.turns], "summary": session.summary}
+        await self.cache.set(self._key(session.session_id), data, expire=self.ttl)
+
+    async def clear(self, session_id: str) -> bool:
+        return await self.cache.delete(self._key(session_id))
+
+chat_memory = ChatMemory(
+    cache_service,
+    ttl=settings.ai_chat_session_ttl_seconds,
+    max_tokens=settings.ai_chat_memory_max_tokens,
+    summary_max_tokens=settings.ai_chat_summary_max_tokens,
+)
@@ -0,0 +1,106 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stops calling a failing dependency until a background probe succeeds.
+
+    The breaker opens after ``failure_threshold`` consecutive failures. While
+    open, callers are expected to skip the dependency entirely; ``probe`` is
+    retried every ``probe_interval`` seconds and the breaker closes as soon as
+    it returns True, after which ``on_close`` is called.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], Awaitable[bool]],
+        failure_threshold: int = 5,
+        probe_interval: float = 5.0,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.on_close = on_close
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+        self.times_opened = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self, error: Exception):
+        self.consecutive_failures += 1
+        self.last_failure = str(error)
+
+        if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.times_opened += 1
+        logger.warning(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} failures: {self.last_failure}")
+
+        if self._probe_task is None or self._probe_task.done():
+            try:
+                self._probe_task = asyncio.get_running_loop().create_task(self._probe_until_healthy())
+            except RuntimeError:
+                # No running loop, e.g. during shutdown; the next failure retries
+                self._probe_task = None
+
+    def _close(self):
+        logger.info(f"Circuit breaker '{self.name}' closed after {time.time() - (self.opened_at or time.time()):.1f}s")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        if self.on_close is not None:
+            self.on_close()
+
+    async def _probe_until_healthy(self):
+        while self.is_open:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                healthy = await self.probe()
+            except Exception as e:
+                healthy = False
+                self.last_failure = str(e)
+
+            if healthy:
+                self._close()
+
+    async def stop(self):
+        """Cancel the background probe"""
+        if self._probe_task is not None and not self._probe_task.done():
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+        self._probe_task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "opened_at": self.opened_at,
+            "times_opened": self.times_opened,
+            "last_failure": self.last_failure,
+        }
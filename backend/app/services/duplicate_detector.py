@@ -0,0 +1,247 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+from .place_catalog import CatalogPlace
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_HASH_MASK = 0xFFFFFFFF
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lower-cased, accent-free, punctuation-free tokens in sorted order.
+
+    Sorting the tokens makes "Café Husaren" and "Husaren Café" identical.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    return " ".join(sorted(_NON_WORD.sub(" ", text).split()))
+
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """Hashed character n-grams of normalized text.
+
+    Uses the built-in string hash, so values are only comparable within one
+    process.
+    """
+    if not text:
+        return frozenset()
+    padded = f" {text} "
+    return frozenset(hash(padded[i:i + size]) & _HASH_MASK for i in range(max(1, len(padded) - size + 1)))
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def haversine_m(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters, elementwise"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def _group_pairs(keys: np.ndarray, ids: np.ndarray, max_group: int) -> Tuple[np.ndarray, np.ndarray]:
+    """All pairs of ``ids`` sharing a key, skipping groups larger than ``max_group``"""
+    order = np.argsort(keys, kind="stable")
+    keys, ids = keys[order], ids[order]
+
+    # Drop oversized groups up front
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    keep = np.repeat(sizes <= max_group, sizes)
+    keys, ids = keys[keep], ids[keep]
+
+    firsts, seconds = [], []
+    for offset in range(1, max_group):
+        same = np.flatnonzero(keys[offset:] == keys[:-offset])
+        if not len(same):
+            break
+        firsts.append(ids[same])
+        seconds.append(ids[same + offset])
+
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+class DuplicateDetector:
+    """Finds likely duplicate places without comparing every pair.
+
+    Candidates come from two blocking passes: places in the same city whose
+    names collide in a MinHash/LSH band (``bands`` x ``rows`` permutations,
+    so names with trigram Jaccard of 0.7 and up almost always collide),
+    and places within one ``cell_size_m`` grid cell of each other. Only
+    candidates are scored, on name and address trigram similarity and
+    distance, which keeps the work roughly linear in the number of places.
+    """
+
+    def __init__(
+        self,
+        bands: int = 16,
+        rows: int = 4,
+        cell_size_m: float = 150.0,
+        max_distance_m: float = 500.0,
+        max_bucket_size: int = 200,
+        estimate_slack: float = 0.15,
+        seed: int = 1,
+    ):
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self.cell_size_m = cell_size_m
+        self.max_distance_m = max_distance_m
+        self.max_bucket_size = max_bucket_size
+        self.estimate_slack = estimate_slack  # Allowed MinHash underestimate when pre-filtering
+
+        # Multiply-shift hash family standing in for random permutations
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+        self._band_weights = rng.integers(1, 2 ** 63, size=rows, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, shingle_sets: Sequence[FrozenSet[int]], chunk_size: int = 4096) -> np.ndarray:
+        """MinHash signatures, one row of ``num_perm`` values per set"""
+        result = np.full((len(shingle_sets), self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+
+        for start in range(0, len(shingle_sets), chunk_size):
+            chunk = shingle_sets[start:start + chunk_size]
+            lengths = np.array([len(s) for s in chunk])
+            nonempty = np.flatnonzero(lengths)
+            if not len(nonempty):
+                continue
+
+            hashes = np.fromiter((h for s in chunk for h in s), dtype=np.uint64, count=int(lengths.sum()))
+            with np.errstate(over="ignore"):
+                permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))[nonempty]
+            result[start + nonempty] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+        return result
+
+    def _lsh_candidates(self, signatures: np.ndarray, blocks: np.ndarray, eligible: np.ndarray) -> List[np.ndarray]:
+        """Pair codes of places in the same block sharing at least one band"""
+        codes = []
+        for band in range(self.bands):
+            rows = signatures[eligible, band * self.rows:(band + 1) * self.rows]
+            with np.errstate(over="ignore"):
+                keys = (rows * self._band_weights).sum(axis=1) ^ (blocks[eligible] * np.uint64(0x9E3779B97F4A7C15))
+            # Oversized buckets are chain names; the geo pass pairs nearby branches
+            firsts, seconds = _group_pairs(keys, eligible, self.max_bucket_size)
+            codes.append(self._encode(firsts, seconds, len(signatures)))
+        return codes
+
+    def _geo_candidates(self, latitudes: np.ndarray, longitudes: np.ndarray) -> List[np.ndarray]:
+        """Pair codes of places in the same or adjacent grid cells"""
+        located = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        if len(located) < 2:
+            return []
+
+        ys = latitudes[located] * METERS_PER_DEGREE
+        xs = longitudes[located] * METERS_PER_DEGREE * np.cos(np.radians(latitudes[located]))
+        cell_ys = np.floor(ys / self.cell_size_m).astype(np.int64)
+        cell_xs = np.floor(xs / self.cell_size_m).astype(np.int64)
+
+        # Each place also joins four of its neighbouring cells, so every pair
+        # of adjacent places ends up sharing at least one cell
+        keys, ids = [], []
+        for dy, dx in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+            keys.append(((cell_ys + dy) << 32) | ((cell_xs + dx) & 0xFFFFFFFF))
+            ids.append(located)
+        firsts, seconds = _group_pairs(np.concatenate(keys), np.concatenate(ids), self.max_bucket_size)
+        distinct = firsts != seconds
+        return [self._encode(firsts[distinct], seconds[distinct], len(latitudes))]
+
+    @staticmethod
+    def _encode(firsts: np.ndarray, seconds: np.ndarray, count: int) -> np.ndarray:
+        low, high = np.minimum(firsts, seconds), np.maximum(firsts, seconds)
+        return low.astype(np.int64) * count + high
+
+    def score(
+        self,
+        name_sim: float,
+        address_sim: Optional[float],
+        distance_m: Optional[float],
+    ) -> float:
+        """Weighted similarity in [0, 1]; missing components are left out"""
+        total, weight = 0.5 * name_sim, 0.5
+        if address_sim is not None:
+            total += 0.25 * address_sim
+            weight += 0.25
+        if distance_m is not None:
+            total += 0.25 * max(0.0, 1.0 - distance_m / self.max_distance_m)
+            weight += 0.25
+        return total / weight
+
+    def find(
+        self,
+        places: Sequence[CatalogPlace],
+        min_score: float = 0.7,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Scored candidate duplicate pairs, best first"""
+        if len(places) < 2:
+            return []
+
+        names = [shingles(normalize_text(place.name)) for place in places]
+        addresses = [shingles(normalize_text(place.address)) for place in places]
+
+        city_ids: Dict[str, int] = {}
+        blocks = np.array(
+            [city_ids.setdefault(normalize_text(place.city), len(city_ids)) for place in places],
+            dtype=np.uint64,
+        )
+        latitudes = np.array([np.nan if p.latitude is None else p.latitude for p in places], dtype=np.float64)
+        longitudes = np.array([np.nan if p.longitude is None else p.longitude for p in places], dtype=np.float64)
+
+        signatures = self.signatures(names)
+        eligible = np.flatnonzero([bool(name) for name in names])
+        codes = np.sort(np.concatenate(
+            self._lsh_candidates(signatures, blocks, eligible)
+            + self._geo_candidates(latitudes, longitudes)
+            + [np.empty(0, dtype=np.int64)]
+        ))
+        codes = codes[np.r_[True, codes[1:] != codes[:-1]]] if len(codes) else codes
+        firsts, seconds = codes // len(places), codes % len(places)
+
+        # Cheap vectorized filters before exact scoring: places too far apart,
+        # and names whose estimated similarity can't reach min_score even with
+        # perfect address and distance scores
+        distances = haversine_m(latitudes[firsts], longitudes[firsts], latitudes[seconds], longitudes[seconds])
+        keep = ~(distances > self.max_distance_m)
+        firsts, seconds, distances = firsts[keep], seconds[keep], distances[keep]
+
+        estimates = np.empty(len(firsts))
+        for start in range(0, len(firsts), 65536):
+            chunk = slice(start, start + 65536)
+            estimates[chunk] = (signatures[firsts[chunk]] == signatures[seconds[chunk]]).mean(axis=1)
+        keep = estimates >= 2 * min_score - 1 - self.estimate_slack
+        firsts, seconds, distances = firsts[keep], seconds[keep], distances[keep]
+
+        results = []
+        for first, second, distance_m in zip(firsts.tolist(), seconds.tolist(), distances.tolist()):
+            a, b = places[first], places[second]
+            if math.isnan(distance_m):
+                distance_m = None
+
+            name_sim = jaccard(names[first], names[second])
+            address_sim = jaccard(addresses[first], addresses[second]) if addresses[first] and addresses[second] else None
+            score = self.score(name_sim, address_sim, distance_m)
+            if score < min_score:
+                continue
+
+            results.append({
+                "place_a": a.summary(),
+                "place_b": b.summary(),
+                "score": round(score, 3),
+                "name_similarity": round(name_sim, 3),
+                "address_similarity": round(address_sim, 3) if address_sim is not None else None,
+                "distance_m": round(distance_m, 1) if distance_m is not None else None,
+            })
+
+        results.sort(key=lambda pair: pair["score"], reverse=True)
+        return results[:limit] if limit else results
@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+import uuid
+
+from prometheus_client import Counter
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.place import Place
+from ..models.review import Review
+from .bloom_filter import BloomFilter
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_ID_REJECTIONS = Counter(
+    'fika_unknown_id_rejections_total',
+    'Requests for unknown IDs answered without a database query',
+    ['kind', 'source']
+)
+
+# Rebuild early once this share of the filter's IDs has been deleted
+REBUILD_DELETED_RATIO = 0.25
+
+LOAD_BATCH_SIZE = 10000
+
+class IdFilter:
+    """Answers "does this ID exist?" without a database query where it can.
+
+    Each worker keeps a bloom filter of every ID in ``model``'s table, rebuilt
+    at startup and every ``refresh_interval`` seconds. An ID the filter has
+    never seen may still have been created by another worker since the last
+    rebuild, so creations are also added to a shared Redis sorted set of
+    recent IDs that is checked before rejecting. IDs the filter can't rule
+    out but the database doesn't have (deletions, false positives) get a
+    short-lived negative cache entry instead.
+
+    The filter fails open: until it is built, after a failed rebuild, or if
+    Redis has been unreachable since it was built, every ID is treated as
+    possibly existing.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        model,
+        capacity: int = 100000,
+        error_rate: float = 0.01,
+        negative_ttl: int = 60,
+        refresh_interval: float = 600.0,
+        enabled: bool = True,
+    ):
+        self.kind = kind
+        self.model = model
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.enabled = enabled
+        self.recent_key = f"ids:{kind}:recent"
+
+        self.bloom: Optional[BloomFilter] = None
+        self.built_at: Optional[float] = None
+        self.deleted_since_build = 0
+        self._breaker_epoch = 0
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _missing_key(self, id_: uuid.UUID) -> str:
+        return f"missing:{self.kind}:{id_}"
+
+    @property
+    def ready(self) -> bool:
+        """Whether negative answers from the bloom filter can be trusted"""
+        if not self.enabled or self.bloom is None:
+            return False
+
+        # Creations announced while Redis was down never reached the recent set
+        breaker = cache_service.circuit_breaker
+        if breaker.is_open or breaker.times_opened != self._breaker_epoch:
+            return False
+
+        # A filter that missed its refreshes may predate the oldest recent ID kept
+        return time.time() - self.built_at < self.refresh_interval * 2
+
+    def _rebuild_after_outage(self):
+        """Start one rebuild once Redis is back after an outage the filter was built before"""
+        breaker = cache_service.circuit_breaker
+        if self.bloom is not None and not breaker.is_open and breaker.times_opened != self._breaker_epoch:
+            self.request_rebuild()
+
+    def _load_ids(self) -> List[uuid.UUID]:
+        db = SessionLocal()
+        try:
+            return [row[0] for row in db.query(self.model.id).yield_per(LOAD_BATCH_SIZE)]
+        finally:
+            db.close()
+
+    def _build_filter(self) -> Tuple[BloomFilter, int]:
+        ids = self._load_ids()
+        # Leave headroom so the false-positive rate holds as the table grows
+        capacity = max(self.capacity, len(ids) * 2)
+        return BloomFilter.from_items(ids, capacity, self.error_rate), len(ids)
+
+    async def rebuild(self):
+        """Reload every ID from the database into a new filter, off the event loop"""
+        started = time.time()
+        breaker_epoch = cache_service.circuit_breaker.times_opened
+        bloom, count = await asyncio.to_thread(self._build_filter)
+
+        self.bloom = bloom
+        self.built_at = started
+        self.deleted_since_build = 0
+        self._breaker_epoch = breaker_epoch
+
+        # IDs created before any worker's current filter was built are no longer needed
+        await cache_service.remove_scores_below(self.recent_key, started - self.refresh_interval * 2)
+        logger.info(
+            f"Built {self.kind} ID filter: {count} IDs, "
+            f"{self.bloom.memory_bytes} bytes, {self.bloom.num_hashes} hashes"
+        )
+
+    def request_rebuild(self):
+        """Rebuild in the background unless a rebuild is already running"""
+        if not self.enabled or (self._rebuild_task is not None and not self._rebuild_task.done()):
+            return
+        try:
+            self._rebuild_task = asyncio.get_running_loop().create_task(self._rebuild_safely())
+        except RuntimeError:
+            self._rebuild_task = None
+
+    async def _rebuild_safely(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Failed to rebuild {self.kind} ID filter: {e}")
+
+    async def start(self):
+        """Build the filter and keep refreshing it"""
+        if not self.enabled:
+            return
+        await self._rebuild_safely()
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self._rebuild_safely()
+
+    async def stop(self):
+        for task in (self._refresh_task, self._rebuild_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = None
+        self._rebuild_task = None
+
+    async def might_exist(self, id_: uuid.UUID) -> bool:
+        """False only if ``id_`` is certainly not in the table"""
+        self._rebuild_after_outage()
+        if not self.ready or id_ in self.bloom:
+            return True
+
+        # Created by another worker since this filter was built?
+        if await cache_service.get_score(self.recent_key, str(id_)) is not None:
+            self.bloom.add(id_)
+            return True
+
+        UNKNOWN_ID_REJECTIONS.labels(kind=self.kind, source="bloom").inc()
+        return False
+
+    async def is_known_missing(self, id_: uuid.UUID) -> bool:
+        """Whether a recent lookup of ``id_`` found nothing"""
+        if not self.enabled:
+            return False
+        if await cache_service.exists(self._missing_key(id_)):
+            UNKNOWN_ID_REJECTIONS.labels(kind=self.kind, source="negative_cache").inc()
+            return True
+        return False
+
+    async def remember_missing(self, id_: uuid.UUID):
+        if self.enabled:
+            await cache_service.set(self._missing_key(id_), 1, expire=self.negative_ttl)
+
+    async def record_created(self, id_: uuid.UUID):
+        if not self.enabled:
+            return
+        if self.bloom is not None:
+            self.bloom.add(id_)
+        await cache_service.set_score(self.recent_key, str(id_), time.time())
+
+    async def record_deleted(self, id_: uuid.UUID):
+        """Bloom filters can't forget, so cache the miss and rebuild once enough IDs are gone"""
+        if not self.enabled:
+            return
+        await self.remember_missing(id_)
+        self.deleted_since_build += 1
+        if self.bloom is not None and self.deleted_since_build > len(self.bloom) * REBUILD_DELETED_RATIO:
+            self.request_rebuild()
+
+    def stats(self) -> Dict[str, Any]:
+        if self.bloom is None:
+            return {"enabled": self.enabled, "ready": False}
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "ids": len(self.bloom),
+            "capacity": self.bloom.capacity,
+            "memory_bytes": self.bloom.memory_bytes,
+            "hashes": self.bloom.num_hashes,
+            "expected_error_rate": round(self.bloom.expected_error_rate, 6),
+            "deleted_since_build": self.deleted_since_build,
+            "built_at": self.built_at,
+        }
+
+def _build(kind: str, model) -> IdFilter:
+    return IdFilter(
+        kind,
+        model,
+        capacity=settings.id_filter_capacity,
+        error_rate=settings.id_filter_error_rate,
+        negative_ttl=settings.negative_cache_ttl_seconds,
+        refresh_interval=settings.id_filter_refresh_seconds,
+        enabled=settings.id_filter_enabled,
+    )
+
+place_ids = _build("place", Place)
+review_ids = _build("review", Review)
@@ -0,0 +1,172 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from prometheus_client import Counter
+
+from ..config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+JOBS = Counter('fika_jobs_total', 'Background jobs by type and final status', ['type', 'status'])
+
+# Handles one job's payload and returns its JSON-serializable result
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class JobQueueFullError(Exception):
+    """Raised by ``submit`` when the queue is at capacity"""
+
+class PermanentJobError(Exception):
+    """Raised by a handler for failures that retrying can't fix"""
+
+class JobQueue:
+    """In-process queue for slow work such as LLM calls.
+
+    ``submit`` returns at once with a job ID; a pool of ``concurrency``
+    worker tasks runs the jobs, retrying failures up to ``max_attempts`` with
+    jittered exponential backoff. Job state lives in the cache for
+    ``result_ttl`` seconds, so any worker process can answer status requests.
+    Queued jobs are held in memory and don't survive a restart.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        result_ttl: int = 86400,
+        max_size: int = 1000,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.result_ttl = result_ttl
+        self.handlers: Dict[str, JobHandler] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._workers: List[asyncio.Task] = []
+
+    def handler(self, job_type: str) -> Callable[[JobHandler], JobHandler]:
+        """Register the handler for a job type"""
+        def register(func: JobHandler) -> JobHandler:
+            self.handlers[job_type] = func
+            return func
+        return register
+
+    def _key(self, job_id: str) -> str:
+        return f"job:{job_id}"
+
+    async def _save(self, job: Dict[str, Any]):
+        await cache_service.set(self._key(job["id"]), job, expire=self.result_ttl)
+
+    async def submit(self, job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a job and return its initial state"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        if self._queue.full():
+            raise JobQueueFullError("Job queue is full")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "type": job_type,
+            "status": QUEUED,
+            "payload": payload,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        await self._save(job)
+        self._queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await cache_service.get(self._key(job_id))
+
+    async def get_many(self, job_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        if not job_ids:
+            return []
+        return await cache_service.get_multiple([self._key(job_id) for job_id in job_ids])
+
+    async def _run(self, job: Dict[str, Any]):
+        handler = self.handlers[job["type"]]
+        job["started_at"] = job["started_at"] or time.time()
+
+        while True:
+            job["attempts"] += 1
+            job["status"] = RUNNING
+            await self._save(job)
+
+            try:
+                job["result"] = await handler(job["payload"])
+                job["status"] = SUCCEEDED
+                job["error"] = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job["error"] = str(e)
+                if isinstance(e, PermanentJobError) or job["attempts"] >= self.max_attempts:
+                    job["status"] = FAILED
+                    logger.error(f"Job {job['id']} ({job['type']}) failed after {job['attempts']} attempts: {e}")
+                    break
+
+                job["status"] = RETRYING
+                await self._save(job)
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+        job["finished_at"] = time.time()
+        await self._save(job)
+        JOBS.labels(type=job["type"], status=job["status"]).inc()
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error on {job['id']}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """Start the worker pool"""
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Cancel the workers; queued and running jobs are abandoned"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "workers": len(self._workers),
+            "job_types": sorted(self.handlers),
+        }
+
+job_queue = JobQueue(
+    concurrency=settings.ai_job_concurrency,
+    max_attempts=settings.ai_job_max_attempts,
+    retry_delay=settings.ai_job_retry_delay_seconds,
+    result_ttl=settings.ai_job_result_ttl_seconds,
+    max_size=settings.ai_job_queue_max_size,
+)
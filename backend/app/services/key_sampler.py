@@ -0,0 +1,38 @@
+from collections import Counter
+from typing import List, Tuple
+import random
+
+class KeySampler:
+    """Approximate access counts for the most frequently used cache keys.
+
+    Only a random ``sample_rate`` share of accesses is recorded, and estimates
+    are scaled back up, so recording costs almost nothing on the hot path. At
+    most ``max_keys`` keys are tracked; when full, the less frequent half is
+    dropped.
+    """
+
+    def __init__(self, sample_rate: float = 0.01, max_keys: int = 1000):
+        self.sample_rate = sample_rate
+        self.max_keys = max_keys
+        self.counts: Counter = Counter()
+        self.sampled = 0
+
+    def record(self, key: str):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+
+        self.counts[key] += 1
+        self.sampled += 1
+        if len(self.counts) > self.max_keys:
+            self.counts = Counter(dict(self.counts.most_common(self.max_keys // 2)))
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """Most accessed keys with their estimated access counts"""
+        return [(key, round(count / self.sample_rate)) for key, count in self.counts.most_common(limit)]
+
+    def clear(self):
+        self.counts.clear()
+        self.sampled = 0
+
+    def __len__(self) -> int:
+        return len(self.counts)
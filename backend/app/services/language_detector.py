@@ -0,0 +1,206 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import asyncio
+import logging
+import re
+import time
+import uuid
+
+import numpy as np
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.review import Review
+
+logger = logging.getLogger(__name__)
+
+# Training text per language; reviews are mostly about fika, so the samples are too
+SAMPLES: Dict[str, str] = {
+    "sv": """
+        Det här är ett mysigt konditori med de bästa kanelbullarna i stan. Kaffet var gott och personalen
+        var väldigt trevlig. Vi satt länge och pratade, och ingen stressade oss. Prinsesstårtan var lite
+        för söt för min smak, men kardemummabullen var perfekt. Det finns gott om sittplatser både inne
+        och ute på gården. Priserna är rimliga och det går bra att betala med kort. Jag kommer definitivt
+        tillbaka hit nästa gång jag är i närheten. Tyvärr var det kö på lördagen och lokalen blev ganska
+        trång. Kanelbullarna bakas på morgonen och tar ofta slut till eftermiddagen. Bra ställe för en
+        lugn fika med vänner eller familj. Servicen var snabb men kaffet hade kunnat vara varmare. Vi
+        fick en kopp te och en semla som smakade precis som hos mormor. Här finns också glutenfria och
+        veganska alternativ. Stämningen är gammaldags och lugn, med ljus från stora fönster mot gatan.
+        Jag rekommenderar verkligen detta café till alla som vill uppleva riktig svensk fika.
+    """,
+    "en": """
+        This is a cozy bakery with the best cinnamon buns in town. The coffee was good and the staff were
+        very friendly. We sat for a long time talking and nobody rushed us. The princess cake was a bit
+        too sweet for my taste, but the cardamom bun was perfect. There is plenty of seating both inside
+        and out in the courtyard. Prices are reasonable and they take cards. I will definitely come back
+        next time I am in the area. Unfortunately there was a queue on Saturday and it got rather crowded.
+        The buns are baked in the morning and often sell out by the afternoon. A great place for a quiet
+        coffee with friends or family. Service was quick but the coffee could have been hotter. We had a
+        cup of tea and a cream bun that tasted just like my grandmother's. They also have gluten free and
+        vegan options. The atmosphere is old fashioned and calm, with light from big windows onto the
+        street. I would really recommend this cafe to anyone who wants to experience a real Swedish fika.
+    """,
+    "de": """
+        Das ist eine gemütliche Konditorei mit den besten Zimtschnecken der Stadt. Der Kaffee war gut und
+        das Personal war sehr freundlich. Wir saßen lange und haben uns unterhalten, niemand hat uns
+        gehetzt. Die Prinzessinnentorte war mir etwas zu süß, aber das Kardamomgebäck war perfekt. Es gibt
+        viele Sitzplätze drinnen und draußen im Innenhof. Die Preise sind angemessen und man kann mit
+        Karte zahlen. Ich komme bestimmt wieder, wenn ich in der Nähe bin. Leider gab es am Samstag eine
+        Schlange und es wurde ziemlich eng. Die Schnecken werden morgens gebacken und sind oft am
+        Nachmittag ausverkauft. Ein schöner Ort für eine ruhige Kaffeepause mit Freunden oder Familie. Der
+        Service war schnell, aber der Kaffee hätte heißer sein können. Wir hatten eine Tasse Tee und ein
+        Sahnebrötchen, das genau wie bei meiner Großmutter schmeckte. Es gibt auch glutenfreie und vegane
+        Angebote. Ich kann dieses Café wirklich allen empfehlen, die eine echte schwedische Fika erleben wollen.
+    """,
+    "fi": """
+        Tämä on viihtyisä kahvila, jossa on kaupungin parhaat korvapuustit. Kahvi oli hyvää ja henkilökunta
+        oli todella ystävällistä. Istuimme pitkään juttelemassa eikä kukaan hoputtanut meitä. Prinsessakakku
+        oli minun makuuni hieman liian makea, mutta kardemummapulla oli täydellinen. Istumapaikkoja on
+        paljon sekä sisällä että ulkona pihalla. Hinnat ovat kohtuulliset ja korttimaksu käy. Tulen
+        ehdottomasti takaisin, kun olen seuraavan kerran lähellä. Valitettavasti lauantaina oli jonoa ja
+        tila oli melko ahdas. Pullat leivotaan aamulla ja ne loppuvat usein iltapäivään mennessä. Hyvä
+        paikka rauhalliselle kahvihetkelle ystävien tai perheen kanssa. Palvelu oli nopeaa, mutta kahvi
+        olisi voinut olla kuumempaa. Joimme kupin teetä ja söimme laskiaispullan, joka maistui aivan kuin
+        mummolassa. Tarjolla on myös gluteenittomia ja vegaanisia vaihtoehtoja. Suosittelen tätä kahvilaa
+        kaikille, jotka haluavat kokea aidon ruotsalaisen fikan.
+    """,
+}
+
+LANGUAGE_NAMES = {"sv": "Swedish", "en": "English", "de": "German", "fi": "Finnish"}
+
+# PostgreSQL text search configurations with a places index (see init.sql)
+TEXT_SEARCH_CONFIGS = {"sv": "swedish", "en": "english"}
+
+_NON_LETTERS = re.compile(r"[^\w]+|[\d_]+")
+
+class LanguageDetector:
+    """Identifies a text's language from character n-grams.
+
+    Naive Bayes over character 1- to 3-grams of each word, with profiles
+    built from ``SAMPLES`` at startup. Scoring a text is one dictionary
+    lookup per n-gram and a row sum over a small log-probability matrix,
+    so batches run at thousands of texts per second. Texts with fewer than
+    ``min_letters`` letters, or without a clear winner, get ``default``.
+    Norwegian and Danish, which the profiles don't cover, come out as
+    Swedish.
+    """
+
+    def __init__(
+        self,
+        samples: Optional[Dict[str, str]] = None,
+        default: str = "sv",
+        max_order: int = 3,
+        min_letters: int = 10,
+        min_margin: float = 0.02,
+        smoothing: float = 0.5,
+    ):
+        samples = samples or SAMPLES
+        self.default = default
+        self.max_order = max_order
+        self.min_letters = min_letters
+        self.min_margin = min_margin  # Per n-gram log-likelihood lead of the best language
+        self.languages: List[str] = list(samples)
+
+        counts = {language: Counter(self._grams(text)) for language, text in samples.items()}
+        vocabulary = sorted(set().union(*counts.values()))
+        self._vocabulary = {gram: i for i, gram in enumerate(vocabulary)}
+
+        # One row per n-gram plus a last row for n-grams no sample has
+        self._log_probs = np.empty((len(vocabulary) + 1, len(self.languages)))
+        for column, language in enumerate(self.languages):
+            language_counts = counts[language]
+            total = sum(language_counts.values()) + smoothing * (len(vocabulary) + 1)
+            self._log_probs[:-1, column] = np.log(
+                (np.array([language_counts[gram] for gram in vocabulary], dtype=np.float64) + smoothing) / total
+            )
+            self._log_probs[-1, column] = np.log(smoothing / total)
+
+    def _grams(self, text: str) -> List[str]:
+        grams = []
+        for word in _NON_LETTERS.sub(" ", text.lower()).split():
+            padded = f" {word} "
+            for order in range(1, self.max_order + 1):
+                grams.extend(padded[i:i + order] for i in range(len(padded) - order + 1))
+        return grams
+
+    def detect_with_confidence(self, text: Optional[str]) -> Tuple[str, float]:
+        """Language code and the per n-gram lead over the runner-up"""
+        if not text or sum(char.isalpha() for char in text) < self.min_letters:
+            return self.default, 0.0
+
+        unseen = len(self._vocabulary)
+        rows = [self._vocabulary.get(gram, unseen) for gram in self._grams(text)]
+        scores = self._log_probs[rows].sum(axis=0) / len(rows)
+        order = np.argsort(scores)
+        margin = float(scores[order[-1]] - scores[order[-2]]) if len(order) > 1 else 1.0
+        if margin < self.min_margin:
+            return self.default, margin
+        return self.languages[order[-1]], margin
+
+    def detect(self, text: Optional[str]) -> str:
+        return self.detect_with_confidence(text)[0]
+
+    def detect_many(self, texts: Sequence[Optional[str]]) -> List[str]:
+        return [self.detect(text) for text in texts]
+
+    def text_search_config(self, text: Optional[str], fallback: str = "english") -> str:
+        """PostgreSQL text search configuration for a query, by its language"""
+        language, margin = self.detect_with_confidence(text)
+        if margin < self.min_margin:
+            return fallback
+        return TEXT_SEARCH_CONFIGS.get(language, fallback)
+
+    def _backfill(self, batch_size: int, only_unchecked: bool) -> Tuple[Dict[str, Any], Set[uuid.UUID]]:
+        """Detect and store the language of existing reviews, in ID order"""
+        started = time.monotonic()
+        scanned = 0
+        changed_places: Set[uuid.UUID] = set()
+        updated = 0
+        last_id = None
+        db = SessionLocal()
+        try:
+            while True:
+                query = db.query(Review.id, Review.place_id, Review.comment, Review.language).filter(
+                    Review.comment.isnot(None)
+                )
+                if only_unchecked:
+                    # Reviews created before detection all carry the column default
+                    query = query.filter(Review.language == self.default)
+                if last_id is not None:
+                    query = query.filter(Review.id > last_id)
+                rows = query.order_by(Review.id).limit(batch_size).all()
+                if not rows:
+                    break
+
+                changes = []
+                for row, language in zip(rows, self.detect_many([row.comment for row in rows])):
+                    if language != row.language:
+                        changes.append({"id": row.id, "language": language})
+                        changed_places.add(row.place_id)
+                if changes:
+                    db.bulk_update_mappings(Review, changes)
+                    db.commit()
+                scanned += len(rows)
+                updated += len(changes)
+                last_id = rows[-1].id
+        finally:
+            db.close()
+
+        duration = time.monotonic() - started
+        logger.info(f"Language backfill scanned {scanned} reviews and updated {updated} in {duration:.1f}s")
+        summary = {
+            "scanned": scanned,
+            "updated": updated,
+            "duration_seconds": round(duration, 3),
+            "reviews_per_second": round(scanned / duration) if duration > 0 else scanned,
+        }
+        return summary, changed_places
+
+    async def backfill(self, batch_size: int = 2000, only_unchecked: bool = True) -> Tuple[Dict[str, Any], Set[uuid.UUID]]:
+        """Detect the language of existing reviews without blocking the event loop.
+
+        Returns a summary and the IDs of places whose reviews changed.
+        """
+        return await asyncio.to_thread(self._backfill, batch_size, only_unchecked)
+
+language_detector = LanguageDetector(default=settings.review_default_language)
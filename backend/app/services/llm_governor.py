@@ -0,0 +1,312 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+from prometheus_client import Counter
+
+from ..config import settings
+
+try:
+    import openai
+    _TRANSIENT_ERRORS = (asyncio.TimeoutError, httpx.TransportError, openai.APIConnectionError)
+except ImportError:
+    _TRANSIENT_ERRORS = (asyncio.TimeoutError, httpx.TransportError)
+
+logger = logging.getLogger(__name__)
+
+LLM_CALLS = Counter(
+    'fika_llm_calls_total',
+    'LLM calls by operation and outcome: ok, error, busy, budget or deadline',
+    ['operation', 'outcome']
+)
+LLM_RETRIES = Counter('fika_llm_retries_total', 'LLM call attempts retried after a transient error', ['operation'])
+LLM_HEDGES = Counter('fika_llm_hedges_total', 'Hedged LLM requests started, by which attempt won', ['operation', 'winner'])
+
+# Provider statuses worth another attempt
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+class LLMLimitError(Exception):
+    """Raised instead of calling the LLM when a governor limit is hit"""
+
+class LLMBusyError(LLMLimitError):
+    """No concurrency slot became free in time"""
+
+class LLMBudgetError(LLMLimitError):
+    """The token-rate budget is spent"""
+
+class LLMDeadlineError(LLMLimitError):
+    """The call's deadline passed before an attempt succeeded"""
+
+def is_transient(error: BaseException) -> bool:
+    """Whether another attempt of the same request might succeed"""
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    return getattr(error, "status_code", None) in _RETRYABLE_STATUS
+
+class TokenBucket:
+    """Token-rate budget: ``rate`` tokens per second, at most ``capacity`` saved up"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount: float) -> bool:
+        """Spend ``amount`` tokens if available; requests larger than the capacity only need a full bucket"""
+        self._refill()
+        needed = min(amount, self.capacity)
+        if self.tokens < needed:
+            return False
+        self.tokens -= amount
+        return True
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class _Reservation:
+    """Budget held for one attempt: ``tokens`` per request sent, the first plus any hedged backup"""
+
+    def __init__(self, budget: Optional[TokenBucket], tokens: int):
+        self.budget = budget
+        self.tokens = tokens
+        self.held = 0
+
+    def take(self) -> bool:
+        if self.budget is not None and not self.budget.take(self.tokens):
+            return False
+        self.held += self.tokens
+        return True
+
+    def release(self):
+        if self.budget is not None and self.held > 0:
+            self.budget.refund(self.held)
+        self.held = 0
+
+class LLMGovernor:
+    """Limits, deadlines and retries shared by every LLM call in the process.
+
+    Each call needs a slot from its operation's semaphore and from the
+    global one, waiting at most ``queue_timeout`` seconds, and tokens from
+    the rate budget. Attempts run under one deadline per call; transient
+    errors are retried with full-jitter exponential backoff while the
+    deadline allows. Operations listed in ``hedge_after`` start a second,
+    identical request when the first is slower than that many seconds and a
+    slot is free, and use whichever answers first; only idempotent
+    operations should be hedged.
+
+    Every request sent, retries and hedged backups included, reserves the
+    call's estimated tokens. An attempt that fails gives its reservation
+    back, as failed requests are assumed to have used nothing; a successful
+    one keeps it, including the cancelled request's share when a hedge won.
+
+    Limits are never waited out beyond ``queue_timeout``: callers get an
+    ``LLMLimitError`` and answer with their fallback instead.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        operation_concurrency: Optional[Dict[str, int]] = None,
+        queue_timeout: float = 2.0,
+        deadlines: Optional[Dict[str, float]] = None,
+        max_attempts: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+        hedge_after: Optional[Dict[str, float]] = None,
+        tokens_per_minute: int = 0,
+        token_burst: int = 0,
+    ):
+        self.queue_timeout = queue_timeout
+        self.deadlines = {"default": 30.0, **(deadlines or {})}
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_after = hedge_after or {}
+        self.budget = (
+            TokenBucket(tokens_per_minute / 60.0, token_burst or tokens_per_minute) if tokens_per_minute > 0 else None
+        )
+
+        self.max_concurrency = max_concurrency
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._operation_limits = operation_concurrency or {}
+        self._operations: Dict[str, asyncio.Semaphore] = {
+            operation: asyncio.Semaphore(limit) for operation, limit in self._operation_limits.items()
+        }
+        self.in_flight = 0
+
+    def deadline_for(self, operation: str) -> float:
+        return self.deadlines.get(operation, self.deadlines["default"])
+
+    def refund(self, tokens: int):
+        """Give back budget reserved for tokens a call didn't use"""
+        if self.budget is not None and tokens > 0:
+            self.budget.refund(tokens)
+
+    async def _acquire(self, operation: str, timeout: float) -> bool:
+        """Take an operation slot and a global slot, or neither"""
+        semaphore = self._operations.get(operation)
+        started = time.monotonic()
+        try:
+            if semaphore is not None:
+                await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        try:
+            await asyncio.wait_for(self._global.acquire(), max(0.0, timeout - (time.monotonic() - started)))
+        except BaseException as e:
+            # Timed out, or cancelled by the deadline, a hedge or a disconnect
+            if semaphore is not None:
+                semaphore.release()
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+        self.in_flight += 1
+        return True
+
+    def _release(self, operation: str):
+        self.in_flight -= 1
+        self._global.release()
+        semaphore = self._operations.get(operation)
+        if semaphore is not None:
+            semaphore.release()
+
+    def _free_slot(self, operation: str) -> bool:
+        semaphore = self._operations.get(operation)
+        return not self._global.locked() and (semaphore is None or not semaphore.locked())
+
+    async def _attempt(self, operation: str, call: Callable[[], Awaitable[T]], timeout: float) -> T:
+        """One attempt holding its own slots"""
+        if not await self._acquire(operation, min(self.queue_timeout, timeout)):
+            raise LLMBusyError(f"No free LLM slot for {operation}")
+        try:
+            return await call()
+        finally:
+            self._release(operation)
+
+    async def _hedged(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[T]],
+        timeout: float,
+        delay: float,
+        reservation: _Reservation,
+    ) -> T:
+        """An attempt with a backup request started after ``delay`` seconds, if a slot and budget allow"""
+        primary = asyncio.ensure_future(self._attempt(operation, call, timeout))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=min(delay, timeout))
+            if done:
+                return primary.result()
+            if not self._free_slot(operation) or not reservation.take():
+                return await primary
+
+            backup = asyncio.ensure_future(self._attempt(operation, call, timeout - delay))
+            pending.add(backup)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels(operation=operation, winner="primary" if task is primary else "backup").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancelled by the deadline, or the other request won
+            for task in pending:
+                task.cancel()
+
+    async def run(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        max_attempts: Optional[int] = None,
+    ) -> T:
+        """Run ``call`` under the operation's limits, raising ``LLMLimitError`` when refused.
+
+        ``call`` starts a fresh request each time it is invoked. Pass
+        ``max_attempts=1`` for calls that can't be repeated, e.g. once
+        streamed output has been sent. After a successful call, ``refund``
+        the difference between ``estimated_tokens`` and what the answer
+        actually used.
+        """
+        reservation = _Reservation(self.budget, estimated_tokens)
+        if not reservation.take():
+            LLM_CALLS.labels(operation=operation, outcome="budget").inc()
+            raise LLMBudgetError(f"LLM token budget exhausted, {estimated_tokens} tokens needed for {operation}")
+
+        deadline = time.monotonic() + self.deadline_for(operation)
+        attempts = max_attempts or self.max_attempts
+        hedge_delay = self.hedge_after.get(operation)
+
+        for attempt in range(1, attempts + 1):
+            if attempt > 1 and not reservation.take():
+                LLM_CALLS.labels(operation=operation, outcome="budget").inc()
+                raise LLMBudgetError(f"LLM token budget exhausted, {estimated_tokens} tokens needed to retry {operation}")
+
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                if hedge_delay is not None:
+                    attempt_call = self._hedged(operation, call, remaining, hedge_delay, reservation)
+                else:
+                    attempt_call = self._attempt(operation, call, remaining)
+                result = await asyncio.wait_for(attempt_call, remaining)
+            except LLMBusyError:
+                LLM_CALLS.labels(operation=operation, outcome="busy").inc()
+                reservation.release()
+                raise
+            except Exception as e:
+                reservation.release()
+                timed_out = time.monotonic() >= deadline
+                if timed_out:
+                    LLM_CALLS.labels(operation=operation, outcome="deadline").inc()
+                    raise LLMDeadlineError(f"{operation} missed its {self.deadline_for(operation):g}s deadline") from e
+
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+                if attempt == attempts or not is_transient(e) or time.monotonic() + delay >= deadline:
+                    LLM_CALLS.labels(operation=operation, outcome="error").inc()
+                    raise
+
+                LLM_RETRIES.labels(operation=operation).inc()
+                logger.warning(f"LLM {operation} attempt {attempt} failed, retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            LLM_CALLS.labels(operation=operation, outcome="ok").inc()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "operation_concurrency": self._operation_limits,
+            "token_budget_remaining": round(self.budget.tokens) if self.budget is not None else None,
+        }
+
+llm_governor = LLMGovernor(
+    max_concurrency=settings.ai_llm_max_concurrency,
+    operation_concurrency=settings.ai_llm_operation_concurrency,
+    queue_timeout=settings.ai_llm_queue_timeout_seconds,
+    deadlines=settings.ai_llm_deadline_seconds,
+    max_attempts=settings.ai_llm_max_attempts,
+    retry_base_delay=settings.ai_llm_retry_base_delay_seconds,
+    retry_max_delay=settings.ai_llm_retry_max_delay_seconds,
+    hedge_after=settings.ai_llm_hedge_after_seconds,
+    tokens_per_minute=settings.ai_llm_tokens_per_minute,
+    token_burst=settings.ai_llm_token_burst,
+)
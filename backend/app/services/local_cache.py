@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Optional
+import time
+
+class LocalCache:
+    """Bounded in-process LRU cache with per-entry expiry.
+
+    Stands in for Redis while it is unreachable, so it only needs to hold the
+    hottest entries of this worker.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires at, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expire: int):
+        self._entries[key] = (time.monotonic() + expire, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def clear_pattern(self, pattern: str) -> int:
+        """Remove keys matching a Redis-style glob pattern"""
+        keys = [key for key in self._entries if fnmatchcase(key, pattern)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,312 @@
+from collections import Counter as TokenCounter, deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import math
+import re
+import unicodedata
+
+from prometheus_client import Counter
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.review import Review
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_DECISIONS = Counter(
+    'fika_moderation_prefilter_total',
+    'Texts seen by the local moderation prefilter, by decision: approve, reject or escalate',
+    ['decision']
+)
+
+# Patterns match whole words; a trailing * matches any word starting with the pattern
+BLOCKLISTS: Dict[str, List[str]] = {
+    # Rejected outright
+    "abuse": [
+        "kill yourself", "kys", "go die", "retard*", "cunt*", "whore*",
+        "dö i helvete", "ta livet av dig", "fitta", "fittan", "hora", "horunge", "mongo",
+    ],
+    # Raises toxicity; left to the LLM, since a swear word can be praise
+    "profanity": [
+        "fuck*", "shit*", "bitch*", "asshole*", "bastard*", "idiot*", "moron*", "crap",
+        "jävl*", "helvete*", "skitstövel*", "kuk", "kukhuvud*",
+    ],
+    "spam": [
+        "buy now", "click here", "free money", "promo code", "discount code", "limited offer",
+        "casino*", "viagra", "bitcoin*", "crypto*", "forex", "onlyfans", "whatsapp", "telegram",
+        "köp nu", "klicka här", "rabattkod*", "gratis pengar", "tjäna pengar", "besök vår hemsida",
+    ],
+}
+
+_URL = re.compile(r"(https?://|www\.)\S+|\b[a-z0-9-]+\.(com|se|net|org|io|nu|info|biz|ru|xyz)\b", re.IGNORECASE)
+_EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.]+\b")
+# Phone numbers in national (070-123 45 67) or international (+46 70 123 45 67) form
+_PHONE = re.compile(r"(?<![\d-])(?:\+\d{2}[\s-]?|0)\d{1,3}(?:[\s-]?\d){5,9}(?![\d-])")
+_WORD = re.compile(r"\w+")
+
+# Moderators whose decisions the model learns from
+TRAINING_SOURCES = ("llm", "admin")
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+class AhoCorasick:
+    """Finds every occurrence of many patterns in one pass over the text"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, bool, Any]]] = [[]]
+
+        for pattern, value in patterns:
+            prefix = pattern.endswith("*")
+            pattern = _normalize(pattern.rstrip("*"))
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].append((len(pattern), prefix, value))
+
+        # Failure links, breadth first; the root's children fail to the root
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, Any]]:
+        """(start, end, value) of word-bounded matches in normalized text"""
+        matches = []
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, prefix, value in self._out[node]:
+                start = end - length
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if not prefix and end < len(text) and text[end].isalnum():
+                    continue
+                matches.append((start, end, value))
+        return matches
+
+class NaiveBayes:
+    """Multinomial naive Bayes over word and bigram counts, two classes"""
+
+    def __init__(self, min_count: int = 2):
+        self.min_count = min_count
+        self.log_prior = 0.0
+        self.log_ratios: Dict[str, float] = {}
+        self.samples = {"approve": 0, "reject": 0}
+
+    @staticmethod
+    def features(text: str) -> List[str]:
+        words = _WORD.findall(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def fit(self, samples: Iterable[Tuple[str, str]]):
+        counts = {"approve": TokenCounter(), "reject": TokenCounter()}
+        documents = {"approve": 0, "reject": 0}
+        for text, label in samples:
+            counts[label].update(self.features(text))
+            documents[label] += 1
+
+        total = counts["approve"] + counts["reject"]
+        vocabulary = [feature for feature, count in total.items() if count >= self.min_count]
+        approve_total = sum(counts["approve"][f] for f in vocabulary) + len(vocabulary)
+        reject_total = sum(counts["reject"][f] for f in vocabulary) + len(vocabulary)
+
+        # Laplace-smoothed log likelihood ratio of reject over approve, per feature
+        self.log_ratios = {
+            feature: math.log((counts["reject"][feature] + 1) / reject_total)
+            - math.log((counts["approve"][feature] + 1) / approve_total)
+            for feature in vocabulary
+        }
+        self.log_prior = math.log((documents["reject"] + 1) / (documents["approve"] + 1))
+        self.samples = documents
+
+    def reject_probability(self, text: str) -> float:
+        log_odds = self.log_prior + sum(self.log_ratios.get(feature, 0.0) for feature in self.features(text))
+        if log_odds < -30:
+            return 0.0
+        if log_odds > 30:
+            return 1.0
+        return 1.0 / (1.0 + math.exp(-log_odds))
+
+@dataclass(frozen=True)
+class PrefilterVerdict:
+    decision: Optional[str]  # "approve", "reject", or None to ask the LLM
+    toxicity: float
+    spam: bool
+    reasons: Tuple[str, ...]
+    reject_probability: Optional[float] = None
+
+class ModerationPrefilter:
+    """First-stage moderation that settles clear cases without the LLM.
+
+    Blocklisted abuse is rejected outright, as is text with two or more spam
+    signals (spam phrases, links, e-mail addresses, phone numbers). A naive
+    Bayes model trained on reviews moderated so far decides the rest when it
+    is confident: below ``approve_below`` or above ``reject_above``
+    probability of rejection. Text with a single spam signal or profanity
+    is only auto-rejected, never auto-approved. Everything else is left to
+    the LLM. The model is retrained every ``retrain_interval`` seconds and
+    only used once it has ``min_samples`` examples of each class.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        approve_below: float = 0.02,
+        reject_above: float = 0.98,
+        min_samples: int = 50,
+        max_samples: int = 50000,
+        retrain_interval: float = 6 * 3600,
+        blocklist_path: Optional[str] = None,
+    ):
+        self.enabled = enabled
+        self.approve_below = approve_below
+        self.reject_above = reject_above
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.retrain_interval = retrain_interval
+
+        blocklists = {category: list(patterns) for category, patterns in BLOCKLISTS.items()}
+        if blocklist_path:
+            try:
+                with open(blocklist_path, encoding="utf-8") as f:
+                    for category, patterns in json.load(f).items():
+                        blocklists.setdefault(category, []).extend(patterns)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load moderation blocklist {blocklist_path}: {e}")
+        self.matcher = AhoCorasick(
+            (pattern, category) for category, patterns in blocklists.items() for pattern in patterns
+        )
+
+        self.model: Optional[NaiveBayes] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def assess(self, text: str) -> PrefilterVerdict:
+        if not self.enabled or not text or not text.strip():
+            return PrefilterVerdict(None, 0.0, False, ())
+
+        normalized = _normalize(text)
+        hits = TokenCounter(category for _, _, category in self.matcher.find(normalized))
+        reasons = [f"{category}: {count}" for category, count in hits.items()]
+        spam_signals = hits["spam"]
+        for name, pattern in (("link", _URL), ("email", _EMAIL), ("phone", _PHONE)):
+            if pattern.search(text):
+                spam_signals += 1
+                reasons.append(name)
+
+        spam = spam_signals >= 2
+        toxicity = min(1.0, 0.9 * bool(hits["abuse"]) + 0.3 * hits["profanity"])
+        if hits["abuse"] or spam:
+            return self._verdict("reject", max(toxicity, 0.9 if hits["abuse"] else 0.0), spam, reasons)
+
+        model = self.model
+        if model is None:
+            return self._verdict(None, toxicity, False, reasons)
+
+        probability = model.reject_probability(normalized)
+        suspicious = spam_signals or hits["profanity"]
+        if probability >= self.reject_above:
+            return self._verdict("reject", toxicity, bool(spam_signals), reasons, probability)
+        if probability <= self.approve_below and not suspicious:
+            return self._verdict("approve", toxicity, False, reasons, probability)
+        return self._verdict(None, toxicity, False, reasons, probability)
+
+    def _verdict(
+        self,
+        decision: Optional[str],
+        toxicity: float,
+        spam: bool,
+        reasons: List[str],
+        probability: Optional[float] = None,
+    ) -> PrefilterVerdict:
+        PREFILTER_DECISIONS.labels(decision=decision or "escalate").inc()
+        return PrefilterVerdict(decision, round(toxicity, 2), spam, tuple(reasons), probability)
+
+    def _load_history(self) -> List[Tuple[str, str]]:
+        """Most recent review texts the LLM or an admin moderated, with their outcome.
+
+        Reviews the prefilter decided itself are left out, so its confident
+        mistakes don't become its own training labels.
+        """
+        db = SessionLocal()
+        try:
+            rows = db.query(Review.comment, Review.moderated).filter(
+                Review.moderated != 0,
+                Review.moderated_by.in_(TRAINING_SOURCES),
+                Review.comment.isnot(None)
+            ).order_by(Review.moderated_at.desc()).limit(self.max_samples).all()
+        finally:
+            db.close()
+        return [(_normalize(comment), "approve" if moderated == 1 else "reject") for comment, moderated in rows]
+
+    def _fit(self) -> Optional[NaiveBayes]:
+        history = self._load_history()
+        model = NaiveBayes()
+        model.fit(history)
+        if min(model.samples.values()) < self.min_samples:
+            logger.info(f"Moderation prefilter model not used yet, too few samples: {model.samples}")
+            return None
+        logger.info(f"Trained moderation prefilter on {model.samples}, {len(model.log_ratios)} features")
+        return model
+
+    async def train(self):
+        """Retrain the model on the moderation history"""
+        self.model = await asyncio.to_thread(self._fit)
+
+    def start(self):
+        """Train now and periodically in the background"""
+        if not self.enabled:
+            return
+
+        async def retrain():
+            while True:
+                try:
+                    await self.train()
+                except Exception as e:
+                    logger.warning(f"Moderation prefilter training failed: {e}")
+                await asyncio.sleep(self.retrain_interval)
+
+        self._task = asyncio.create_task(retrain())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "model_samples": self.model.samples if self.model else None,
+            "model_features": len(self.model.log_ratios) if self.model else 0,
+        }
+
+moderation_prefilter = ModerationPrefilter(
+    enabled=settings.moderation_prefilter_enabled,
+    approve_below=settings.moderation_prefilter_approve_below,
+    reject_above=settings.moderation_prefilter_reject_above,
+    min_samples=settings.moderation_prefilter_min_samples,
+    max_samples=settings.moderation_prefilter_max_samples,
+    retrain_interval=settings.moderation_prefilter_retrain_seconds,
+    blocklist_path=settings.moderation_blocklist_path,
+)
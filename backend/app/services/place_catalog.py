@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+import uuid
+
+import numpy as np
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.place import Place
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CatalogPlace:
+    """The columns of one place that local analytics need"""
+    id: uuid.UUID
+    name: str
+    address: Optional[str]
+    city: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    description: Optional[str]
+    fika_specialties: List[str]
+    features: List[str]
+    price_range: Optional[int]
+    rating: Optional[float]
+    review_count: int
+    verified: bool
+    updated_at: Optional[datetime]
+
+    def summary(self) -> Dict[str, Any]:
+        return {"id": str(self.id), "name": self.name, "address": self.address, "city": self.city}
+
+class CatalogSnapshot:
+    """Immutable view of every place, with coordinates as arrays for vectorized work"""
+
+    def __init__(self, places: List[CatalogPlace], version: int):
+        self.places = places
+        self.version = version
+        self.loaded_at = time.time()
+        self.index_by_id = {place.id: i for i, place in enumerate(places)}
+
+        # NaN where a place has no coordinates
+        self.latitudes = np.array([np.nan if p.latitude is None else p.latitude for p in places], dtype=np.float64)
+        self.longitudes = np.array([np.nan if p.longitude is None else p.longitude for p in places], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def get(self, place_id: uuid.UUID) -> Optional[CatalogPlace]:
+        index = self.index_by_id.get(place_id)
+        return self.places[index] if index is not None else None
+
+class PlaceCatalog:
+    """In-memory snapshot of the places table shared by local analytics.
+
+    Duplicate detection, recommendations and search indexes read places from
+    here instead of querying per request. The snapshot is reloaded when it is
+    older than ``max_age`` seconds or after ``invalidate``; place writes in
+    this worker invalidate it, other workers catch up within ``max_age``.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._stale = True
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def _load(self) -> List[CatalogPlace]:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Place.id, Place.name, Place.address, Place.city, Place.latitude, Place.longitude,
+                Place.description, Place.fika_specialties, Place.features, Place.price_range,
+                Place.rating, Place.review_count, Place.verified, Place.updated_at
+            ).all()
+        finally:
+            db.close()
+
+        return [
+            CatalogPlace(
+                id=row.id,
+                name=row.name,
+                address=row.address,
+                city=row.city,
+                latitude=float(row.latitude) if row.latitude is not None else None,
+                longitude=float(row.longitude) if row.longitude is not None else None,
+                description=row.description,
+                fika_specialties=list(row.fika_specialties or []),
+                features=list(row.features or []),
+                price_range=row.price_range,
+                rating=float(row.rating) if row.rating is not None else None,
+                review_count=row.review_count or 0,
+                verified=bool(row.verified),
+                updated_at=row.updated_at,
+            )
+            for row in rows
+        ]
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and not self._stale
+            and time.time() - self._snapshot.loaded_at < self.max_age
+        )
+
+    async def get(self) -> CatalogSnapshot:
+        """Current snapshot, reloading it first if stale"""
+        if self._is_fresh():
+            return self._snapshot
+
+        async with self._lock:
+            if not self._is_fresh():
+                self._stale = False
+                places = await asyncio.to_thread(self._load)
+                self._version += 1
+                self._snapshot = CatalogSnapshot(places, self._version)
+                logger.info(f"Loaded place catalog version {self._version} with {len(places)} places")
+
+        return self._snapshot
+
+    def invalidate(self):
+        """Reload on next use, after places changed"""
+        self._stale = True
+
+place_catalog = PlaceCatalog(max_age=settings.place_catalog_max_age_seconds)
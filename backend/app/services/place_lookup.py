@@ -0,0 +1,208 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+import math
+import re
+
+import numpy as np
+
+from .duplicate_detector import haversine_m, normalize_text
+from .place_catalog import CatalogPlace, CatalogSnapshot
+from .semantic_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+_COORDINATES = re.compile(r"(-?\d+(?:\.\d+)?)\s*[, ]\s*(-?\d+(?:\.\d+)?)(?:\s*[, ]\s*(\d+(?:\.\d+)?))?")
+
+def format_place(place: CatalogPlace, distance_km: Optional[float] = None) -> str:
+    """One compact line per place, to keep tool output cheap in tokens"""
+    parts = [f"{place.name} ({place.city})"]
+    if place.rating is not None:
+        parts.append(f"{place.rating:.1f}★/{place.review_count}")
+    if place.price_range:
+        parts.append("$" * place.price_range)
+    if distance_km is not None:
+        parts.append(f"{distance_km:.1f}km")
+    line = " ".join(parts)
+    if place.fika_specialties:
+        line += " · " + ", ".join(place.fika_specialties[:3])
+    return line
+
+class _LookupIndex:
+    """Name, city, specialty and grid indexes for one catalog snapshot"""
+
+    def __init__(self, snapshot: CatalogSnapshot, cell_size_deg: float):
+        self.snapshot = snapshot
+        self.cell_size_deg = cell_size_deg
+        self.names: Dict[str, List[int]] = defaultdict(list)
+        self.name_tokens: Dict[str, Set[int]] = defaultdict(set)
+        self.cities: Dict[str, List[int]] = defaultdict(list)
+        self.specialties: Dict[str, Set[int]] = defaultdict(set)
+        self.features: Dict[str, Set[int]] = defaultdict(set)
+        self.grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+        for slot, place in enumerate(snapshot.places):
+            self.names[normalize_text(place.name)].append(slot)
+            for token in tokenize(place.name):
+                self.name_tokens[token].add(slot)
+            self.cities[" ".join(tokenize(place.city))].append(slot)
+            for token in tokenize(" ".join(place.fika_specialties)):
+                self.specialties[token].add(slot)
+            for token in tokenize(" ".join(place.features).replace("_", " ")):
+                self.features[token].add(slot)
+            if place.latitude is not None and place.longitude is not None:
+                self.grid[self.cell(place.latitude, place.longitude)].append(slot)
+
+        # Rating smoothed towards the mean, for ordering equally good matches
+        places = snapshot.places
+        ratings = np.array([p.rating or 0.0 for p in places])
+        counts = np.array([p.review_count for p in places], dtype=np.float64)
+        prior = ratings[counts > 0].mean() if (counts > 0).any() else 3.0
+        self.quality = (ratings * counts + prior * 5) / (counts + 5)
+
+    def cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_size_deg), math.floor(longitude / self.cell_size_deg)
+
+class PlaceLookup:
+    """Fast place lookups for the chat agent's tools, over the place catalog.
+
+    Results are formatted as short lines (name, city, rating, price and a
+    few specialties) so tool output costs few prompt tokens. Indexes are
+    rebuilt when the catalog snapshot changes.
+    """
+
+    def __init__(self, max_results: int = 5, cell_size_deg: float = 0.01, default_radius_km: float = 1.0):
+        self.max_results = max_results
+        self.cell_size_deg = cell_size_deg
+        self.default_radius_km = default_radius_km
+        self._index: Optional[_LookupIndex] = None
+
+    def index_for(self, snapshot: CatalogSnapshot) -> _LookupIndex:
+        index = self._index
+        if index is None or index.snapshot.version != snapshot.version:
+            index = self._index = _LookupIndex(snapshot, self.cell_size_deg)
+            logger.info(f"Built place lookup for catalog version {snapshot.version}: {len(snapshot)} places")
+        return index
+
+    def _ranked(self, index: _LookupIndex, scores: Dict[int, float]) -> List[int]:
+        return sorted(scores, key=lambda slot: (scores[slot], index.quality[slot]), reverse=True)[:self.max_results]
+
+    def _find(self, index: _LookupIndex, name: str) -> Optional[int]:
+        """Slot of the place best matching a name"""
+        exact = index.names.get(normalize_text(name))
+        if exact:
+            return max(exact, key=lambda slot: index.quality[slot])
+
+        scores: Dict[int, float] = defaultdict(float)
+        for token in tokenize(name):
+            for slot in index.name_tokens.get(token, ()):
+                scores[slot] += 1
+        ranked = self._ranked(index, scores)
+        return ranked[0] if ranked else None
+
+    def search(self, snapshot: CatalogSnapshot, query: str) -> str:
+        """Places matching any mix of name, city, specialty and feature words"""
+        index = self.index_for(snapshot)
+        tokens = tokenize(query)
+
+        # City names, including two-word ones, filter instead of scoring
+        city_slots = None
+        remaining = []
+        position = 0
+        while position < len(tokens):
+            pair = " ".join(tokens[position:position + 2])
+            if position + 1 < len(tokens) and pair in index.cities:
+                city_slots = set(index.cities[pair])
+                position += 2
+            elif tokens[position] in index.cities:
+                city_slots = set(index.cities[tokens[position]])
+                position += 1
+            else:
+                remaining.append(tokens[position])
+                position += 1
+
+        scores: Dict[int, float] = defaultdict(float)
+        for token in remaining:
+            for slot in index.name_tokens.get(token, ()):
+                scores[slot] += 2.0
+            for slot in index.features.get(token, ()):
+                scores[slot] += 1.0
+            # Substrings match Swedish compounds: "kanel" and "bullar" find "kanelbullar"
+            if len(token) >= 4:
+                for specialty, slots in index.specialties.items():
+                    if token in specialty:
+                        for slot in slots:
+                            scores[slot] += 1.5
+
+        if city_slots is not None:
+            scores = {slot: score for slot, score in scores.items() if slot in city_slots} if remaining else dict.fromkeys(city_slots, 0.0)
+        if not scores:
+            return f"No places found for '{query}'"
+
+        places = snapshot.places
+        lines = [format_place(places[slot]) for slot in self._ranked(index, scores)]
+        return f"{len(scores)} found, best {len(lines)}:\n" + "\n".join(lines)
+
+    def info(self, snapshot: CatalogSnapshot, name: str) -> str:
+        """Details of the place best matching a name"""
+        index = self.index_for(snapshot)
+        slot = self._find(index, name)
+        if slot is None:
+            return f"No place named '{name}'"
+
+        place = snapshot.places[slot]
+        lines = [format_place(place)]
+        if place.address:
+            lines.append(f"Address: {place.address}")
+        if place.fika_specialties:
+            lines.append(f"Specialties: {', '.join(place.fika_specialties[:6])}")
+        if place.features:
+            lines.append(f"Features: {', '.join(feature.replace('_', ' ') for feature in place.features[:6])}")
+        if place.description:
+            description = place.description if len(place.description) <= 240 else place.description[:237] + "..."
+            lines.append(description)
+        return "\n".join(lines)
+
+    def nearby(self, snapshot: CatalogSnapshot, text: str) -> str:
+        """Places near "latitude, longitude[, radius_km]" or near a named place"""
+        index = self.index_for(snapshot)
+        match = _COORDINATES.search(text)
+        exclude = None
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            radius_km = float(match.group(3)) if match.group(3) else self.default_radius_km
+        else:
+            slot = self._find(index, text)
+            place = snapshot.places[slot] if slot is not None else None
+            if place is None or place.latitude is None or place.longitude is None:
+                return f"No location found for '{text}'; give 'latitude, longitude' or a place name"
+            latitude, longitude, radius_km, exclude = place.latitude, place.longitude, self.default_radius_km, slot
+
+        radius_km = min(radius_km, 10.0)
+        lat_cells = math.ceil(radius_km / 111.0 / self.cell_size_deg)
+        lon_cells = math.ceil(radius_km / (111.0 * max(math.cos(math.radians(latitude)), 0.01)) / self.cell_size_deg)
+        center_lat, center_lon = index.cell(latitude, longitude)
+
+        slots = [
+            slot
+            for dy in range(-lat_cells, lat_cells + 1)
+            for dx in range(-lon_cells, lon_cells + 1)
+            for slot in index.grid.get((center_lat + dy, center_lon + dx), ())
+            if slot != exclude
+        ]
+        if not slots:
+            return f"No places within {radius_km:g}km"
+
+        places = snapshot.places
+        distances = haversine_m(
+            latitude, longitude,
+            np.array([places[slot].latitude for slot in slots]),
+            np.array([places[slot].longitude for slot in slots]),
+        ) / 1000.0
+        within = [(distance, slot) for distance, slot in zip(distances.tolist(), slots) if distance <= radius_km]
+        if not within:
+            return f"No places within {radius_km:g}km"
+
+        within.sort()
+        lines = [format_place(places[slot], distance) for distance, slot in within[:self.max_results]]
+        return f"{len(within)} within {radius_km:g}km, closest {len(lines)}:\n" + "\n".join(lines)
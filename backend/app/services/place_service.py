@@ -8,6 +8,7 @@ from ..models.place import Place
 from ..models.review import Review
 from ..schemas.place import PlaceCreate, PlaceUpdate, PlaceList, PlaceSearch
 from ..schemas.review import ReviewList
+from .language_detector import language_detector
 
 class PlaceService:
     def __init__(self, db: Session):
@@ -23,10 +24,11 @@ class PlaceService:
         
         # Apply filters
         if search_params.query:
-            # Full-text search
-            search_vector = func.to_tsvector('english', 
+            # Full-text search, stemmed for the query's language
+            config = language_detector.text_search_config(search_params.query)
+            search_vector = func.to_tsvector(config, 
                 Place.name + ' ' + func.coalesce(Place.description, ''))
-            search_query = func.plainto_tsquery('english', search_params.query)
+            search_query = func.plainto_tsquery(config, search_params.query)
             query = query.filter(search_vector.match(search_query))
         
         if search_params.city:
@@ -153,6 +155,26 @@ class PlaceService:
         cities = self.db.query(Place.city).distinct().order_by(Place.city).all()
         return [city[0] for city in cities]
 
+    async def get_most_reviewed_place_ids(self, limit: int = 50) -> List[uuid.UUID]:
+        """Get IDs of the places with the most reviews"""
+        rows = self.db.query(Place.id).order_by(
+            Place.review_count.desc().nullslast(),
+            Place.rating.desc().nullslast()
+        ).limit(limit).all()
+        return [row[0] for row in rows]
+
+    async def get_places_by_ids(self, place_ids: List[uuid.UUID]) -> List[Place]:
+        """Get places in the order of the given IDs, skipping missing ones"""
+        if not place_ids:
+            return []
+        places = {place.id: place for place in self.db.query(Place).filter(Place.id.in_(place_ids)).all()}
+        return [places[place_id] for place_id in place_ids if place_id in places]
+
+    async def get_place_ids_by_city(self, city: str) -> List[uuid.UUID]:
+        """Get IDs of all places in a city, matched case-insensitively"""
+        rows = self.db.query(Place.id).filter(func.lower(Place.city) == city.lower()).all()
+        return [row[0] for row in rows]
+
     async def get_place_reviews(self, place_id: uuid.UUID, page: int, per_page: int) -> ReviewList:
         """Get reviews for a specific place"""
         query = self.db.query(Review).filter(
@@ -0,0 +1,184 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from .duplicate_detector import haversine_m
+from .place_catalog import CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(item).strip().lower() for item in value if str(item).strip()]
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class RecommenderIndex:
+    """Feature matrices and arrays for one catalog snapshot"""
+
+    def __init__(self, snapshot: CatalogSnapshot, max_vocabulary: int, rating_prior_weight: float):
+        places = snapshot.places
+        self.snapshot = snapshot
+        self.specialty_vocabulary, self.specialties = self._vocabulary_matrix(
+            [p.fika_specialties for p in places], max_vocabulary
+        )
+        self.feature_vocabulary, self.features = self._vocabulary_matrix([p.features for p in places], max_vocabulary)
+
+        self.prices = np.array([np.nan if p.price_range is None else p.price_range for p in places], dtype=np.float64)
+        self.city_codes: Dict[str, int] = {}
+        self.cities = np.array([self.city_codes.setdefault(p.city.lower(), len(self.city_codes)) for p in places])
+
+        # Bayesian average, so a single 5-star review doesn't top the list
+        ratings = np.array([0.0 if p.rating is None else p.rating for p in places], dtype=np.float64)
+        review_counts = np.array([p.review_count for p in places], dtype=np.float64)
+        rated = review_counts > 0
+        prior = ratings[rated].mean() if rated.any() else 3.0
+        self.ratings = np.where(rated, ratings, np.nan)
+        self.quality = (ratings * review_counts + prior * rating_prior_weight) / (review_counts + rating_prior_weight) / 5.0
+
+    @staticmethod
+    def _vocabulary_matrix(values: List[List[str]], max_vocabulary: int) -> Tuple[Dict[str, int], np.ndarray]:
+        counts = Counter(value.lower() for row in values for value in set(row))
+        vocabulary = {value: i for i, (value, _) in enumerate(counts.most_common(max_vocabulary))}
+        matrix = np.zeros((len(values), len(vocabulary)), dtype=bool)
+        for row_index, row in enumerate(values):
+            for value in row:
+                column = vocabulary.get(value.lower())
+                if column is not None:
+                    matrix[row_index, column] = True
+        return vocabulary, matrix
+
+class PlaceRecommender:
+    """Ranks catalog places against user preferences with vectorized scoring.
+
+    Features and specialties become columns of a boolean matrix limited to
+    the ``max_vocabulary`` most common values; price, rating, review count
+    and coordinates are kept as arrays. Recognized preference keys:
+
+    - ``specialties`` / ``features``: lists of wanted values
+    - ``price_range``: preferred level 1-4; ``max_price`` excludes dearer places
+    - ``min_rating``: excludes lower rated places
+    - ``latitude``, ``longitude``: rank nearby places higher; ``max_distance_km`` excludes farther ones
+
+    The index is rebuilt when the catalog snapshot changes and swapped in
+    whole, so ``recommend`` can run in worker threads.
+    """
+
+    WEIGHTS = {"specialties": 0.35, "features": 0.2, "price": 0.15, "quality": 0.2, "distance": 0.1}
+
+    def __init__(self, max_vocabulary: int = 512, rating_prior_weight: float = 5.0, distance_scale_km: float = 2.0):
+        self.max_vocabulary = max_vocabulary
+        self.rating_prior_weight = rating_prior_weight
+        self.distance_scale_km = distance_scale_km
+        self._index: Optional[RecommenderIndex] = None
+
+    def index_for(self, snapshot: CatalogSnapshot) -> RecommenderIndex:
+        index = self._index
+        if index is None or index.snapshot.version != snapshot.version:
+            index = RecommenderIndex(snapshot, self.max_vocabulary, self.rating_prior_weight)
+            self._index = index
+            logger.info(
+                f"Built recommender for catalog version {snapshot.version}: {len(snapshot)} places, "
+                f"{len(index.specialty_vocabulary)} specialties, {len(index.feature_vocabulary)} features"
+            )
+        return index
+
+    def _match(self, matrix: np.ndarray, vocabulary: Dict[str, int], wanted: Iterable[str]) -> Optional[np.ndarray]:
+        """Share of wanted values each place has, or None when nothing was asked for"""
+        wanted = list(dict.fromkeys(wanted))
+        if not wanted:
+            return None
+        columns = [vocabulary[value] for value in wanted if value in vocabulary]
+        if not columns:
+            return np.zeros(matrix.shape[0])
+        return matrix[:, columns].sum(axis=1) / len(wanted)
+
+    def recommend(
+        self,
+        snapshot: CatalogSnapshot,
+        preferences: Dict[str, Any],
+        city: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Best ``limit`` places for the preferences, highest score first"""
+        index = self.index_for(snapshot)
+        if not len(snapshot):
+            return []
+
+        wanted_specialties = _as_list(preferences.get("specialties") or preferences.get("fika_specialties"))
+        wanted_features = _as_list(preferences.get("features"))
+        price = _as_float(preferences.get("price_range"))
+        max_price = _as_float(preferences.get("max_price"))
+        min_rating = _as_float(preferences.get("min_rating"))
+        latitude = _as_float(preferences.get("latitude"))
+        longitude = _as_float(preferences.get("longitude"))
+        max_distance_km = _as_float(preferences.get("max_distance_km"))
+
+        mask = np.ones(len(snapshot), dtype=bool)
+        if city:
+            mask &= index.cities == index.city_codes.get(city.lower(), -1)
+        if max_price is not None:
+            mask &= ~(index.prices > max_price)
+        if min_rating is not None:
+            mask &= index.ratings >= min_rating
+
+        components = {
+            "specialties": self._match(index.specialties, index.specialty_vocabulary, wanted_specialties),
+            "features": self._match(index.features, index.feature_vocabulary, wanted_features),
+            "quality": index.quality,
+            "price": None,
+            "distance": None,
+        }
+        if price is not None:
+            components["price"] = np.nan_to_num(1.0 - np.abs(index.prices - price) / 3.0, nan=0.5)
+
+        distances_km = None
+        if latitude is not None and longitude is not None:
+            distances_km = haversine_m(latitude, longitude, snapshot.latitudes, snapshot.longitudes) / 1000.0
+            components["distance"] = np.nan_to_num(np.exp(-distances_km / self.distance_scale_km), nan=0.0)
+            if max_distance_km is not None:
+                mask &= distances_km <= max_distance_km
+
+        # Weights of preferences that weren't given are left out
+        scores = np.zeros(len(snapshot))
+        total_weight = 0.0
+        for name, values in components.items():
+            if values is not None:
+                scores += self.WEIGHTS[name] * values
+                total_weight += self.WEIGHTS[name]
+        scores /= total_weight
+
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results = []
+        for position in candidates.tolist():
+            place = snapshot.places[position]
+            specialties = {value.lower() for value in place.fika_specialties}
+            features = {value.lower() for value in place.features}
+            results.append({
+                **place.summary(),
+                "price_range": place.price_range,
+                "rating": place.rating,
+                "review_count": place.review_count,
+                "score": round(float(scores[position]), 3),
+                "matched_specialties": [value for value in wanted_specialties if value in specialties],
+                "matched_features": [value for value in wanted_features if value in features],
+                "distance_km": round(float(distances_km[position]), 2)
+                if distances_km is not None and not np.isnan(distances_km[position]) else None,
+            })
+        return results
@@ -0,0 +1,334 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.place import Place
+from ..models.review import Review
+from .place_catalog import place_catalog
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month", "year")
+
+# Buckets per report, and buckets kept in memory, per granularity
+REPORT_BUCKETS = {"day": 30, "week": 12, "month": 12, "year": 5}
+RETAINED_BUCKETS = {"day": 400, "week": 160, "month": 60, "year": 20}
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+def previous_bucket(start: date, granularity: str) -> date:
+    if granularity == "day":
+        return start - timedelta(days=1)
+    if granularity == "week":
+        return start - timedelta(days=7)
+    if granularity == "month":
+        return (start - timedelta(days=1)).replace(day=1)
+    return start.replace(year=start.year - 1)
+
+@dataclass(frozen=True)
+class ReviewEvent:
+    """The fields of one review that rollups count"""
+    city: str
+    created: date
+    rating: int
+    fika_items: Tuple[str, ...]
+    language: Optional[str]
+    moderated: int
+    moderated_at: Optional[datetime]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_review(cls, review: Any, city: str) -> "ReviewEvent":
+        created_at = review.created_at or datetime.utcnow()
+        return cls(
+            city=city,
+            created=created_at.date(),
+            rating=review.rating,
+            fika_items=tuple(item.strip().lower() for item in review.fika_items or [] if item and item.strip()),
+            language=review.language,
+            moderated=review.moderated or 0,
+            moderated_at=review.moderated_at,
+            created_at=created_at,
+        )
+
+class _Bucket:
+    """Counts for one city in one time bucket"""
+
+    __slots__ = ("reviews", "approved", "rejected", "rating_sum", "rating_count", "moderation_seconds", "items", "languages")
+
+    def __init__(self):
+        self.reviews = 0
+        self.approved = 0
+        self.rejected = 0
+        self.rating_sum = 0
+        self.rating_count = 0
+        self.moderation_seconds = 0.0
+        self.items: Counter = Counter()
+        self.languages: Counter = Counter()
+
+class _Rollups:
+    """Buckets by granularity, bucket start and city"""
+
+    def __init__(self):
+        self.buckets: Dict[str, Dict[date, Dict[str, _Bucket]]] = {
+            granularity: defaultdict(lambda: defaultdict(_Bucket)) for granularity in GRANULARITIES
+        }
+
+    def _each(self, day: date):
+        for granularity in GRANULARITIES:
+            yield self.buckets[granularity][bucket_start(day, granularity)]
+
+    def apply(self, event: ReviewEvent, sign: int = 1):
+        """Add (or with ``sign`` -1, remove) a review's contribution"""
+        for cities in self._each(event.created):
+            bucket = cities[event.city]
+            bucket.reviews += sign
+            if event.language:
+                bucket.languages[event.language] += sign
+            # Ratings and items only count once a review is approved
+            if event.moderated == 1:
+                bucket.rating_sum += sign * event.rating
+                bucket.rating_count += sign
+                for item in event.fika_items:
+                    bucket.items[item] += sign
+
+        # Moderation throughput is bucketed by when the decision was made
+        if event.moderated != 0 and event.moderated_at is not None:
+            delay = None
+            if event.created_at is not None:
+                delay = (event.moderated_at.replace(tzinfo=None) - event.created_at.replace(tzinfo=None)).total_seconds()
+            for cities in self._each(event.moderated_at.date()):
+                bucket = cities[event.city]
+                if event.moderated == 1:
+                    bucket.approved += sign
+                else:
+                    bucket.rejected += sign
+                if delay is not None:
+                    bucket.moderation_seconds += sign * max(delay, 0.0)
+
+    def prune(self, today: date):
+        for granularity, keep in RETAINED_BUCKETS.items():
+            oldest = bucket_start(today, granularity)
+            for _ in range(keep - 1):
+                oldest = previous_bucket(oldest, granularity)
+            buckets = self.buckets[granularity]
+            for start in [start for start in buckets if start < oldest]:
+                del buckets[start]
+
+class ReviewAnalytics:
+    """Review statistics from rollups kept up to date as reviews arrive.
+
+    Every review counts towards one day, week, month and year bucket per
+    city, so a report reads at most a few dozen buckets whatever its
+    timeframe. Creates, moderation decisions and deletes in this worker
+    update the buckets immediately; the rollups are rebuilt from the
+    database every ``resync_interval`` seconds, which picks up other
+    workers' writes and edits that aren't tracked (e.g. rating changes).
+    """
+
+    def __init__(self, resync_interval: float = 600.0, top_n: int = 10):
+        self.resync_interval = resync_interval
+        self.top_n = top_n
+        self._rollups: Optional[_Rollups] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _build(self) -> _Rollups:
+        started = time.monotonic()
+        rollups = _Rollups()
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Place.city, Review.created_at, Review.rating, Review.fika_items, Review.language,
+                Review.moderated, Review.moderated_at
+            ).join(Place, Review.place_id == Place.id).yield_per(5000)
+
+            count = 0
+            for row in rows:
+                rollups.apply(ReviewEvent.from_review(row, row.city))
+                count += 1
+        finally:
+            db.close()
+
+        rollups.prune(datetime.utcnow().date())
+        logger.info(f"Built review analytics from {count} reviews in {time.monotonic() - started:.1f}s")
+        return rollups
+
+    async def load(self):
+        """Rebuild the rollups from the database"""
+        async with self._lock:
+            self._rollups = await asyncio.to_thread(self._build)
+            self._loaded_at = time.time()
+
+    async def _ready(self) -> _Rollups:
+        if self._rollups is None:
+            await self.load()
+        return self._rollups
+
+    async def event_for(self, review: Any) -> ReviewEvent:
+        """A review's current contribution, taken before it changes"""
+        place = (await place_catalog.get()).get(review.place_id)
+        return ReviewEvent.from_review(review, place.city if place else "unknown")
+
+    def record_created(self, event: ReviewEvent):
+        if self._rollups is not None:
+            self._rollups.apply(event)
+
+    def record_moderated(self, event: ReviewEvent, moderated: int, moderated_at: datetime):
+        """Move a review from the moderation state in ``event`` to ``moderated``"""
+        if self._rollups is not None and moderated != event.moderated:
+            self._rollups.apply(event, sign=-1)
+            self._rollups.apply(replace(event, moderated=moderated, moderated_at=moderated_at))
+
+    def record_deleted(self, event: ReviewEvent):
+        if self._rollups is not None:
+            self._rollups.apply(event, sign=-1)
+
+    async def report(self, timeframe: str, city: Optional[str] = None) -> Dict[str, Any]:
+        """Totals, per-bucket series and top lists for the last buckets of a granularity"""
+        rollups = await self._ready()
+        buckets = rollups.buckets[timeframe]
+
+        starts = [bucket_start(datetime.utcnow().date(), timeframe)]
+        for _ in range(REPORT_BUCKETS[timeframe] - 1):
+            starts.append(previous_bucket(starts[-1], timeframe))
+        starts.reverse()
+
+        series = []
+        city_totals: Dict[str, Counter] = defaultdict(Counter)
+        items: Counter = Counter()
+        languages: Counter = Counter()
+        totals: Counter = Counter()
+        for start in starts:
+            point: Counter = Counter()
+            for city_name, bucket in buckets.get(start, {}).items():
+                if city is not None and city_name.lower() != city.lower():
+                    continue
+                point.update({
+                    "reviews": bucket.reviews,
+                    "approved": bucket.approved,
+                    "rejected": bucket.rejected,
+                    "rating_sum": bucket.rating_sum,
+                    "rating_count": bucket.rating_count,
+                    "moderation_seconds": bucket.moderation_seconds,
+                })
+                city_totals[city_name].update({
+                    "reviews": bucket.reviews,
+                    "rating_sum": bucket.rating_sum,
+                    "rating_count": bucket.rating_count,
+                })
+                items.update(bucket.items)
+                languages.update(bucket.languages)
+            totals.update(point)
+            series.append({
+                "start": start.isoformat(),
+                "reviews": point["reviews"],
+                "approved": point["approved"],
+                "rejected": point["rejected"],
+                "average_rating": _average(point["rating_sum"], point["rating_count"]),
+            })
+
+        moderated = totals["approved"] + totals["rejected"]
+        top_cities = sorted(city_totals.items(), key=lambda entry: entry[1]["reviews"], reverse=True)[:self.top_n]
+        report = {
+            "timeframe": timeframe,
+            "city": city,
+            "from": starts[0].isoformat(),
+            "reviews": totals["reviews"],
+            "average_rating": _average(totals["rating_sum"], totals["rating_count"]),
+            "series": series,
+            "cities": [
+                {
+                    "city": city_name,
+                    "reviews": counts["reviews"],
+                    "average_rating": _average(counts["rating_sum"], counts["rating_count"]),
+                }
+                for city_name, counts in top_cities if counts["reviews"] > 0
+            ],
+            "top_specialties": [
+                {"item": item, "mentions": count} for item, count in items.most_common(self.top_n) if count > 0
+            ],
+            "languages": {language: count for language, count in languages.most_common() if count > 0},
+            "moderation": {
+                "approved": totals["approved"],
+                "rejected": totals["rejected"],
+                "rejection_rate": round(totals["rejected"] / moderated, 3) if moderated else None,
+                "average_hours_to_decision": round(totals["moderation_seconds"] / moderated / 3600, 1) if moderated else None,
+            },
+            "updated_from_database_at": datetime.utcfromtimestamp(self._loaded_at).isoformat() if self._loaded_at else None,
+            "generated_at": datetime.now().isoformat(),
+        }
+        report["insights"] = _insights(report)
+        return report
+
+    def start(self):
+        """Load the rollups now and rebuild them periodically in the background"""
+        async def resync():
+            while True:
+                try:
+                    await self.load()
+                except Exception as e:
+                    logger.warning(f"Review analytics rebuild failed: {e}")
+                await asyncio.sleep(self.resync_interval)
+
+        self._task = asyncio.create_task(resync())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        rollups = self._rollups
+        return {
+            "loaded": rollups is not None,
+            "buckets": {granularity: len(rollups.buckets[granularity]) for granularity in GRANULARITIES} if rollups else None,
+            "updated_from_database_at": datetime.utcfromtimestamp(self._loaded_at).isoformat() if self._loaded_at else None,
+        }
+
+def _average(total: float, count: int) -> Optional[float]:
+    return round(total / count, 2) if count else None
+
+def _insights(report: Dict[str, Any]) -> List[str]:
+    """Plain-language notes on a report's numbers"""
+    insights = []
+    series = report["series"]
+    if report["cities"]:
+        leader = report["cities"][0]
+        insights.append(f"{leader['city']} had the most reviews ({leader['reviews']}) in this period")
+    if report["top_specialties"]:
+        top = report["top_specialties"][0]
+        insights.append(f"{top['item'].capitalize()} was the most mentioned fika item ({top['mentions']} reviews)")
+
+    rated = [point["average_rating"] for point in series if point["average_rating"] is not None]
+    if len(rated) >= 2:
+        change = rated[-1] - rated[0]
+        if abs(change) >= 0.1:
+            direction = "up" if change > 0 else "down"
+            insights.append(f"Average rating is {direction} {abs(change):.2f} stars since the start of the period")
+
+    if len(series) >= 2 and series[-2]["reviews"]:
+        growth = (series[-1]["reviews"] - series[-2]["reviews"]) / series[-2]["reviews"]
+        insights.append(f"Reviews this {report['timeframe']} so far: {series[-1]['reviews']} ({growth:+.0%} on the previous one)")
+
+    rejection_rate = report["moderation"]["rejection_rate"]
+    if rejection_rate is not None:
+        insights.append(f"{rejection_rate:.0%} of moderated reviews were rejected")
+    return insights
+
+review_analytics = ReviewAnalytics(resync_interval=settings.analytics_resync_seconds)
@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from ..config import settings
+from .ai_service import AIService
+from .moderation_prefilter import moderation_prefilter
+from .review_analytics import review_analytics
+from .review_service import ReviewService
+
+logger = logging.getLogger(__name__)
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+class ReviewModerationPipeline:
+    """Moderates the pending review queue with batched LLM calls.
+
+    The local prefilter decides clear cases first; the remaining pending
+    reviews are packed ``batch_size`` to a prompt, with at most
+    ``concurrency`` prompts in flight. Reviews the model flags as
+    inappropriate, spam or too toxic are rejected, the rest approved, and
+    both sets are applied with bulk updates that record whether the
+    prefilter or the LLM decided. Reviews without a usable answer stay
+    pending for the next run.
+    """
+
+    def __init__(
+        self,
+        review_service: ReviewService,
+        ai_service: AIService,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        toxicity_threshold: Optional[float] = None,
+    ):
+        self.review_service = review_service
+        self.ai_service = ai_service
+        self.batch_size = batch_size or settings.ai_moderation_batch_size
+        self.concurrency = concurrency or settings.ai_moderation_concurrency
+        self.toxicity_threshold = (
+            settings.ai_moderation_toxicity_threshold if toxicity_threshold is None else toxicity_threshold
+        )
+
+    def decide(self, result: Optional[Dict[str, Any]]) -> Optional[str]:
+        """'approve', 'reject', or None to leave the review pending"""
+        if result is None:
+            return None
+        try:
+            appropriate = _as_bool(result["is_appropriate"])
+            spam = _as_bool(result.get("contains_spam", False))
+            toxicity = float(result.get("toxicity_score", 0.0))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        if not appropriate or spam or toxicity >= self.toxicity_threshold:
+            return "reject"
+        return "approve"
+
+    async def run(self, limit: int = 200, dry_run: bool = False) -> Dict[str, Any]:
+        """Moderate up to ``limit`` of the oldest pending reviews"""
+        started = time.monotonic()
+        if self.ai_service.llm is None and not moderation_prefilter.enabled:
+            # Keyword mock results are not good enough to act on automatically
+            return {"status": "unavailable", "reviewed": 0, "approved": [], "rejected": [], "undecided": []}
+
+        pending = (await self.review_service.get_pending_reviews(1, limit)).reviews
+
+        # Rating-only reviews have no text to moderate
+        decisions: Dict[Any, Optional[str]] = {review.id: "approve" for review in pending if not review.comment}
+        escalated = []
+        for review in pending:
+            if review.comment:
+                decisions[review.id] = moderation_prefilter.assess(review.comment).decision
+                if decisions[review.id] is None:
+                    escalated.append(review)
+        decided_locally = len(pending) - len(escalated) - sum(1 for review in pending if not review.comment)
+
+        # Without an LLM the undecided rest stays pending
+        if self.ai_service.llm is None:
+            escalated = []
+        batches = [escalated[i:i + self.batch_size] for i in range(0, len(escalated), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def moderate(batch: List[Any]):
+            async with semaphore:
+                results = await self.ai_service.moderate_batch(
+                    [review.comment for review in batch],
+                    languages=[review.language for review in batch]
+                )
+            for review, result in zip(batch, results):
+                decisions[review.id] = self.decide(result)
+
+        await asyncio.gather(*(moderate(batch) for batch in batches))
+
+        approved = [review_id for review_id, decision in decisions.items() if decision == "approve"]
+        rejected = [review_id for review_id, decision in decisions.items() if decision == "reject"]
+        undecided = [review_id for review_id, decision in decisions.items() if decision is None]
+        affected_places = {review.place_id for review in pending if decisions.get(review.id)}
+
+        if not dry_run:
+            # Taken before the bulk updates expire the loaded reviews
+            events = [
+                (await review_analytics.event_for(review), 1 if decisions[review.id] == "approve" else -1)
+                for review in pending if decisions.get(review.id)
+            ]
+            # The prefilter trains on the LLM's decisions, never on its own
+            by_llm = {review.id for review in escalated}
+            for action, review_ids in (("approve", approved), ("reject", rejected)):
+                for moderated_by, decided in (
+                    ("prefilter", [review_id for review_id in review_ids if review_id not in by_llm]),
+                    ("llm", [review_id for review_id in review_ids if review_id in by_llm]),
+                ):
+                    if decided:
+                        await self.review_service.bulk_moderate_reviews(decided, action, moderated_by)
+            moderated_at = datetime.utcnow()
+            for event, moderated in events:
+                review_analytics.record_moderated(event, moderated, moderated_at)
+
+        summary = {
+            "status": "dry_run" if dry_run else "applied",
+            "reviewed": len(pending),
+            "decided_locally": decided_locally,
+            "batches": len(batches),
+            "approved": approved,
+            "rejected": rejected,
+            "undecided": undecided,
+            "affected_place_ids": sorted(affected_places, key=str),
+            "duration_seconds": round(time.monotonic() - started, 3),
+        }
+        logger.info(
+            f"Batch moderation {summary['status']}: {len(approved)} approved, "
+            f"{len(rejected)} rejected, {len(undecided)} undecided; {decided_locally} decided locally, "
+            f"{len(batches)} LLM batches"
+        )
+        return summary
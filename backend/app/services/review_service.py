@@ -8,6 +8,7 @@ from datetime import datetime
 from ..models.review import Review
 from ..models.place import Place
 from ..schemas.review import ReviewCreate, ReviewUpdate, ReviewList
+from .language_detector import language_detector
 
 class ReviewService:
     def __init__(self, db: Session):
@@ -20,7 +21,7 @@ class ReviewService:
         if not place:
             raise ValueError("Place not found")
         
-        db_review = Review(**review_data.dict())
+        db_review = Review(**review_data.dict(), language=language_detector.detect(review_data.comment))
         self.db.add(db_review)
         self.db.commit()
         self.db.refresh(db_review)
@@ -48,6 +49,8 @@ class ReviewService:
         update_data = review_data.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_review, field, value)
+        if 'comment' in update_data:
+            db_review.language = language_detector.detect(db_review.comment)
         
         self.db.commit()
         self.db.refresh(db_review)
@@ -115,7 +118,13 @@ class ReviewService:
             pages=total_pages
         )
 
-    async def moderate_review(self, review_id: uuid.UUID, action: str, reason: Optional[str] = None) -> bool:
+    async def moderate_review(
+        self,
+        review_id: uuid.UUID,
+        action: str,
+        reason: Optional[str] = None,
+        moderated_by: str = "admin"
+    ) -> bool:
         """Moderate a review (approve or reject)"""
         db_review = self.db.query(Review).filter(Review.id == review_id).first()
         if not db_review:
@@ -129,6 +138,7 @@ class ReviewService:
             raise ValueError("Action must be 'approve' or 'reject'")
         
         db_review.moderated_at = datetime.utcnow()
+        db_review.moderated_by = moderated_by
         
         self.db.commit()
         
@@ -235,8 +245,8 @@ class ReviewService:
         
         self.db.commit()
 
-    async def bulk_moderate_reviews(self, review_ids: List[uuid.UUID], action: str) -> int:
-        """Bulk moderate multiple reviews"""
+    async def bulk_moderate_reviews(self, review_ids: List[uuid.UUID], action: str, moderated_by: str = "admin") -> int:
+        """Bulk moderate multiple reviews; ``moderated_by`` records who decided: prefilter, llm or admin"""
         if action not in ["approve", "reject"]:
             raise ValueError("Action must be 'approve' or 'reject'")
         
@@ -249,7 +259,8 @@ class ReviewService:
         ).update(
             {
                 Review.moderated: moderated_value,
-                Review.moderated_at: moderated_at
+                Review.moderated_at: moderated_at,
+                Review.moderated_by: moderated_by
             },
             synchronize_session=False
         )
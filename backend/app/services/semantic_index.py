@@ -0,0 +1,387 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import asyncio
+import logging
+import re
+import unicodedata
+import uuid
+
+import numpy as np
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.review import Review
+from .place_catalog import CatalogPlace, CatalogSnapshot, place_catalog
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_TERM_MASK = (1 << 20) - 1
+
+# English fika vocabulary mapped to the Swedish words places use, so that
+# "cardamom buns" finds "kardemummabullar" through shared character n-grams
+SYNONYMS = {
+    "cardamom": "kardemumma",
+    "cinnamon": "kanel",
+    "bun": "bulle",
+    "buns": "bullar",
+    "roll": "bulle",
+    "rolls": "bullar",
+    "cozy": "mysig",
+    "cosy": "mysig",
+    "coffee": "kaffe",
+    "cake": "kaka",
+    "cakes": "kakor",
+    "cookie": "kaka",
+    "cookies": "kakor",
+    "pastry": "bakelse",
+    "pastries": "bakelser",
+    "bakery": "bageri",
+    "chocolate": "choklad",
+    "almond": "mandel",
+    "saffron": "saffran",
+    "vanilla": "vanilj",
+    "sandwich": "smorgas",
+    "sandwiches": "smorgasar",
+    "tea": "te",
+    "vegan": "vegansk",
+    "garden": "tradgard",
+    "view": "utsikt",
+}
+
+STOPWORDS = frozenset(
+    "a an and are at for from good great has have in is it of on or place places that the this to very was with "
+    "att av bra den det en ett for har i med och om pa som var".split()
+)
+
+# Relative weight of each field's terms in a place's document
+FIELD_WEIGHTS = {"name": 2.0, "specialties": 2.0, "features": 1.0, "city": 1.0, "description": 1.0, "reviews": 0.5}
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Accent-free lower-case words without stopwords, English fika terms in Swedish"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    return [SYNONYMS.get(word, word) for word in _WORD.findall(text) if word not in STOPWORDS]
+
+def term_counts(fields: Iterable[Tuple[str, float]], gram_size: int = 4) -> Dict[int, float]:
+    """Weighted counts of hashed word and character n-gram terms.
+
+    N-grams of longer words match Swedish compounds: "kanelbullar" shares
+    "kane", "anel" and "bull" with "kanel bulle".
+    """
+    counts: Dict[int, float] = defaultdict(float)
+    for text, weight in fields:
+        for word in tokenize(text):
+            counts[hash(f"w:{word}") & _TERM_MASK] += weight
+            if len(word) > gram_size:
+                for i in range(len(word) - gram_size + 1):
+                    counts[hash(f"g:{word[i:i + gram_size]}") & _TERM_MASK] += weight * 0.5
+    return counts
+
+def place_fields(place: CatalogPlace, reviews: Sequence[str]) -> List[Tuple[str, float]]:
+    fields = [
+        (place.name, FIELD_WEIGHTS["name"]),
+        (" ".join(place.fika_specialties), FIELD_WEIGHTS["specialties"]),
+        (" ".join(feature.replace("_", " ") for feature in place.features), FIELD_WEIGHTS["features"]),
+        (place.city, FIELD_WEIGHTS["city"]),
+        (place.description, FIELD_WEIGHTS["description"]),
+    ]
+    fields.extend((review, FIELD_WEIGHTS["reviews"]) for review in reviews)
+    return fields
+
+class _IndexState:
+    """Document vectors and posting lists; once published, mutated only from the event loop"""
+
+    def __init__(self, max_terms: int, max_postings: int):
+        self.max_terms = max_terms
+        self.max_postings = max_postings
+
+        self.df: Counter = Counter()
+        self.documents = 0  # Counted into df; only grows until the next full rebuild
+        self.updates = 0
+
+        self.slots: Dict[uuid.UUID, int] = {}
+        self.ids: List[Optional[uuid.UUID]] = []
+        self.terms: List[np.ndarray] = []
+        self.weights: List[np.ndarray] = []
+        self.cities: List[str] = []
+        self.versions: Dict[uuid.UUID, object] = {}
+        self.by_city: Dict[str, Set[int]] = defaultdict(set)
+        self.postings: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self._champions: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _idf(self, terms: np.ndarray, pending_df: Optional[Counter] = None, pending_documents: int = 0) -> np.ndarray:
+        df = self.df
+        if pending_df:
+            counts = (df.get(term, 0) + pending_df.get(term, 0) for term in terms.tolist())
+        else:
+            counts = (df.get(term, 0) for term in terms.tolist())
+        df = np.fromiter(counts, dtype=np.float64, count=len(terms))
+        return np.log((1 + self.documents + pending_documents) / (1 + df)) + 1.0
+
+    def vectorize(
+        self,
+        counts: Dict[int, float],
+        limit: Optional[int] = None,
+        pending_df: Optional[Counter] = None,
+        pending_documents: int = 0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """L2-normalized TF-IDF vector as term IDs and weights, keeping the ``limit`` heaviest terms.
+
+        ``pending_df`` and ``pending_documents`` are counts of documents not
+        yet added to the state, as if they had been.
+        """
+        if not counts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        idf = self._idf(terms, pending_df, pending_documents)
+        weights = np.log1p(np.fromiter(counts.values(), dtype=np.float64, count=len(counts))) * idf
+        if limit and len(terms) > limit:
+            keep = np.argpartition(-weights, limit - 1)[:limit]
+            terms, weights = terms[keep], weights[keep]
+
+        weights = weights / np.linalg.norm(weights)
+        return terms.astype(np.int32), weights.astype(np.float32)
+
+    def _champion_list(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``max_postings`` highest-weighted documents for a term, cached until the term's postings change"""
+        champions = self._champions.get(term)
+        if champions is None:
+            posting = self.postings.get(term, {})
+            slots = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            weights = np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            if len(slots) > self.max_postings:
+                keep = np.argpartition(-weights, self.max_postings - 1)[:self.max_postings]
+                slots, weights = slots[keep], weights[keep]
+            champions = self._champions[term] = (slots, weights)
+        return champions
+
+    def prepare_upserts(
+        self, places: Sequence[CatalogPlace], reviews: Dict[uuid.UUID, List[str]]
+    ) -> Tuple[Counter, List[Tuple[np.ndarray, np.ndarray]]]:
+        """Document frequencies and vectors for places about to be upserted, without changing the state.
+
+        Runs in a worker thread; it only reads ``df``, which the event loop
+        doesn't change while ``SemanticIndex`` holds its lock.
+        """
+        all_counts = [term_counts(place_fields(place, reviews.get(place.id, []))) for place in places]
+        df = Counter()
+        for counts in all_counts:
+            df.update(counts.keys())
+        vectors = [self.vectorize(counts, self.max_terms, df, len(all_counts)) for counts in all_counts]
+        return df, vectors
+
+    def apply_upserts(
+        self, places: Sequence[CatalogPlace], df: Counter, vectors: List[Tuple[np.ndarray, np.ndarray]]
+    ):
+        """Publish the result of ``prepare_upserts``"""
+        self.df.update(df)
+        self.documents += len(places)
+        self.updates += len(places)
+        for place, (terms, weights) in zip(places, vectors):
+            self.remove(place.id)
+            self.add(place, terms, weights)
+
+    def add(self, place: CatalogPlace, terms: np.ndarray, weights: np.ndarray):
+        city = place.city.lower()
+        if self._free:
+            slot = self._free.pop()
+            self.ids[slot], self.terms[slot], self.weights[slot], self.cities[slot] = place.id, terms, weights, city
+        else:
+            slot = len(self.ids)
+            self.ids.append(place.id)
+            self.terms.append(terms)
+            self.weights.append(weights)
+            self.cities.append(city)
+
+        self.slots[place.id] = slot
+        self.versions[place.id] = place.updated_at
+        self.by_city[city].add(slot)
+        for term, weight in zip(terms.tolist(), weights.tolist()):
+            self.postings[term][slot] = weight
+            self._champions.pop(term, None)
+
+    def remove(self, place_id: uuid.UUID):
+        slot = self.slots.pop(place_id, None)
+        if slot is None:
+            return
+        self.versions.pop(place_id, None)
+        self.by_city[self.cities[slot]].discard(slot)
+        for term in self.terms[slot].tolist():
+            self.postings[term].pop(slot, None)
+            self._champions.pop(term, None)
+        self.ids[slot] = None
+        self.terms[slot] = np.empty(0, dtype=np.int32)
+        self.weights[slot] = np.empty(0, dtype=np.float32)
+        self._free.append(slot)
+
+    def search(self, query: str, city: Optional[str], limit: int, min_score: float) -> List[Tuple[uuid.UUID, float]]:
+        query_terms, query_weights = self.vectorize(term_counts([(query, 1.0)]))
+        if not len(query_terms) or not self.ids:
+            return []
+
+        # Term-at-a-time accumulation over each term's champion list
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term, query_weight in zip(query_terms.tolist(), query_weights.tolist()):
+            slots, weights = self._champion_list(term)
+            scores[slots] += query_weight * weights
+
+        if city:
+            pool = np.fromiter(self.by_city.get(city.lower(), ()), dtype=np.int64)
+        else:
+            pool = np.flatnonzero(scores)
+        pool = pool[scores[pool] >= min_score]
+
+        if len(pool) > limit:
+            pool = pool[np.argpartition(-scores[pool], limit - 1)[:limit]]
+        pool = pool[np.argsort(-scores[pool], kind="stable")]
+        return [(self.ids[slot], round(float(scores[slot]), 4)) for slot in pool.tolist()]
+
+class SemanticIndex:
+    """Local vector index for free-text place search.
+
+    Each place is a hashed TF-IDF vector over its name, specialties,
+    features, description and most recent approved reviews, with English
+    fika terms mapped to Swedish. Queries are scored through an inverted
+    index; for terms found in more than ``max_postings`` places only the
+    places where the term weighs most are scored, which keeps queries fast
+    at the cost of exactness for very common terms.
+
+    The index follows the place catalog: places whose ``updated_at`` changed
+    (which approving a review does through the rating) are re-indexed, and
+    removed places dropped. Document frequencies only grow between full
+    rebuilds, which happen once updates exceed ``rebuild_ratio`` of the index.
+    """
+
+    def __init__(
+        self,
+        max_terms: int = 64,
+        max_postings: int = 2000,
+        max_reviews: int = 20,
+        rebuild_ratio: float = 0.2,
+    ):
+        self.max_terms = max_terms
+        self.max_postings = max_postings
+        self.max_reviews = max_reviews
+        self.rebuild_ratio = rebuild_ratio
+        self._state: Optional[_IndexState] = None
+        self._synced_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _load_reviews(self, place_ids: Optional[List[uuid.UUID]] = None) -> Dict[uuid.UUID, List[str]]:
+        """Most recent approved review texts per place, for all places or the given ones"""
+        db = SessionLocal()
+        try:
+            query = db.query(Review.place_id, Review.comment).filter(
+                Review.moderated == 1,
+                Review.comment.isnot(None)
+            )
+            if place_ids is not None:
+                query = query.filter(Review.place_id.in_(place_ids))
+
+            reviews: Dict[uuid.UUID, List[str]] = defaultdict(list)
+            for place_id, comment in query.order_by(Review.created_at.desc()).yield_per(5000):
+                if len(reviews[place_id]) < self.max_reviews:
+                    reviews[place_id].append(comment)
+            return reviews
+        finally:
+            db.close()
+
+    def _build(self, snapshot: CatalogSnapshot) -> _IndexState:
+        reviews = self._load_reviews()
+        state = _IndexState(self.max_terms, self.max_postings)
+
+        # Document frequencies first, so every vector is weighted alike
+        all_counts = [term_counts(place_fields(place, reviews.get(place.id, []))) for place in snapshot.places]
+        for counts in all_counts:
+            state.df.update(counts.keys())
+        state.documents = len(all_counts)
+
+        for place, counts in zip(snapshot.places, all_counts):
+            state.add(place, *state.vectorize(counts, self.max_terms))
+
+        logger.info(f"Built semantic index for catalog version {snapshot.version}: {len(state)} places")
+        return state
+
+    def _prepare_upserts(
+        self, state: _IndexState, places: List[CatalogPlace]
+    ) -> Tuple[Counter, List[Tuple[np.ndarray, np.ndarray]]]:
+        return state.prepare_upserts(places, self._load_reviews([place.id for place in places]))
+
+    async def sync(self):
+        """Bring the index up to date with the place catalog"""
+        snapshot = await place_catalog.get()
+        if self._state is not None and self._synced_version == snapshot.version:
+            return
+
+        async with self._lock:
+            snapshot = await place_catalog.get()
+            if self._state is not None and self._synced_version == snapshot.version:
+                return
+
+            state = self._state
+            changed, removed = [], []
+            if state is not None:
+                changed = [place for place in snapshot.places if state.versions.get(place.id, ()) != place.updated_at]
+                removed = [place_id for place_id in state.slots if snapshot.get(place_id) is None]
+
+            threshold = self.rebuild_ratio * max(len(snapshot), 1)
+            if state is None or state.updates + len(changed) + len(removed) > threshold:
+                self._state = await asyncio.to_thread(self._build, snapshot)
+            elif changed or removed:
+                # Tokenizing and vectorizing run off the loop; only publishing the results runs on it
+                if changed:
+                    df, vectors = await asyncio.to_thread(self._prepare_upserts, state, changed)
+                for place_id in removed:
+                    state.remove(place_id)
+                if changed:
+                    state.apply_upserts(changed, df, vectors)
+                logger.info(f"Semantic index updated {len(changed)} and removed {len(removed)} places")
+
+            self._synced_version = snapshot.version
+
+    async def search(
+        self,
+        query: str,
+        city: Optional[str] = None,
+        limit: int = 100,
+        min_score: float = 0.05,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """IDs and cosine scores of the places best matching the query"""
+        await self.sync()
+        return self._state.search(query, city, limit, min_score)
+
+    def start(self):
+        """Build the index in the background so the first search doesn't wait"""
+        async def build():
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Semantic index build failed, retrying on first search: {e}")
+
+        self._task = asyncio.create_task(build())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "places": len(self._state) if self._state else 0,
+            "catalog_version": self._synced_version,
+            "updates_since_build": self._state.updates if self._state else 0,
+        }
+
+semantic_index = SemanticIndex(
+    max_terms=settings.semantic_search_max_terms,
+    max_postings=settings.semantic_search_max_postings,
+)
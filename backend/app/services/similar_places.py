@@ -0,0 +1,291 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import asyncio
+import logging
+import uuid
+
+import numpy as np
+
+from sqlalchemy import func
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.review import Review
+from .cache_service import cache_service
+from .place_catalog import CatalogPlace, CatalogSnapshot, place_catalog
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.32
+
+# Each neighbour is packed as its 16-byte UUID; the float16 scores follow
+_ID_BYTES = 16
+_SCORE_DTYPE = np.dtype("<f2")
+
+def pack_neighbours(neighbours: Sequence[Tuple[uuid.UUID, float]]) -> bytes:
+    ids = b"".join(place_id.bytes for place_id, _ in neighbours)
+    return ids + np.array([score for _, score in neighbours], dtype=_SCORE_DTYPE).tobytes()
+
+def unpack_neighbours(data: bytes) -> List[Tuple[uuid.UUID, float]]:
+    count = len(data) // (_ID_BYTES + _SCORE_DTYPE.itemsize)
+    scores = np.frombuffer(data, dtype=_SCORE_DTYPE, count=count, offset=count * _ID_BYTES)
+    return [
+        (uuid.UUID(bytes=data[i * _ID_BYTES:(i + 1) * _ID_BYTES]), round(float(score), 3))
+        for i, score in enumerate(scores)
+    ]
+
+class _CoReviews:
+    """Places sharing reviewers, from approved reviews by named users"""
+
+    def __init__(
+        self,
+        place_users: Dict[uuid.UUID, Set[str]],
+        user_places: Dict[str, Set[uuid.UUID]],
+        reviewer_counts: Optional[Dict[uuid.UUID, int]] = None,
+    ):
+        self.place_users = place_users
+        self.user_places = user_places
+        self.reviewer_counts = reviewer_counts or {place_id: len(users) for place_id, users in place_users.items()}
+
+    def row(self, place_id: uuid.UUID) -> Dict[uuid.UUID, float]:
+        """Cosine similarity of reviewer sets with every co-reviewed place"""
+        users = self.place_users.get(place_id, set())
+        shared: Counter = Counter()
+        for user in users:
+            shared.update(self.user_places[user])
+        shared.pop(place_id, None)
+        return {
+            other: count / np.sqrt(len(users) * max(self.reviewer_counts.get(other, 0), count))
+            for other, count in shared.items()
+        }
+
+class SimilarPlaces:
+    """Precomputed "you might also like" lists, one per place.
+
+    Similarity between two places in the same city mixes content (cosine
+    over specialties, features and price level), distance and co-reviews
+    (cosine over the sets of named reviewers). ``rebuild`` computes the
+    ``top_k`` neighbours of every place, a city at a time in chunked matrix
+    products; ``refresh`` recomputes one place's list and inserts the place
+    into the lists of the neighbours it now outranks. Lists are stored in
+    the cache as packed UUIDs and float16 scores, so serving one is a
+    single key lookup. Deleted neighbours are filtered out when served.
+    """
+
+    WEIGHTS = {"content": 0.5, "distance": 0.3, "co_reviews": 0.2}
+
+    def __init__(
+        self,
+        top_k: int = 10,
+        ttl: int = 7 * 24 * 3600,
+        distance_scale_km: float = 2.0,
+        max_user_places: int = 50,
+        max_vocabulary: int = 512,
+        chunk_size: int = 1024,
+    ):
+        self.top_k = top_k
+        self.ttl = ttl
+        self.distance_scale_km = distance_scale_km
+        self.max_user_places = max_user_places  # Prolific reviewers say little about similarity
+        self.max_vocabulary = max_vocabulary
+        self.chunk_size = chunk_size
+
+    def _key(self, place_id: uuid.UUID) -> str:
+        return f"similar:{place_id}"
+
+    def _load_co_reviews(self, place_id: Optional[uuid.UUID] = None) -> _CoReviews:
+        """Reviewer sets for all places, or only for places sharing a reviewer with ``place_id``"""
+        db = SessionLocal()
+        try:
+            approved_named = (Review.moderated == 1, Review.user_name.isnot(None))
+            query = db.query(Review.place_id, func.lower(Review.user_name)).filter(*approved_named)
+            if place_id is not None:
+                reviewers = db.query(func.lower(Review.user_name)).filter(
+                    Review.place_id == place_id, *approved_named
+                ).distinct().all()
+                if not reviewers:
+                    return _CoReviews({}, {})
+                query = query.filter(func.lower(Review.user_name).in_([row[0] for row in reviewers]))
+            rows = query.distinct().all()
+
+            user_places: Dict[str, Set[uuid.UUID]] = defaultdict(set)
+            for review_place_id, user_name in rows:
+                user_places[user_name].add(review_place_id)
+            user_places = {user: places for user, places in user_places.items() if len(places) <= self.max_user_places}
+
+            place_users: Dict[uuid.UUID, Set[str]] = defaultdict(set)
+            for user, places in user_places.items():
+                for review_place_id in places:
+                    place_users[review_place_id].add(user)
+
+            reviewer_counts = None
+            if place_id is not None and place_users:
+                # Only reviewers shared with place_id were loaded; count the others' reviewers too,
+                # leaving out prolific ones as above so scores match a full rebuild
+                prolific = (
+                    db.query(func.lower(Review.user_name))
+                    .filter(*approved_named)
+                    .group_by(func.lower(Review.user_name))
+                    .having(func.count(func.distinct(Review.place_id)) > self.max_user_places)
+                )
+                reviewer_counts = dict(
+                    db.query(Review.place_id, func.count(func.distinct(func.lower(Review.user_name))))
+                    .filter(
+                        Review.place_id.in_(list(place_users)),
+                        func.lower(Review.user_name).notin_(prolific.scalar_subquery()),
+                        *approved_named,
+                    )
+                    .group_by(Review.place_id)
+                    .all()
+                )
+        finally:
+            db.close()
+
+        return _CoReviews(place_users, user_places, reviewer_counts)
+
+    def _content_matrix(self, places: Sequence[CatalogPlace]) -> np.ndarray:
+        """Row-normalized one-hot specialties, features and price level"""
+        counts = Counter(value.lower() for place in places for value in {*place.fika_specialties, *place.features})
+        vocabulary = {value: i for i, (value, _) in enumerate(counts.most_common(self.max_vocabulary))}
+
+        matrix = np.zeros((len(places), len(vocabulary) + 4), dtype=np.float32)
+        for row, place in enumerate(places):
+            for value in {*place.fika_specialties, *place.features}:
+                column = vocabulary.get(value.lower())
+                if column is not None:
+                    matrix[row, column] = 1.0
+            if place.price_range:
+                matrix[row, len(vocabulary) + min(max(place.price_range, 1), 4) - 1] = 1.0
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+    def _coordinates(self, places: Sequence[CatalogPlace]) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions in km on a plane centred on the block, fine within one city, and which places have one"""
+        located = np.array([p.latitude is not None and p.longitude is not None for p in places])
+        coordinates = np.zeros((len(places), 2))
+        if located.any():
+            coordinates[located] = [(p.latitude, p.longitude) for p, has in zip(places, located) if has]
+            centre = coordinates[located].mean(axis=0)
+            coordinates[located] = (coordinates[located] - centre) * KM_PER_DEGREE
+            coordinates[:, 1] *= np.cos(np.radians(centre[0]))
+        return coordinates.astype(np.float32), located
+
+    def _scores(
+        self,
+        rows: Sequence[int],
+        places: Sequence[CatalogPlace],
+        content: np.ndarray,
+        coordinates: Tuple[np.ndarray, np.ndarray],
+        co_reviews: _CoReviews,
+        columns: Dict[uuid.UUID, int],
+    ) -> np.ndarray:
+        """Similarity of the given rows' places with every place in the block"""
+        rows = np.asarray(rows)
+        scores = self.WEIGHTS["content"] * (content[rows] @ content.T)
+
+        positions, located = coordinates
+        squares = (positions ** 2).sum(axis=1)
+        distances_km = np.sqrt(np.maximum(squares[rows, None] + squares[None, :] - 2 * positions[rows] @ positions.T, 0))
+        closeness = np.exp(-distances_km / self.distance_scale_km)
+        closeness[:, ~located] = 0
+        closeness[~located[rows]] = 0
+        scores += self.WEIGHTS["distance"] * closeness
+
+        for i, row in enumerate(rows.tolist()):
+            for other, similarity in co_reviews.row(places[row].id).items():
+                column = columns.get(other)
+                if column is not None:
+                    scores[i, column] += self.WEIGHTS["co_reviews"] * similarity
+            scores[i, row] = -np.inf
+        return scores
+
+    def _top(self, scores: np.ndarray, places: Sequence[CatalogPlace]) -> List[Tuple[uuid.UUID, float]]:
+        k = min(self.top_k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(places[column].id, float(scores[column])) for column in top.tolist()]
+
+    def _compute_all(self, snapshot: CatalogSnapshot) -> Dict[str, bytes]:
+        co_reviews = self._load_co_reviews()
+        blocks: Dict[str, List[CatalogPlace]] = defaultdict(list)
+        for place in snapshot.places:
+            blocks[place.city.lower()].append(place)
+
+        lists: Dict[str, bytes] = {}
+        for places in blocks.values():
+            content = self._content_matrix(places)
+            coordinates = self._coordinates(places)
+            columns = {place.id: column for column, place in enumerate(places)}
+
+            for start in range(0, len(places), self.chunk_size):
+                rows = range(start, min(start + self.chunk_size, len(places)))
+                scores = self._scores(rows, places, content, coordinates, co_reviews, columns)
+                for i, row in enumerate(rows):
+                    lists[self._key(places[row].id)] = pack_neighbours(self._top(scores[i], places))
+        return lists
+
+    async def rebuild(self) -> Dict[str, int]:
+        """Recompute and store the lists of every place"""
+        snapshot = await place_catalog.get()
+        lists = await asyncio.to_thread(self._compute_all, snapshot)
+
+        keys = list(lists)
+        for start in range(0, len(keys), 1000):
+            batch = {key: lists[key] for key in keys[start:start + 1000]}
+            await cache_service.set_raw_multiple(batch, expire=self.ttl)
+
+        logger.info(f"Stored similar places for {len(lists)} places")
+        return {"places": len(lists), "catalog_version": snapshot.version}
+
+    def _compute_one(self, snapshot: CatalogSnapshot, place: CatalogPlace) -> Tuple[List[CatalogPlace], np.ndarray]:
+        places = [p for p in snapshot.places if p.city.lower() == place.city.lower()]
+        content = self._content_matrix(places)
+        coordinates = self._coordinates(places)
+        columns = {p.id: column for column, p in enumerate(places)}
+        co_reviews = self._load_co_reviews(place.id)
+        return places, self._scores([columns[place.id]], places, content, coordinates, co_reviews, columns)[0]
+
+    async def refresh(self, place_id: uuid.UUID) -> Dict[str, int]:
+        """Recompute one place's list and update the lists it now belongs in"""
+        snapshot = await place_catalog.get()
+        place = snapshot.get(place_id)
+        if place is None:
+            await cache_service.delete(self._key(place_id))
+            return {"updated": 0}
+
+        places, scores = await asyncio.to_thread(self._compute_one, snapshot, place)
+        await cache_service.set_raw(self._key(place_id), pack_neighbours(self._top(scores, places)), expire=self.ttl)
+
+        # Similarity is symmetric, so the place's row says where it now ranks
+        # in other lists; only the closest few can be affected in practice
+        candidates = [(places[column].id, float(scores[column])) for column in np.argsort(-scores)[:self.top_k * 3]]
+        candidates = [(other, score) for other, score in candidates if np.isfinite(score)]
+        if not candidates:
+            return {"updated": 1}
+
+        stored = await cache_service.get_raw_multiple([self._key(other) for other, _ in candidates])
+        updates = {}
+        for (other, score), data in zip(candidates, stored):
+            if data is None:
+                continue
+            listed = unpack_neighbours(data)
+            others = [neighbour for neighbour in listed if neighbour[0] != place_id]
+            was_listed = len(others) < len(listed)
+            if not was_listed and len(others) >= self.top_k and score <= others[-1][1]:
+                continue
+            neighbours = sorted(others + [(place_id, score)], key=lambda neighbour: neighbour[1], reverse=True)
+            updates[self._key(other)] = pack_neighbours(neighbours[:self.top_k])
+
+        if updates:
+            await cache_service.set_raw_multiple(updates, expire=self.ttl)
+        return {"updated": 1 + len(updates)}
+
+    async def get(self, place_id: uuid.UUID) -> Optional[List[Tuple[uuid.UUID, float]]]:
+        """Stored neighbours of a place, best first, or None if not computed yet"""
+        data = await cache_service.get_raw(self._key(place_id))
+        return unpack_neighbours(data) if data is not None else None
+
+similar_places = SimilarPlaces(top_k=settings.similar_places_top_k, ttl=settings.similar_places_ttl_seconds)
@@ -0,0 +1,166 @@
+"""Load test the /ai endpoints, normally against an API using the fake LLM server.
+
+Start the fake provider and the API pointed at it (see
+benchmarks/fake_llm_server.py), then run from the backend directory:
+
+    python -m benchmarks.ai_load_test --url http://localhost:8000 --scenario chat --concurrency 20 --duration 60
+
+Each worker sends requests back to back for the duration. Reports
+throughput, status codes, latency percentiles and, for chat-stream, time
+to the first answer token. Answers given without the LLM (fallbacks when
+the API refused or timed out the call, and moderation decided by the local
+prefilter) are counted separately, since they are fast and would flatter
+the latency numbers.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+QUESTIONS = [
+    "Where can I find the best kanelbullar in Stockholm?",
+    "What is a semla and when can I eat one?",
+    "Any cozy cafés with outdoor seating in Malmö?",
+    "Vilket konditori i Göteborg har bäst prinsesstårta?",
+    "Is there somewhere near Gamla Stan for a quiet fika?",
+]
+
+REVIEWS = [
+    "Fantastiska kanelbullar och trevlig personal, kommer definitivt tillbaka!",
+    "The coffee was lukewarm and we waited twenty minutes for a bun.",
+    "Mysigt ställe men lite dyrt. Kladdkakan var god.",
+    "Great cardamom buns, the best I have had in Uppsala.",
+]
+
+# Recognisable parts of answers the API gave without the LLM: fallbacks and local moderation decisions
+FALLBACK_MARKERS = ("AI chat services are currently not available", "Mock moderation result", "Decided by local prefilter")
+
+SCENARIOS = ("chat", "chat-stream", "moderate")
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.first_token: List[float] = []
+        self.statuses: Counter = Counter()
+        self.fallbacks = 0
+        self.failures: Counter = Counter()
+
+    def report(self, duration: float):
+        completed = len(self.latencies)
+        print(f"Requests: {completed} in {duration:.1f}s, {completed / duration:.1f}/s")
+        print(f"Statuses: {dict(self.statuses)}")
+        if self.failures:
+            print(f"Client errors: {dict(self.failures)}")
+        if completed:
+            print(f"Answered without the LLM: {self.fallbacks} ({self.fallbacks / completed:.1%})")
+        for name, values in (("latency", self.latencies), ("first token", self.first_token)):
+            if values:
+                print(
+                    f"{name:<12} p50 {_percentile(values, 50) * 1000:8.0f}ms  p95 {_percentile(values, 95) * 1000:8.0f}ms  "
+                    f"p99 {_percentile(values, 99) * 1000:8.0f}ms  max {max(values) * 1000:8.0f}ms  "
+                    f"mean {statistics.mean(values) * 1000:8.0f}ms"
+                )
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def _is_fallback(text: str) -> bool:
+    return any(marker in text for marker in FALLBACK_MARKERS)
+
+async def _chat(client: httpx.AsyncClient, results: Results, rng: random.Random, session_id: Optional[str]):
+    response = await client.post("/ai/chat", json={"message": rng.choice(QUESTIONS), "session_id": session_id})
+    results.statuses[response.status_code] += 1
+    if response.status_code == 200 and _is_fallback(response.json().get("response", "")):
+        results.fallbacks += 1
+
+async def _chat_stream(client: httpx.AsyncClient, results: Results, rng: random.Random, session_id: Optional[str]):
+    started = time.perf_counter()
+    body = {"message": rng.choice(QUESTIONS), "session_id": session_id}
+    async with client.stream("POST", "/ai/chat/stream", json=body) as response:
+        results.statuses[response.status_code] += 1
+        event = None
+        first = True
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "token" and first:
+                results.first_token.append(time.perf_counter() - started)
+                first = False
+            elif line.startswith("data: ") and event == "done":
+                if _is_fallback(json.loads(line[len("data: "):]).get("response", "")):
+                    results.fallbacks += 1
+
+async def _moderate(client: httpx.AsyncClient, results: Results, rng: random.Random, session_id: Optional[str]):
+    # A unique suffix keeps the response cache from answering
+    text = f"{rng.choice(REVIEWS)} #{uuid.uuid4().hex[:8]}"
+    response = await client.post("/ai/moderate", params={"bypass_cache": "true"}, json={"text": text})
+    results.statuses[response.status_code] += 1
+    if response.status_code == 200 and _is_fallback(response.json().get("explanation", "")):
+        results.fallbacks += 1
+
+REQUESTS = {"chat": _chat, "chat-stream": _chat_stream, "moderate": _moderate}
+
+async def worker(
+    client: httpx.AsyncClient,
+    scenario: str,
+    deadline: float,
+    results: Results,
+    rng: random.Random,
+    turns_per_session: int,
+):
+    send = REQUESTS[scenario]
+    session_id, turns = None, 0
+    while time.perf_counter() < deadline:
+        if turns_per_session and (session_id is None or turns >= turns_per_session):
+            session_id, turns = uuid.uuid4().hex, 0
+        started = time.perf_counter()
+        try:
+            await send(client, results, rng, session_id)
+        except httpx.HTTPError as e:
+            results.failures[type(e).__name__] += 1
+            continue
+        results.latencies.append(time.perf_counter() - started)
+        turns += 1
+
+async def run(args: argparse.Namespace):
+    results = Results()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, args.scenario, deadline, results, random.Random(args.seed + i), args.turns_per_session)
+            for i in range(args.concurrency)
+        ))
+        duration = time.perf_counter() - started
+
+    print(f"Scenario {args.scenario}, {args.concurrency} concurrent clients\n")
+    results.report(duration)
+    if args.fake_llm_url:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            stats: Dict[str, Any] = (await client.get(f"{args.fake_llm_url}/stats")).json()
+        print(f"\nFake LLM server: {stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="chat")
+    parser.add_argument("--concurrency", type=int, default=10, help="Clients sending requests at once")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request")
+    parser.add_argument("--turns-per-session", type=int, default=5, help="Chat turns per session; 0 sends none")
+    parser.add_argument("--fake-llm-url", default=None, help="Fake LLM server to fetch request counts from, e.g. http://localhost:8081")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
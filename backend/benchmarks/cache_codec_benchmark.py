@@ -0,0 +1,81 @@
+"""Compare cache codecs on realistic place list payloads.
+
+Run from the backend directory:
+
+    python -m benchmarks.cache_codec_benchmark --places 100 --repeat 200
+"""
+import argparse
+import random
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from app.services.cache_codec import CacheCodec, _serializers, _compressors
+
+CITIES = ["Stockholm", "Gothenburg", "Malmö", "Uppsala", "Västerås"]
+SPECIALTIES = ["Kanelbullar", "Kardemummabullar", "Prinsesstårta", "Semlor", "Kladdkaka", "Chokladbollar", "Dammsugare", "Lussekatter"]
+FEATURES = ["wifi", "outdoor_seating", "wheelchair_accessible", "vegan_options", "gluten_free"]
+
+def make_place(rng: random.Random) -> dict:
+    city = rng.choice(CITIES)
+    created = datetime(2023, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randint(0, 500000))
+    return {
+        "id": uuid.UUID(int=rng.getrandbits(128)),
+        "name": f"Konditori {rng.randint(1, 10000)}",
+        "description": "Traditional Swedish konditori serving freshly baked pastries and strong coffee since 1920. " * 2,
+        "address": f"Drottninggatan {rng.randint(1, 200)}",
+        "city": city,
+        "region": None,
+        "latitude": Decimal(f"{rng.uniform(55.0, 60.0):.8f}"),
+        "longitude": Decimal(f"{rng.uniform(11.0, 19.0):.8f}"),
+        "phone": "+46 8 123 456 78",
+        "website": "https://example.se",
+        "opening_hours": {day: "08:00-18:00" for day in ["monday", "tuesday", "wednesday", "thursday", "friday"]},
+        "fika_specialties": rng.sample(SPECIALTIES, 4),
+        "price_range": rng.randint(1, 4),
+        "features": rng.sample(FEATURES, 3),
+        "images": [f"https://cdn.example.se/{uuid.uuid4()}.jpg" for _ in range(2)],
+        "slug": f"konditori-{rng.randint(1, 10000)}",
+        "rating": Decimal(f"{rng.uniform(3.0, 5.0):.2f}"),
+        "review_count": rng.randint(0, 400),
+        "verified": rng.random() > 0.5,
+        "created_at": created,
+        "updated_at": created + timedelta(days=rng.randint(0, 300)),
+        "price_range_symbol": "$$",
+        "coordinates": None,
+    }
+
+def make_place_list(places: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    return {
+        "places": [make_place(rng) for _ in range(places)],
+        "total": 1000,
+        "page": 1,
+        "per_page": places,
+        "pages": 1000 // places,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=100, help="Places per payload")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    payload = make_place_list(args.places)
+    codecs = list(_serializers())
+    compressions = ["none"] + list(_compressors(None))
+
+    print(f"Payload: PlaceList with {args.places} places, {args.repeat} iterations\n")
+    print(f"{'codec':<10}{'compression':<14}{'bytes':>10}{'encode µs':>12}{'decode µs':>12}")
+
+    for codec_name in codecs:
+        for compression in compressions:
+            codec = CacheCodec(codec=codec_name, compression=compression, compression_min_bytes=0)
+            encoded = codec.encode(payload)
+            encode_time = timeit.timeit(lambda: codec.encode(payload), number=args.repeat) / args.repeat
+            decode_time = timeit.timeit(lambda: codec.decode(encoded), number=args.repeat) / args.repeat
+            print(f"{codec_name:<10}{compression:<14}{len(encoded):>10}{encode_time * 1e6:>12.1f}{decode_time * 1e6:>12.1f}")
+
+if __name__ == "__main__":
+    main()
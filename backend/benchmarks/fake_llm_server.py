@@ -0,0 +1,287 @@
+"""OpenAI-compatible stand-in for the LLM provider, for load and latency tests.
+
+Answers ``/v1/chat/completions`` (plain and streaming) with canned output
+shaped like what each AIService prompt asks for: moderation JSON, batch
+moderation arrays with one item per input, enrichment JSON, descriptions,
+and conversational agent turns that call a tool before answering. Latency,
+streaming speed and error rates are configurable, so the full AIService
+path (governor, retries, hedging, response cache, streaming) can be
+exercised offline.
+
+Run from the backend directory:
+
+    python -m benchmarks.fake_llm_server --port 8081 --latency lognormal --latency-ms 800 --error-rate 0.02
+
+and point the API at it:
+
+    OPENROUTER_BASE_URL=http://localhost:8081/v1 OPENROUTER_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+@dataclass
+class FakeLLMConfig:
+    latency: str = "lognormal"  # One of DISTRIBUTIONS
+    latency_ms: float = 600.0  # Median time before the first byte
+    latency_spread: float = 0.5  # lognormal sigma; uniform and exponential scale with it
+    tokens_per_second: float = 80.0  # Streaming speed, and added to plain responses' latency
+    error_rate: float = 0.0  # Share of requests answered with an error status
+    error_statuses: List[int] = field(default_factory=lambda: [429, 500, 503])
+    hang_rate: float = 0.0  # Share of requests that never answer, to exercise deadlines
+    reject_rate: float = 0.1  # Share of moderated texts judged inappropriate
+    agent_tool_rate: float = 0.7  # Share of agent turns that call a tool before answering
+    seed: Optional[int] = None
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.streams = 0
+        self.errors = 0
+        self.hangs = 0
+        self.by_kind: Dict[str, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "streams": self.streams,
+            "errors": self.errors,
+            "hangs": self.hangs,
+            "by_kind": self.by_kind,
+        }
+
+def sample_latency(config: FakeLLMConfig, rng: random.Random) -> float:
+    """Seconds before the first byte"""
+    median = config.latency_ms / 1000.0
+    if config.latency == "fixed":
+        return median
+    if config.latency == "uniform":
+        return rng.uniform(median * (1 - config.latency_spread), median * (1 + config.latency_spread))
+    if config.latency == "exponential":
+        return rng.expovariate(math.log(2) / median)
+    return rng.lognormvariate(math.log(median), config.latency_spread)
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+# Canned output, picked by what the prompt asks for
+
+_ITEMS = re.compile(r"Items \(JSON\): (\[.*\])", re.DOTALL)
+
+CANNED_DESCRIPTIONS = [
+    "A classic Swedish konditori where the cinnamon buns come warm from the oven each morning. "
+    "Locals linger over strong coffee and cardamom pastries in a calm room full of old photographs.",
+    "Bright and unhurried, this café pairs freshly brewed coffee with semlor, kladdkaka and "
+    "prinsesstårta. It is a favourite spot for a slow weekend fika with friends.",
+]
+
+CANNED_ANSWERS = [
+    "For a traditional fika, try the kanelbullar at Vete-Katten in Stockholm; they have been baking them since 1928. "
+    "Pair one with a strong cup of bryggkaffe and take your time, that is the point of fika.",
+    "Semlor are only in season from January until Easter, so look for them then. Outside the season, "
+    "a kardemummabulle or a slice of kladdkaka with coffee is just as Swedish.",
+]
+
+def classify(prompt: str) -> str:
+    if "Do I need to use a tool?" in prompt:
+        return "agent"
+    if "Respond with only a JSON array" in prompt:
+        return "moderation_batch"
+    if "is_appropriate" in prompt:
+        return "moderation"
+    if "meta_description" in prompt:
+        return "enrichment"
+    if "Write an engaging description" in prompt:
+        return "description"
+    return "text"
+
+def _moderation(rng: random.Random, config: FakeLLMConfig) -> Dict[str, Any]:
+    if rng.random() < config.reject_rate:
+        return {
+            "is_appropriate": False,
+            "toxicity_score": round(rng.uniform(0.6, 0.95), 2),
+            "contains_spam": rng.random() < 0.5,
+            "explanation": "Contains hostile or promotional content",
+        }
+    return {
+        "is_appropriate": True,
+        "toxicity_score": round(rng.uniform(0.0, 0.2), 2),
+        "contains_spam": False,
+        "explanation": "A genuine review of the place",
+    }
+
+def _agent_turn(prompt: str, rng: random.Random, config: FakeLLMConfig) -> str:
+    """One conversational agent step: a tool call on a fresh question, otherwise the answer"""
+    question, _, scratchpad = prompt.rpartition("New input:")[2].partition("\n")
+    if "Observation:" not in scratchpad and rng.random() < config.agent_tool_rate:
+        return (
+            "Thought: Do I need to use a tool? Yes\n"
+            "Action: Search Places\n"
+            f"Action Input: {question.strip()[:80] or 'kanelbullar Stockholm'}"
+        )
+    return f"Thought: Do I need to use a tool? No\nAI: {rng.choice(CANNED_ANSWERS)}"
+
+def canned_output(kind: str, prompt: str, rng: random.Random, config: FakeLLMConfig) -> str:
+    if kind == "agent":
+        return _agent_turn(prompt, rng, config)
+    if kind == "moderation":
+        return json.dumps(_moderation(rng, config))
+    if kind == "moderation_batch":
+        match = _ITEMS.search(prompt)
+        try:
+            items = json.loads(match.group(1)) if match else []
+        except ValueError:
+            items = []
+        return json.dumps([{"id": item.get("id", i), **_moderation(rng, config)} for i, item in enumerate(items)])
+    if kind == "enrichment":
+        return json.dumps({
+            "description": rng.choice(CANNED_DESCRIPTIONS),
+            "specialties": rng.sample(["Kanelbullar", "Kardemummabullar", "Semlor", "Kladdkaka", "Prinsesstårta"], 3),
+            "features": rng.sample(["wifi", "outdoor_seating", "wheelchair_accessible", "vegan_options"], 2),
+            "meta_description": "Traditional Swedish fika with fresh pastries and strong coffee.",
+        }, ensure_ascii=False)
+    if kind == "description":
+        return rng.choice(CANNED_DESCRIPTIONS)
+    return rng.choice(CANNED_ANSWERS)
+
+def _chunks(text: str) -> List[str]:
+    """Text split roughly the way a provider streams it, a word per chunk"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake LLM server")
+    rng = random.Random(config.seed)
+    stats = Stats()
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "benchmarks"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.as_dict()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(message.get("content") or "") for message in messages)
+        kind = classify(prompt)
+        stream = bool(body.get("stream"))
+        model = body.get("model") or "fake-model"
+
+        stats.requests += 1
+        stats.by_kind[kind] = stats.by_kind.get(kind, 0) + 1
+        if stream:
+            stats.streams += 1
+
+        if rng.random() < config.hang_rate:
+            stats.hangs += 1
+            await asyncio.sleep(3600)
+
+        await asyncio.sleep(sample_latency(config, rng))
+        if rng.random() < config.error_rate:
+            stats.errors += 1
+            status = rng.choice(config.error_statuses)
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": f"Simulated {status} error", "type": "fake_error", "code": status}},
+            )
+
+        text = canned_output(kind, prompt, rng, config)
+        stop = body.get("stop") or []
+        for marker in [stop] if isinstance(stop, str) else stop:
+            if marker and marker in text:
+                text = text[:text.index(marker)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        usage = {
+            "prompt_tokens": count_tokens(prompt),
+            "completion_tokens": count_tokens(text),
+            "total_tokens": count_tokens(prompt) + count_tokens(text),
+        }
+
+        if not stream:
+            # The whole completion arrives at once, after the time generating it would take
+            await asyncio.sleep(usage["completion_tokens"] / config.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        return StreamingResponse(
+            _stream(completion_id, model, text, config), media_type="text/event-stream"
+        )
+
+    return app
+
+async def _stream(completion_id: str, model: str, text: str, config: FakeLLMConfig) -> AsyncIterator[str]:
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for piece in _chunks(text):
+        await asyncio.sleep(count_tokens(piece) / config.tokens_per_second)
+        yield chunk({"content": piece})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+def parse_args() -> Tuple[FakeLLMConfig, str, int]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", choices=DISTRIBUTIONS, default="lognormal", help="Time to first byte distribution")
+    parser.add_argument("--latency-ms", type=float, default=600.0, help="Median time to first byte")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="lognormal sigma, or uniform's relative half-width")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with an error")
+    parser.add_argument("--error-statuses", default="429,500,503", help="Comma-separated statuses errors are drawn from")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests never answered")
+    parser.add_argument("--reject-rate", type=float, default=0.1, help="Share of moderated texts judged inappropriate")
+    parser.add_argument("--agent-tool-rate", type=float, default=0.7, help="Share of agent turns that call a tool first")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",") if status.strip()],
+        hang_rate=args.hang_rate,
+        reject_rate=args.reject_rate,
+        agent_tool_rate=args.agent_tool_rate,
+        seed=args.seed,
+    )
+    return config, args.host, args.port
+
+def main():
+    config, host, port = parse_args()
+    uvicorn.run(create_app(config), host=host, port=port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
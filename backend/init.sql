@@ -75,6 +75,7 @@ CREATE TABLE reviews (
     -- Moderation
     moderated INTEGER DEFAULT 0 CHECK (moderated IN (-1, 0, 1)), -- -1: rejected, 0: pending, 1: approved
     moderated_at TIMESTAMP WITH TIME ZONE,
+    moderated_by VARCHAR(20) CHECK (moderated_by IN ('prefilter', 'llm', 'admin')),
     
     -- Additional fields
     helpful_count INTEGER DEFAULT 0,
@@ -98,6 +99,7 @@ CREATE INDEX idx_places_verified ON places(verified) WHERE verified = TRUE;
 CREATE INDEX idx_places_rating ON places(rating DESC) WHERE rating IS NOT NULL;
 CREATE INDEX idx_places_location ON places USING GIST (ST_Point(longitude::float8, latitude::float8));
 CREATE INDEX idx_places_fts ON places USING GIN (to_tsvector('english', name || ' ' || COALESCE(description, '')));
+CREATE INDEX idx_places_fts_sv ON places USING GIN (to_tsvector('swedish', name || ' ' || COALESCE(description, '')));
 
 CREATE INDEX idx_reviews_place_id ON reviews(place_id);
 CREATE INDEX idx_reviews_moderated ON reviews(moderated) WHERE moderated = 1;
@@ -0,0 +1,80 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.cache import CachedResponse, accepts_encoding
+from app.config import settings
+from app.main import EventStreamAwareGZipMiddleware
+
+BODY = json.dumps({"places": ["Vete-Katten"] * 500}).encode()
+
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=100)
+
+    @app.get("/cached")
+    async def cached(request: Request):
+        return CachedResponse.build(BODY, expire=60).to_response(request)
+
+    @app.get("/plain")
+    async def plain():
+        return {"places": ["Vete-Katten"] * 500}
+
+    @app.get("/events")
+    async def events():
+        async def stream():
+            for i in range(3):
+                yield f"data: {i}\n\n" * 100
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return TestClient(app)
+
+def get(path: str, accept_encoding: str):
+    # Raw bytes, so the client's own decoding can't hide what was sent
+    with client().stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+@pytest.mark.parametrize("header, coding, expected", [
+    ("gzip", "gzip", True),
+    ("gzip, deflate, br", "gzip", True),
+    ("GZIP;q=0.5", "gzip", True),
+    ("gzip;q=0", "gzip", False),
+    ("gzip;q=0.0, identity", "gzip", False),
+    ("x-gzip", "gzip", False),
+    ("*", "gzip", True),
+    ("gzip;q=0, *", "gzip", False),
+    ("*;q=0", "gzip", False),
+    ("", "gzip", False),
+])
+def test_accepts_encoding(header, coding, expected):
+    assert accepts_encoding(header, coding) is expected
+
+def test_cached_response_served_gzipped_when_accepted():
+    assert len(BODY) >= settings.cache_response_gzip_min_bytes
+    response, raw = get("/cached", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert gzip.decompress(raw) == BODY
+
+@pytest.mark.parametrize("accept_encoding", ["gzip;q=0, identity", "identity", "*;q=0"])
+def test_refused_gzip_is_never_sent(accept_encoding):
+    for path in ("/cached", "/plain"):
+        response, raw = get(path, accept_encoding)
+        assert "content-encoding" not in response.headers
+        assert json.loads(raw)["places"][0] == "Vete-Katten"
+    response, _ = get("/cached", accept_encoding)
+    assert not response.headers["etag"].endswith('-gzip"')
+
+def test_event_streams_pass_through_uncompressed():
+    response, raw = get("/events", "gzip")
+    assert "content-encoding" not in response.headers
+    assert raw.startswith(b"data: 0\n\n")
+
+def test_other_responses_still_gzipped():
+    response, raw = get("/plain", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(raw))["places"][0] == "Vete-Katten"
@@ -0,0 +1,267 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_governor import (
+    LLMBudgetError,
+    LLMBusyError,
+    LLMDeadlineError,
+    LLMGovernor,
+    TokenBucket,
+)
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def governor(**kwargs) -> LLMGovernor:
+    options = {"max_concurrency": 4, "queue_timeout": 1.0, "retry_base_delay": 0.001, "retry_max_delay": 0.001}
+    options.update(kwargs)
+    return LLMGovernor(**options)
+
+def assert_idle(gov: LLMGovernor, operation: str = "op"):
+    assert gov.in_flight == 0
+    assert not gov._global.locked()
+    semaphore = gov._operations.get(operation)
+    assert semaphore is None or not semaphore.locked()
+
+def answer(value, delay: float = 0.0):
+    async def call():
+        await asyncio.sleep(delay)
+        return value
+    return call
+
+@pytest.mark.asyncio
+async def test_returns_result_and_frees_slots():
+    gov = governor(operation_concurrency={"op": 1})
+    assert await gov.run("op", answer("ok")) == "ok"
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_slow_call_misses_deadline():
+    gov = governor(deadlines={"op": 0.05}, operation_concurrency={"op": 1})
+    with pytest.raises(LLMDeadlineError):
+        await gov.run("op", answer("late", delay=1.0))
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_deadline_while_waiting_for_global_slot_releases_operation_slot():
+    gov = governor(max_concurrency=1, operation_concurrency={"op": 1}, deadlines={"op": 0.05}, queue_timeout=1.0)
+    await gov._global.acquire()
+    try:
+        with pytest.raises(LLMDeadlineError):
+            await gov.run("op", answer("ok"))
+        assert not gov._operations["op"].locked()
+    finally:
+        gov._global.release()
+    assert await gov.run("op", answer("ok")) == "ok"
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_releases_slots():
+    gov = governor(max_concurrency=1, operation_concurrency={"op": 1}, queue_timeout=5.0)
+    await gov._global.acquire()
+    task = asyncio.create_task(gov.run("op", answer("ok")))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    gov._global.release()
+    assert_idle(gov)
+
+    task = asyncio.create_task(gov.run("op", answer("ok", delay=1.0)))
+    await asyncio.sleep(0.01)
+    assert gov.in_flight == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_busy_when_no_slot_frees_up():
+    gov = governor(operation_concurrency={"op": 1}, queue_timeout=0.02, tokens_per_minute=6000, token_burst=100)
+    await gov._operations["op"].acquire()
+    try:
+        with pytest.raises(LLMBusyError):
+            await gov.run("op", answer("ok"), estimated_tokens=60)
+    finally:
+        gov._operations["op"].release()
+    # Refused calls give their reserved tokens back
+    assert gov.budget.tokens == pytest.approx(100, abs=1)
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    gov = governor(max_attempts=3)
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise ProviderError(503)
+        return "ok"
+
+    assert await gov.run("op", flaky) == "ok"
+    assert calls == 3
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_other_errors_are_not_retried():
+    gov = governor(max_attempts=3)
+    calls = 0
+
+    async def bad_request():
+        nonlocal calls
+        calls += 1
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        await gov.run("op", bad_request)
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_retries_stop_at_max_attempts():
+    gov = governor(max_attempts=2)
+    calls = 0
+
+    async def unavailable():
+        nonlocal calls
+        calls += 1
+        raise ProviderError(503)
+
+    with pytest.raises(ProviderError):
+        await gov.run("op", unavailable)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_hedge_uses_faster_backup_and_cancels_primary():
+    gov = governor(hedge_after={"op": 0.02}, deadlines={"op": 2.0})
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(1.0 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    assert await gov.run("op", call) == 1
+    await asyncio.sleep(0)
+    assert started == [0, 1]
+    assert cancelled == [0]
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_primary_is_fast():
+    gov = governor(hedge_after={"op": 0.5})
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        return "ok"
+
+    assert await gov.run("op", call) == "ok"
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_hedged_call_missing_deadline_frees_both_slots():
+    gov = governor(hedge_after={"op": 0.01}, deadlines={"op": 0.05}, operation_concurrency={"op": 2})
+    with pytest.raises(LLMDeadlineError):
+        await gov.run("op", answer("late", delay=1.0))
+    await asyncio.sleep(0)
+    assert_idle(gov)
+
+@pytest.mark.asyncio
+async def test_budget_refuses_calls_once_spent():
+    gov = governor(tokens_per_minute=60, token_burst=100)
+    assert await gov.run("op", answer("ok"), estimated_tokens=80) == "ok"
+    with pytest.raises(LLMBudgetError):
+        await gov.run("op", answer("ok"), estimated_tokens=80)
+    gov.refund(80)
+    assert await gov.run("op", answer("ok"), estimated_tokens=80) == "ok"
+
+@pytest.mark.asyncio
+async def test_failed_call_gives_reservation_back():
+    gov = governor(tokens_per_minute=60, token_burst=100, max_attempts=2)
+
+    async def unavailable():
+        raise ProviderError(503)
+
+    with pytest.raises(ProviderError):
+        await gov.run("op", unavailable, estimated_tokens=80)
+    assert gov.budget.tokens == pytest.approx(100, abs=1)
+
+@pytest.mark.asyncio
+async def test_missed_deadline_gives_reservation_back():
+    gov = governor(tokens_per_minute=60, token_burst=100, deadlines={"op": 0.05})
+    with pytest.raises(LLMDeadlineError):
+        await gov.run("op", answer("late", delay=1.0), estimated_tokens=80)
+    assert gov.budget.tokens == pytest.approx(100, abs=1)
+
+@pytest.mark.asyncio
+async def test_retry_needs_budget_of_its_own():
+    gov = governor(tokens_per_minute=60, token_burst=100, max_attempts=3)
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 2:
+            raise ProviderError(503)
+        return "ok"
+
+    assert await gov.run("op", flaky, estimated_tokens=40) == "ok"
+    # The failed attempt was refunded, the successful retry kept its reservation
+    assert gov.budget.tokens == pytest.approx(60, abs=1)
+
+    async def drained():
+        # Other calls spend the whole budget, including what this attempt gives back
+        gov.budget.tokens = -40
+        raise ProviderError(503)
+
+    gov.budget.tokens = 100
+    with pytest.raises(LLMBudgetError):
+        await gov.run("op", drained, estimated_tokens=40)
+    assert gov.budget.tokens == pytest.approx(0, abs=1)
+
+@pytest.mark.asyncio
+async def test_hedged_backup_is_charged():
+    gov = governor(hedge_after={"op": 0.02}, tokens_per_minute=60, token_burst=100)
+    started = []
+
+    async def call():
+        started.append(len(started))
+        await asyncio.sleep(1.0 if len(started) == 1 else 0.01)
+        return "ok"
+
+    assert await gov.run("op", call, estimated_tokens=30) == "ok"
+    assert len(started) == 2
+    assert gov.budget.tokens == pytest.approx(40, abs=1)
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_budget_for_backup():
+    gov = governor(hedge_after={"op": 0.01}, tokens_per_minute=60, token_burst=50)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert await gov.run("op", call, estimated_tokens=30) == "ok"
+    assert calls == 1
+
+def test_token_bucket_allows_oversized_request_from_full_bucket():
+    bucket = TokenBucket(rate=1.0, capacity=10)
+    assert bucket.take(50)
+    assert not bucket.take(1)
+    bucket.refund(100)
+    assert bucket.tokens == 10